@@ -0,0 +1,21 @@
+"""
+Офлайн-бенчмарки парсера очереди ЦОДД.
+
+Запуск: python -m benchmarks.<имя_модуля>
+"""
+import logging
+import os
+
+# Конфигурация бота требует токен, для бенчмарков подойдет любой
+os.environ.setdefault("BOT_TOKEN", "benchmark")
+
+
+def quiet_parser_logs():
+    """
+    Отключает информационные логи парсера: на каждом прогоне они искажают замеры.
+    Подходит и как initializer пула процессов разбора.
+    """
+    # Логгер парсера настраивается при импорте модуля: если модуль импортируется
+    # позже (в процессе пула - вместе с первой задачей), он вернул бы уровень INFO
+    import bot.services.parser  # noqa: F401
+    logging.getLogger("parser").setLevel(logging.WARNING)
@@ -0,0 +1,113 @@
+"""
+Сравнение источников данных: разбор ticket.html (JS-массив или таблица)
+против JSON-адреса данных.
+
+Для очередей разного размера поднимает локальную замену ЦОДД
+(benchmarks.fake_codd) и замеряет:
+- объем ответа без сжатия и со сжатием gzip;
+- время загрузки и разбора до готового снимка (лучшее из нескольких);
+- из чего это время складывается по этапам парсера.
+
+Запуск: python -m benchmarks.data_endpoint [--sizes 1000 10000 50000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import gzip
+import time
+from typing import Dict, List, Tuple
+
+from aiohttp import web
+
+from benchmarks import quiet_parser_logs
+from benchmarks.fake_codd import FakeCodd, parse_args as fake_args
+from bot.services.http_client import close_http_session
+from bot.services.parser import CoddParser
+
+PORT = 8087
+
+
+def body_sizes(body: str) -> Tuple[int, int]:
+    raw = body.encode('utf-8')
+    return len(raw), len(gzip.compress(raw, 6))
+
+
+async def measure(load, repeat: int) -> Tuple[float, Dict[str, float], int]:
+    """Лучшее время получения снимка, этапы этого прогона и число автомобилей."""
+    best = float('inf')
+    best_timings: Dict[str, float] = {}
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cars, timings = await load()
+        elapsed = time.perf_counter() - started
+        if elapsed < best:
+            best, best_timings, rows = elapsed, timings, len(cars or ())
+    return best, best_timings, rows
+
+
+async def run(sizes: List[int], repeat: int):
+    header = f"{'Строк':>7}  {'Источник':<10}{'КБ':>8}{'КБ gzip':>9}{'Снимок, мс':>12}{'Строк':>7}  Этапы, мс"
+    print(header)
+    print("-" * (len(header) + 40))
+
+    for rows in sizes:
+        fake = FakeCodd(fake_args(['--rows', str(rows), '--tick', '3600', '--no-etag']))
+        fake_table = FakeCodd(fake_args(['--rows', str(rows), '--tick', '3600', '--no-etag', '--format', 'table']))
+        app = web.Application()
+        app.router.add_get('/ticket.html', fake.ticket)
+        app.router.add_get('/table.html', fake_table.ticket)
+        app.router.add_get('/queue.json', fake.data)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', PORT).start()
+
+        def page_loader(path: str):
+            parser = CoddParser()
+            parser.base_url = f"http://127.0.0.1:{PORT}/{path}"
+
+            async def load():
+                started = time.perf_counter()
+                html = await parser._fetch_page()
+                fetch = time.perf_counter() - started
+                cars = await parser._run_parse(html)
+                return cars, {'fetch': fetch, **parser.timings}
+            return load
+
+        data_parser = CoddParser()
+        data_parser.data_url = f"http://127.0.0.1:{PORT}/queue.json"
+
+        async def load_json():
+            cars = await data_parser._fetch_data()
+            return cars, dict(data_parser.timings)
+
+        sources = (
+            ('html/js', page_loader('ticket.html'), fake.page('html')[1]),
+            ('html/table', page_loader('table.html'), fake_table.page('html')[1]),
+            ('json', load_json, fake.page('json')[1]),
+        )
+        for name, load, body in sources:
+            raw, compressed = body_sizes(body)
+            best, timings, found = await measure(load, repeat)
+            stages = ", ".join(f"{stage} {seconds * 1000:.1f}" for stage, seconds in timings.items())
+            print(
+                f"{rows:>7}  {name:<10}{raw / 1024:>8.0f}{compressed / 1024:>9.0f}"
+                f"{best * 1000:>12.1f}{found:>7}  {stages}"
+            )
+
+        await runner.cleanup()
+
+    await close_http_session()
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arguments.add_argument('--sizes', type=int, nargs='*', default=[1000, 10000, 50000], help="Размеры очереди")
+    arguments.add_argument('--repeat', type=int, default=5, help="Прогонов на источник")
+    args = arguments.parse_args()
+
+    quiet_parser_logs()
+    asyncio.run(run(args.sizes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Сквозная проверка на локальной замене ЦОДД (benchmarks.fake_codd).
+
+Запускает замену сайта и цикл парсера (start_parser) в одном процессе и
+замеряет:
+- задержку от сдвига очереди на "сайте" до события FrontAdvanced,
+  по которому отправляются уведомления;
+- пропускную способность поиска номера (parse_car_data) во время опроса.
+
+Запуск: python -m benchmarks.end_to_end [--duration 30] [--tick 2] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import statistics
+import time
+
+from aiohttp import web
+
+from benchmarks import quiet_parser_logs
+from benchmarks.fake_codd import FakeCodd, car_at, parse_args as fake_args
+
+
+async def main(args: argparse.Namespace):
+    fake = FakeCodd(fake_args([
+        '--rows', str(args.rows), '--tick', str(args.tick), '--advance', '3',
+        '--latency', str(args.latency), '--error-rate', str(args.error_rate),
+    ]))
+    app = web.Application()
+    app.router.add_get('/ticket.html', fake.ticket)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.port).start()
+
+    # Конфигурация читается при создании парсера, поэтому задаем ее до импорта
+    os.environ['CODD_URL'] = f"http://127.0.0.1:{args.port}/ticket.html"
+    # Интервалы опроса в конфигурации - целые секунды, шаг очереди может быть дробным
+    interval = max(1, math.ceil(args.tick))
+    os.environ.setdefault('PARSER_INTERVAL', str(interval))
+    os.environ.setdefault('POLL_MIN_INTERVAL', '1')
+    os.environ.setdefault('POLL_MAX_INTERVAL', str(interval * 4))
+
+    from bot.services.parser import CoddParser, get_snapshot_service, start_parser
+    from bot.services.queue_events import FrontAdvanced
+    from bot.services.snapshot_channel import LocalChannel
+    quiet_parser_logs()
+
+    delays = []
+
+    def on_front_advanced(events):
+        # Время сдвига - начало текущего шага очереди на замене сайта
+        changed_at = fake.started + fake.version() * args.tick
+        delays.append(time.time() - changed_at)
+
+    get_snapshot_service().events.subscribe(on_front_advanced, (FrontAdvanced,))
+    worker = asyncio.ensure_future(start_parser(LocalChannel()))
+
+    # Поиски номеров идут параллельно с опросом
+    parser = CoddParser()
+    rnd = random.Random(15)
+    lookups = 0
+    found = 0
+    deadline = time.perf_counter() + args.duration
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        first = 1 + fake.version() * 3
+        batch = [car_at(rnd.randint(first, first + args.rows // 2))["carNumber"] for _ in range(100)]
+        results = await asyncio.gather(*(parser.parse_car_data(number) for number in batch))
+        lookups += len(batch)
+        found += sum(1 for result in results if result)
+    elapsed = time.perf_counter() - started
+
+    worker.cancel()
+    await asyncio.gather(worker, return_exceptions=True)
+    await runner.cleanup()
+
+    print(f"Длительность: {elapsed:.0f} с, шаг очереди: {args.tick} с, задержка сайта: {args.latency} с")
+    print(f"Запросов к сайту: {fake.stats['requests']} (304: {fake.stats['not_modified']}, ошибок: {fake.stats['errors']})")
+    if delays:
+        print(
+            f"Задержка обнаружения сдвига: медиана {statistics.median(delays):.2f} с, "
+            f"максимум {max(delays):.2f} с ({len(delays)} сдвигов)"
+        )
+    else:
+        print("Сдвигов очереди не обнаружено")
+    print(f"Поиск номера: {lookups / elapsed:.0f} запросов/с, найдено {found} из {lookups}")
+
+
+def parse_args() -> argparse.Namespace:
+    arguments = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arguments.add_argument('--duration', type=float, default=30)
+    arguments.add_argument('--tick', type=float, default=2, help="Период движения очереди, с")
+    arguments.add_argument('--rows', type=int, default=5000)
+    arguments.add_argument('--latency', type=float, default=0.1, help="Задержка ответа сайта, с")
+    arguments.add_argument('--error-rate', type=float, default=0.0)
+    arguments.add_argument('--port', type=int, default=8086)
+    return arguments.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
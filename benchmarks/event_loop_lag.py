@@ -0,0 +1,81 @@
+"""
+Задержка цикла событий во время разбора страницы: разбор в основном
+процессе против разбора в пуле процессов (PARSER_PROCESS_POOL).
+"""
+import asyncio
+import statistics
+import time
+
+from benchmarks import quiet_parser_logs
+from benchmarks.synthetic import make_js_page
+from bot.services.parser import CoddParser, get_process_pool, shutdown_process_pool
+
+HEARTBEAT = 0.005  # Период "пульса" цикла событий, в секундах
+
+
+async def measure_lag(parser: CoddParser, html: str, parses: int) -> dict:
+    """Разбирает страницу parses раз и замеряет, насколько опаздывает пульс цикла."""
+    lags = []
+    running = True
+
+    async def heartbeat():
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(HEARTBEAT)
+            lags.append(time.perf_counter() - started - HEARTBEAT)
+
+    beat = asyncio.create_task(heartbeat())
+    # Даем пульсу запуститься до начала разбора
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    for _ in range(parses):
+        await parser._run_parse(html)
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+
+    # Последний пульс должен успеть зафиксировать задержку
+    await asyncio.sleep(HEARTBEAT * 2)
+    running = False
+    await beat
+
+    lags.sort()
+    return {
+        'elapsed': elapsed,
+        'max': lags[-1],
+        'p95': lags[int(len(lags) * 0.95) - 1] if len(lags) > 1 else lags[-1],
+        'median': statistics.median(lags),
+    }
+
+
+async def run(rows: int, parses: int):
+    quiet_parser_logs()
+    # Процессы пула запускаются заново (spawn) и настраивают логи сами
+    get_process_pool(initializer=quiet_parser_logs)
+    parser = CoddParser()
+    html = make_js_page(rows)
+
+    print(f"Страница: {rows} строк, {len(html) / 1024:.0f} КБ, разборов: {parses}")
+    print(f"{'Режим':<16}{'Всего, с':>10}{'Макс. лаг, мс':>16}{'p95, мс':>10}{'Медиана, мс':>14}")
+
+    for process_pool in (False, True):
+        # Копия: конфигурация процесса общая для всех парсеров
+        parser.config = parser.config.model_copy(update={'parser_process_pool': process_pool})
+        # Прогрев: запуск процессов пула не должен попадать в замер
+        await parser._run_parse(html)
+        result = await measure_lag(parser, html, parses)
+        mode = "пул процессов" if process_pool else "основной поток"
+        print(
+            f"{mode:<16}{result['elapsed']:>10.2f}{result['max'] * 1000:>16.1f}"
+            f"{result['p95'] * 1000:>10.1f}{result['median'] * 1000:>14.1f}"
+        )
+
+    shutdown_process_pool()
+
+
+def main(rows: int = 50000, parses: int = 5):
+    asyncio.run(run(rows, parses))
+
+
+if __name__ == "__main__":
+    main()
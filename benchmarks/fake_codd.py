@@ -0,0 +1,209 @@
+"""
+Локальная замена сайта ЦОДД для нагрузочных проверок бота.
+
+Отдает ticket.html с очередью, которая движется со временем: раз в tick
+секунд из начала очереди уходят advance автомобилей, в конец встают join
+новых. Умеет задерживать ответы, отвечать ошибками, менять формат
+страницы, сжимать ответы gzip (--gzip) и поддерживает ETag/If-None-Match.
+
+Запуск:
+    python -m benchmarks.fake_codd --port 8085 --rows 5000 --tick 10 --advance 3
+    CODD_URL=http://127.0.0.1:8085/ticket.html python -m bot
+
+GET /queue.json отдает ту же очередь JSON-массивом, как адрес данных
+(CODD_DATA_URL=http://127.0.0.1:8085/queue.json). GET /stats возвращает
+счетчики запросов и время последнего сдвига очереди.
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import random
+import time
+from email.utils import formatdate
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from benchmarks.synthetic import LETTERS, MODELS
+
+# Варианты разметки, которые встречаются у ticket.html
+FORMATS = ('js', 'js_alt', 'json_parse', 'table')
+
+
+def car_at(position: int) -> Dict:
+    """Автомобиль на позиции: номер и данные зависят только от позиции."""
+    rnd = random.Random(position)
+    return {
+        "carNumber": (
+            f"{rnd.choice(LETTERS)}{rnd.randint(100, 999)}"
+            f"{rnd.choice(LETTERS)}{rnd.choice(LETTERS)}{rnd.randint(10, 199)}"
+        ),
+        "model": rnd.choice(MODELS),
+        "position": position,
+        "date": f"{rnd.randint(1, 28):02d}.{rnd.randint(1, 12):02d}.2024",
+    }
+
+
+def render_json(cars: List[Dict], updated: str) -> str:
+    """Данные очереди в виде ответа JSON-адреса."""
+    return json.dumps({"updated": updated, "queueData": cars}, ensure_ascii=False)
+
+
+def render(cars: List[Dict], page_format: str) -> str:
+    """Страница очереди в заданном формате."""
+    head = (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Электронная очередь</title></head><body>\n"
+        "<div class=\"header\"><h1>Электронная очередь ЦОДД</h1></div>\n"
+    )
+    if page_format == 'js':
+        body = f"<script>\nvar queueData = {json.dumps(cars, ensure_ascii=False)};\n</script>\n"
+    elif page_format == 'js_alt':
+        # Другие имя переменной и ключи элементов
+        items = [
+            {"number": car["carNumber"], "марка": car["model"], "pos": car["position"], "reg_date": car["date"]}
+            for car in cars
+        ]
+        body = f"<script>\nvar cars = {json.dumps(items, ensure_ascii=False)};\n</script>\n"
+    elif page_format == 'json_parse':
+        body = f"<script>\nvar queue = JSON.parse('{json.dumps(cars, ensure_ascii=False)}');\n</script>\n"
+    else:
+        rows = "\n".join(
+            f"<tr><td>{car['position']}</td><td>{car['carNumber']}</td><td>{car['model']}</td><td>{car['date']}</td></tr>"
+            for car in cars
+        )
+        body = (
+            "<table>\n<tr><th>Позиция в очереди</th><th>Номер автомобиля</th><th>Модель</th><th>Дата регистрации</th></tr>\n"
+            f"{rows}\n</table>\n"
+        )
+    return head + body + "</body></html>"
+
+
+class FakeCodd:
+    """Состояние движущейся очереди и параметры искажения ответов."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.started = time.time()
+        self.rnd = random.Random(args.seed)
+        self.stats = {'requests': 0, 'ok': 0, 'not_modified': 0, 'errors': 0, 'timeouts': 0}
+        self._pages: Dict[str, Tuple[int, str, str, str]] = {}  # вид ответа -> версия, тело, ETag, Last-Modified
+        self._compressed: Dict[str, Tuple[int, bytes]] = {}  # вид ответа -> версия, тело в gzip
+
+    def version(self) -> int:
+        """Номер шага очереди с момента запуска."""
+        return int((time.time() - self.started) / self.args.tick)
+
+    def page_format(self, version: int) -> str:
+        if self.args.format == 'rotate':
+            return FORMATS[(version // self.args.rotate_every) % len(FORMATS)]
+        return self.args.format
+
+    def page(self, kind: str = 'html') -> Tuple[int, str, str, str]:
+        version = self.version()
+        cached = self._pages.get(kind)
+        if cached is None or cached[0] != version:
+            first = 1 + version * self.args.advance
+            last = self.args.rows + version * self.args.join
+            cars = [car_at(position) for position in range(first, last + 1)]
+            last_modified = formatdate(self.started + version * self.args.tick, usegmt=True)
+            if kind == 'json':
+                body = render_json(cars, last_modified)
+            else:
+                body = render(cars, self.page_format(version))
+            etag = '"' + hashlib.blake2b(body.encode('utf-8'), digest_size=8).hexdigest() + '"'
+            cached = self._pages[kind] = (version, body, etag, last_modified)
+        return cached
+
+    def compressed(self, kind: str) -> bytes:
+        """Тело ответа в gzip; сжимается один раз на версию очереди."""
+        version, body, _, _ = self.page(kind)
+        cached = self._compressed.get(kind)
+        if cached is None or cached[0] != version:
+            cached = self._compressed[kind] = (version, gzip.compress(body.encode('utf-8'), 6))
+        return cached[1]
+
+    async def ticket(self, request: web.Request) -> web.Response:
+        return await self._respond(request, 'html')
+
+    async def data(self, request: web.Request) -> web.Response:
+        return await self._respond(request, 'json')
+
+    async def _respond(self, request: web.Request, kind: str) -> web.Response:
+        self.stats['requests'] += 1
+
+        delay = self.args.latency + self.rnd.uniform(0, self.args.jitter)
+        if self.rnd.random() < self.args.timeout_rate:
+            self.stats['timeouts'] += 1
+            delay = self.args.timeout_delay
+        await asyncio.sleep(delay)
+
+        if self.rnd.random() < self.args.error_rate:
+            self.stats['errors'] += 1
+            return web.Response(status=self.rnd.choice((500, 502, 503)), text="Service Unavailable")
+
+        version, body, etag, last_modified = self.page(kind)
+        headers = {'ETag': etag, 'Last-Modified': last_modified, 'X-Queue-Version': str(version)}
+        if not self.args.no_etag and request.headers.get('If-None-Match') == etag:
+            self.stats['not_modified'] += 1
+            return web.Response(status=304, headers=headers)
+
+        self.stats['ok'] += 1
+        if self.args.no_etag:
+            headers = {'X-Queue-Version': str(version)}
+        content_type = 'application/json' if kind == 'json' else 'text/html'
+        if self.args.gzip and 'gzip' in request.headers.get('Accept-Encoding', ''):
+            headers['Content-Encoding'] = 'gzip'
+            return web.Response(body=self.compressed(kind), content_type=content_type, charset='utf-8', headers=headers)
+        return web.Response(text=body, content_type=content_type, headers=headers)
+
+    async def stats_handler(self, request: web.Request) -> web.Response:
+        version = self.version()
+        return web.json_response({
+            **self.stats,
+            'version': version,
+            'format': self.page_format(version),
+            'first_position': 1 + version * self.args.advance,
+            'last_changed_at': self.started + version * self.args.tick,
+        })
+
+
+def make_app(args: argparse.Namespace) -> web.Application:
+    fake = FakeCodd(args)
+    app = web.Application()
+    app.router.add_get('/ticket.html', fake.ticket)
+    app.router.add_get('/queue.json', fake.data)
+    app.router.add_get('/stats', fake.stats_handler)
+    return app
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    arguments = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arguments.add_argument('--host', default='127.0.0.1')
+    arguments.add_argument('--port', type=int, default=8085)
+    arguments.add_argument('--rows', type=int, default=5000, help="Начальная длина очереди")
+    arguments.add_argument('--tick', type=float, default=10, help="Период движения очереди, с")
+    arguments.add_argument('--advance', type=int, default=3, help="Сколько автомобилей уходит из начала за шаг")
+    arguments.add_argument('--join', type=int, default=2, help="Сколько автомобилей встает в конец за шаг")
+    arguments.add_argument('--format', choices=FORMATS + ('rotate',), default='js', help="Формат страницы")
+    arguments.add_argument('--rotate-every', type=int, default=6, help="Шагов между сменой формата в режиме rotate")
+    arguments.add_argument('--latency', type=float, default=0.0, help="Задержка ответа, с")
+    arguments.add_argument('--jitter', type=float, default=0.0, help="Случайная добавка к задержке, с")
+    arguments.add_argument('--error-rate', type=float, default=0.0, help="Доля ответов 5xx")
+    arguments.add_argument('--timeout-rate', type=float, default=0.0, help="Доля ответов, зависающих на --timeout-delay")
+    arguments.add_argument('--timeout-delay', type=float, default=60.0)
+    arguments.add_argument('--no-etag', action='store_true', help="Не отвечать 304 на условные запросы")
+    arguments.add_argument('--gzip', action='store_true', help="Сжимать ответы gzip, если клиент это принимает")
+    arguments.add_argument('--seed', type=int, default=15)
+    return arguments.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    print(f"Замена ЦОДД: http://{args.host}:{args.port}/ticket.html")
+    web.run_app(make_app(args), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Сравнение извлечения JS-массива: BeautifulSoup + регулярные выражения
+против поиска подстроки и JSONDecoder.raw_decode.
+"""
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks import quiet_parser_logs
+from benchmarks.synthetic import make_js_page
+from bot.services.parser import CoddParser, ExtractionPlan
+
+
+def best_of(func, repeat: int) -> float:
+    """Лучшее время выполнения func за repeat прогонов, в секундах."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(rows: int = 20000, repeat: int = 5):
+    quiet_parser_logs()
+    parser = CoddParser()
+    html = make_js_page(rows)
+
+    def soup_path():
+        return parser._extract_data_from_javascript(BeautifulSoup(html, 'lxml'), ExtractionPlan())
+
+    def fast_path():
+        return parser._extract_data_from_js_fast(html, ExtractionPlan())
+
+    assert soup_path() == fast_path(), "Результаты извлечения различаются"
+
+    soup_time = best_of(soup_path, repeat)
+    fast_time = best_of(fast_path, repeat)
+
+    print(f"Страница: {rows} строк, {len(html) / 1024:.0f} КБ")
+    print(f"{'Способ':<28}{'Время, мс':>12}")
+    print(f"{'BeautifulSoup + regex':<28}{soup_time * 1000:>12.1f}")
+    print(f"{'Поиск подстроки + raw_decode':<28}{fast_time * 1000:>12.1f}")
+    print(f"Ускорение: x{soup_time / fast_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
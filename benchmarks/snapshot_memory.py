@@ -0,0 +1,52 @@
+"""
+Память, занимаемая снимком очереди: словарь словарей против CompactSnapshot.
+
+Оба варианта строятся из одного и того же JSON-текста под tracemalloc,
+учитывается только память, оставшаяся занятой после построения.
+"""
+import gc
+import json
+import tracemalloc
+
+from benchmarks import quiet_parser_logs
+from benchmarks.synthetic import make_cars
+from bot.services.parser import CoddParser, ExtractionPlan
+from bot.services.snapshot import CompactSnapshot
+
+
+def retained_bytes(build) -> int:
+    """Сколько памяти остается занятым результатом build()."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def main(sizes=(10000, 50000)):
+    quiet_parser_logs()
+    parser = CoddParser()
+
+    print(f"{'Строк':>8}{'Dict[str, Dict], КБ':>22}{'CompactSnapshot, КБ':>22}{'Экономия':>10}")
+    for rows in sizes:
+        text = json.dumps(make_cars(rows), ensure_ascii=False)
+
+        def as_dicts():
+            return parser._cars_from_items(json.loads(text), ExtractionPlan())
+
+        def as_compact():
+            return CompactSnapshot.from_cars(parser._cars_from_items(json.loads(text), ExtractionPlan()))
+
+        dict_size = retained_bytes(as_dicts)
+        compact_size = retained_bytes(as_compact)
+        print(
+            f"{rows:>8}{dict_size / 1024:>22.0f}{compact_size / 1024:>22.0f}"
+            f"{(1 - compact_size / dict_size) * 100:>9.0f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Сводный офлайн-бенчмарк: разбор страниц и ответы из снимка.
+
+Для синтетических страниц (JS-массив и HTML-таблица на 1k/10k/50k строк)
+и, по желанию, страниц из архива (PAGE_ARCHIVE) замеряет:
+- время разбора и пропускную способность (строк в секунду);
+- пиковую память при разборе (tracemalloc);
+- задержку parse_all_cars, parse_car_data и get_first_car_position,
+  когда снимок уже в памяти;
+- задержку подбора похожих номеров для номера с опечаткой.
+
+Сеть не используется: снимок подставляется в сервис снимков напрямую.
+
+Запуск: python -m benchmarks.suite [--sizes 1000 10000] [--archive ./archive]
+"""
+import argparse
+import asyncio
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Dict, Iterator, List, Tuple
+
+import bot.services.parser as parser_module
+from benchmarks import quiet_parser_logs
+from benchmarks.synthetic import make_js_page, make_table_page
+from bot.services.page_archive import PageArchive
+from bot.services.parser import CoddParser, suggest_car_numbers
+from bot.services.snapshot import CompactSnapshot, SnapshotService
+
+LOOKUPS = 2000  # Поисков номера на каждую страницу
+SUGGESTIONS = 500  # Подборов похожих номеров на каждую страницу
+
+
+def synthetic_pages(sizes: List[int]) -> Iterator[Tuple[str, str]]:
+    for rows in sizes:
+        yield f"js/{rows}", make_js_page(rows)
+        yield f"table/{rows}", make_table_page(rows)
+
+
+def archived_pages(directory: str) -> Iterator[Tuple[str, str]]:
+    archive = PageArchive(directory, max_bytes=float('inf'))
+    for entry in archive.entries():
+        yield f"archive/{time.strftime('%m-%d %H:%M', time.localtime(entry.timestamp))}", archive.read(entry.digest)
+
+
+async def measure_parse(name: str, html: str, repeat: int) -> Tuple[CompactSnapshot, float, float]:
+    """Лучшее время разбора и пиковая память; план извлечения выучивается на первом прогоне."""
+    parser = CoddParser()
+    # Своя страница - свое состояние и план, как у отдельного источника
+    parser.base_url = f"offline://{name}"
+    cars = await parser._run_parse(html)
+
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await parser._run_parse(html)
+        best = min(best, time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    await parser._run_parse(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return cars, best, peak
+
+
+async def measure_lookups(cars: CompactSnapshot) -> Dict[str, float]:
+    """Задержка ответов из снимка в памяти, в микросекундах."""
+    async def loader():
+        return cars
+
+    parser = CoddParser()
+    parser_module._snapshot_services[parser.queue_id] = SnapshotService(loader, max_age=3600)
+    await parser.parse_all_cars(max_age=0)
+
+    async def run(coro_factory, times: int) -> List[float]:
+        samples = []
+        for _ in range(times):
+            started = time.perf_counter()
+            await coro_factory()
+            samples.append((time.perf_counter() - started) * 1e6)
+        return samples
+
+    numbers = random.Random(15).choices(cars.numbers, k=LOOKUPS)
+    numbers_iter = iter(numbers)
+
+    all_cars = await run(lambda: parser.parse_all_cars(), 200)
+    car_data = await run(lambda: parser.parse_car_data(next(numbers_iter)), LOOKUPS)
+    first = await run(lambda: parser.get_first_car_position(), 200)
+    
+    # Номера с опечаткой в одном символе; индекс похожих номеров строится до замера
+    rnd = random.Random(15)
+    typos = []
+    for number in rnd.choices(cars.numbers, k=SUGGESTIONS):
+        i = rnd.randrange(len(number))
+        typos.append(number[:i] + ('0' if number[i] != '0' else '1') + number[i + 1:])
+    started = time.perf_counter()
+    await suggest_car_numbers(typos[0])
+    index_build = time.perf_counter() - started
+    typos_iter = iter(typos)
+    
+    async def suggest():
+        await suggest_car_numbers(next(typos_iter))
+    suggest_times = await run(suggest, SUGGESTIONS)
+
+    del parser_module._snapshot_services[parser.queue_id]
+    return {
+        'all_cars': statistics.median(all_cars),
+        'car_p50': statistics.median(car_data),
+        'car_p99': statistics.quantiles(car_data, n=100)[98],
+        'first': statistics.median(first),
+        'suggest_p50': statistics.median(suggest_times),
+        'suggest_p99': statistics.quantiles(suggest_times, n=100)[98],
+        'index_ms': index_build * 1000,
+    }
+
+
+async def run(pages: Iterator[Tuple[str, str]], repeat: int):
+    header = (
+        f"{'Страница':<20}{'Строк':>7}{'КБ':>7}{'Разбор, мс':>12}{'Строк/с':>10}{'Пик, МБ':>9}"
+        f"{'all_cars, мкс':>15}{'car p50/p99, мкс':>18}{'first, мкс':>12}"
+        f"{'похожие p50/p99, мкс':>22}{'индекс, мс':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+
+    for name, html in pages:
+        cars, parse_time, peak = await measure_parse(name, html, repeat)
+        if not cars:
+            print(f"{name:<20}{'разбор не удался':>20}")
+            continue
+
+        lookups = await measure_lookups(cars)
+        print(
+            f"{name:<20}{len(cars):>7}{len(html) / 1024:>7.0f}{parse_time * 1000:>12.1f}"
+            f"{len(cars) / parse_time:>10.0f}{peak / 2 ** 20:>9.1f}"
+            f"{lookups['all_cars']:>15.1f}"
+            f"{lookups['car_p50']:>10.1f}/{lookups['car_p99']:<7.1f}"
+            f"{lookups['first']:>12.1f}"
+            f"{lookups['suggest_p50']:>12.1f}/{lookups['suggest_p99']:<9.1f}"
+            f"{lookups['index_ms']:>12.0f}"
+        )
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arguments.add_argument('--sizes', type=int, nargs='*', default=[1000, 10000, 50000], help="Размеры синтетических страниц")
+    arguments.add_argument('--archive', help="Каталог архива страниц для повторного разбора")
+    arguments.add_argument('--repeat', type=int, default=3, help="Прогонов разбора на страницу")
+    args = arguments.parse_args()
+
+    quiet_parser_logs()
+
+    pages = synthetic_pages(args.sizes)
+    if args.archive:
+        pages = (page for source in (pages, archived_pages(args.archive)) for page in source)
+
+    asyncio.run(run(pages, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Генерация синтетических страниц ticket.html для бенчмарков.
+"""
+import json
+import random
+from typing import Dict, List
+
+MODELS = ["LADA GRANTA", "KIA RIO", "HYUNDAI SOLARIS", "VOLKSWAGEN POLO", "RENAULT LOGAN", "КАМАЗ 5490"]
+LETTERS = "ABEKMHOPCTYX"
+
+
+def make_cars(rows: int, seed: int = 15) -> List[Dict]:
+    """Список автомобилей очереди в формате JS-массива страницы."""
+    rnd = random.Random(seed)
+    cars = []
+    for position in range(1, rows + 1):
+        number = (
+            f"{rnd.choice(LETTERS)}{rnd.randint(100, 999)}"
+            f"{rnd.choice(LETTERS)}{rnd.choice(LETTERS)}{rnd.randint(10, 199)}"
+            f"-{rnd.choice(LETTERS)}{rnd.choice(LETTERS)}{rnd.randint(100000, 999999)}"
+        )
+        cars.append({
+            "carNumber": number,
+            "model": rnd.choice(MODELS),
+            "position": position,
+            "date": f"{rnd.randint(1, 28):02d}.{rnd.randint(1, 12):02d}.2024 {rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}",
+        })
+    return cars
+
+
+def make_js_page(rows: int, seed: int = 15) -> str:
+    """Страница, где очередь лежит в JS-переменной queueData."""
+    cars = make_cars(rows, seed)
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Электронная очередь</title>\n"
+        "<script src=\"/js/jquery.min.js\"></script>\n"
+        "<script>window.dataLayer = window.dataLayer || []; function gtag(){dataLayer.push(arguments);}</script>\n"
+        "</head><body>\n"
+        "<div class=\"header\"><h1>Электронная очередь ЦОДД</h1></div>\n"
+        "<div id=\"queue\"></div>\n"
+        f"<script>\nvar queueData = {json.dumps(cars, ensure_ascii=False)};\n"
+        "$(function(){ renderQueue(queueData); });\n</script>\n"
+        "</body></html>"
+    )
+
+
+def make_table_page(rows: int, seed: int = 15) -> str:
+    """Страница, где очередь выведена HTML-таблицей."""
+    cars = make_cars(rows, seed)
+    body = "\n".join(
+        f"<tr><td>{car['position']}</td><td>{car['carNumber']}</td>"
+        f"<td>{car['model']}</td><td>{car['date']}</td></tr>"
+        for car in cars
+    )
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Электронная очередь</title></head><body>\n"
+        "<div class=\"header\"><h1>Электронная очередь ЦОДД</h1></div>\n"
+        "<table class=\"queue\">\n"
+        "<tr><th>Позиция в очереди</th><th>Номер автомобиля</th><th>Модель</th><th>Дата регистрации</th></tr>\n"
+        f"{body}\n"
+        "</table>\n"
+        "</body></html>"
+    )
@@ -0,0 +1,49 @@
+"""
+Сравнение извлечения таблицы: цикл по строкам BeautifulSoup против
+XPath-запроса lxml со сборкой компактного снимка.
+"""
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks import quiet_parser_logs
+from benchmarks.synthetic import make_table_page
+from bot.services.parser import CoddParser
+from bot.services.snapshot import CompactSnapshot
+
+
+def best_of(func, repeat: int) -> float:
+    """Лучшее время выполнения func за repeat прогонов, в секундах."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(rows: int = 20000, repeat: int = 5):
+    quiet_parser_logs()
+    parser = CoddParser()
+    html = make_table_page(rows)
+
+    def soup_path():
+        return CompactSnapshot.from_cars(parser._extract_data_from_tables(BeautifulSoup(html, 'lxml')))
+
+    def fast_path():
+        return parser._extract_data_from_tables_fast(html)
+
+    assert soup_path().to_rows() == fast_path().to_rows(), "Результаты извлечения различаются"
+
+    soup_time = best_of(soup_path, repeat)
+    fast_time = best_of(fast_path, repeat)
+
+    print(f"Страница: {rows} строк, {len(html) / 1024:.0f} КБ")
+    print(f"{'Способ':<28}{'Время, мс':>12}")
+    print(f"{'BeautifulSoup, цикл строк':<28}{soup_time * 1000:>12.1f}")
+    print(f"{'lxml XPath + снимок':<28}{fast_time * 1000:>12.1f}")
+    print(f"Ускорение: x{soup_time / fast_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,7 @@ from bot.middlewares.deduplication import DeduplicationMiddleware
 from bot.models.database import init_db, close_all_connections
 from bot.services.notifications import start_notification_service
 from bot.services.analytics import start_analytics_service
+from bot.services.parser import start_snapshot_subscriber
 from bot.utils.health_check import start_health_server
 
 # Создаем директорию для логов, если она не существует
@@ -68,6 +69,10 @@ async def main():
     # Инициализация базы данных
     await init_db()
     
+    # В режиме worker страницу загружает отдельный процесс парсера
+    if config.parser_mode == "worker":
+        snapshot_subscriber = await start_snapshot_subscriber()
+    
     # Запуск health check сервера
     await start_health_server()
     
@@ -99,6 +104,7 @@ async def main():
             {"command": "settings", "description": "Настройки уведомлений"},
             {"command": "stats", "description": "Статистика очереди"},
             {"command": "forecast", "description": "Прогноз времени ожидания"},
+            {"command": "history", "description": "Позиция в очереди в прошлом"},
             {"command": "chat", "description": "Анонимный чат водителей"},
         ])
         
@@ -108,17 +114,17 @@ async def main():
         # Запуск службы аналитики
         analytics_service = await start_analytics_service()
         
-        # Планируем сбор снимков статистики каждый час
+        # Планируем сбор снимков статистики всех очередей каждый час
         scheduler = notification_service.scheduler
         scheduler.add_job(
-            analytics_service.record_snapshot,
+            analytics_service.record_snapshots,
             'interval',
             hours=1,
             id='analytics_snapshot'
         )
         
         # Делаем первый снимок сразу
-        asyncio.create_task(analytics_service.record_snapshot())
+        asyncio.create_task(analytics_service.record_snapshots())
         
         # Запуск бота
         logging.info("Бот запущен")
@@ -138,6 +144,8 @@ async def main():
         if 'analytics_service' in locals():
             if hasattr(analytics_service, 'close'):
                 await analytics_service.close()
+        if 'snapshot_subscriber' in locals():
+            await snapshot_subscriber.close()
         
         # Закрываем все соединения с БД
         await close_all_connections()
@@ -1,24 +1,94 @@
 import os
+from typing import Dict, Optional
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
+# Идентификатор очереди, заданной одним CODD_URL
+DEFAULT_QUEUE_ID = "main"
+
+
+def parse_queue_sources(value: str) -> Dict[str, str]:
+    """Разбор списка очередей вида "main=https://...,north=https://..."."""
+    sources = {}
+    for item in value.split(","):
+        queue_id, sep, url = item.strip().partition("=")
+        if sep and queue_id.strip() and url.strip():
+            sources[queue_id.strip()] = url.strip()
+    return sources
+
 
 class Config(BaseModel):
     """Конфигурация бота"""
     bot_token: str
     codd_url: str = "https://codd15.ru/ticket.html"
+    codd_queues: Dict[str, str] = Field(default_factory=dict)  # Несколько очередей: идентификатор -> URL
+    codd_data_url: str = ""  # JSON-адрес данных очереди вместо разбора HTML
+    codd_data_urls: Dict[str, str] = Field(default_factory=dict)  # JSON-адреса по очередям: идентификатор -> URL
+    data_url_retry_interval: int = 600  # Через сколько секунд снова пробовать JSON-адрес после неудачи
     database_path: str = "./database/queue_data.db"
+    state_path: str = "./database/queue_state.bin"  # Последний снимок и позиции для быстрого старта
+    position_history: bool = True  # Вести историю позиций автомобилей для /history
+    position_history_path: str = "./database/position_history.jsonl"  # Журнал истории позиций
+    position_history_days: int = 7  # Сколько дней хранить историю позиций
     parser_interval: int = 60
+    parser_process_pool: bool = False  # Разбирать страницу в отдельном процессе
+    parser_process_workers: int = 1  # Количество процессов для разбора
+    parser_mode: str = "local"  # local - бот загружает страницу сам, worker - получает снимки от процесса парсера
+    parser_socket_path: str = "./run/parser.sock"  # Unix-сокет для снимков, если Redis не используется
     default_notification_interval: int = 2
     notification_check_interval: int = 30  # Интервал проверки уведомлений в секундах
+    snapshot_max_age: int = 30  # Допустимый возраст снимка очереди для запросов пользователей
+    extraction_cascade_retry: int = 300  # Как часто перебирать все способы разбора, пока страница не разбирается
+    alert_chat_id: Optional[int] = None  # Чат для предупреждений об изменении разметки страницы
+    
+    # Адаптивный интервал опроса страницы очереди
+    adaptive_polling: bool = True
+    poll_min_interval: int = 10  # Минимальный интервал в секундах
+    poll_max_interval: int = 600  # Максимальный интервал в секундах
+    poll_backoff_factor: float = 2.0  # Множитель интервала, пока очередь не меняется
+    
+    # Настройки HTTP-клиента
+    http_pool_size: int = 10  # Максимум одновременных соединений
+    http_connect_timeout: int = 10  # Таймаут установки соединения в секундах
+    http_read_timeout: int = 30  # Таймаут чтения ответа в секундах
+    http_total_timeout: int = 120  # Предельное время всего запроса в секундах
+    http_keepalive_timeout: int = 60  # Время жизни простаивающего соединения в секундах
+    http_max_body_size: int = 20 * 1024 * 1024  # Предел размера распакованного ответа, 20 МБ по умолчанию
+    circuit_failure_threshold: int = 3  # Ошибок подряд до приостановки запросов к источнику
+    circuit_cooldown: int = 60  # Пауза в запросах к недоступному источнику в секундах
+    
     use_redis: bool = False
     redis_url: str = "redis://localhost:6379/0"
     debug_mode: bool = False
     
+    # Архив загруженных страниц для разбора заново (включается и в режиме отладки)
+    page_archive: bool = False
+    page_archive_dir: str = "./archive"
+    page_archive_max_size: int = 100 * 1024 * 1024  # 100 МБ по умолчанию
+    
     # Настройки логирования
     log_level: str = "INFO"
     log_max_size: int = 10 * 1024 * 1024  # 10 МБ по умолчанию
     log_backup_count: int = 5  # Количество сохраняемых файлов
+    
+    def queue_sources(self) -> Dict[str, str]:
+        """Очереди для опроса: идентификатор -> URL (без CODD_QUEUES - одна очередь из CODD_URL)."""
+        return dict(self.codd_queues) or {DEFAULT_QUEUE_ID: self.codd_url}
+    
+    @property
+    def default_queue(self) -> str:
+        """Очередь пользователей, для которых очередь не выбрана."""
+        return next(iter(self.queue_sources()))
+    
+    def data_sources(self) -> Dict[str, str]:
+        """JSON-адреса данных очередей: идентификатор -> URL (CODD_DATA_URL - для очереди по умолчанию)."""
+        if self.codd_data_urls:
+            return dict(self.codd_data_urls)
+        return {self.default_queue: self.codd_data_url} if self.codd_data_url else {}
+    
+    def resolve_queue(self, queue_id: Optional[str] = None) -> str:
+        """Идентификатор настроенной очереди; неизвестные и пустые заменяются очередью по умолчанию."""
+        return queue_id if queue_id in self.queue_sources() else self.default_queue
 
 
 def load_config() -> Config:
@@ -28,16 +98,64 @@ def load_config() -> Config:
     return Config(
         bot_token=os.getenv("BOT_TOKEN"),
         codd_url=os.getenv("CODD_URL", "https://codd15.ru/ticket.html"),
+        codd_queues=parse_queue_sources(os.getenv("CODD_QUEUES", "")),
+        codd_data_url=os.getenv("CODD_DATA_URL", ""),
+        codd_data_urls=parse_queue_sources(os.getenv("CODD_DATA_URLS", "")),
+        data_url_retry_interval=int(os.getenv("DATA_URL_RETRY_INTERVAL", 600)),
         database_path=os.getenv("DATABASE_PATH", "./database/queue_data.db"),
+        state_path=os.getenv("STATE_PATH", "./database/queue_state.bin"),
+        position_history=os.getenv("POSITION_HISTORY", "true").lower() == "true",
+        position_history_path=os.getenv("POSITION_HISTORY_PATH", "./database/position_history.jsonl"),
+        position_history_days=int(os.getenv("POSITION_HISTORY_DAYS", 7)),
         parser_interval=int(os.getenv("PARSER_INTERVAL", 60)),
+        parser_process_pool=os.getenv("PARSER_PROCESS_POOL", "false").lower() == "true",
+        parser_process_workers=int(os.getenv("PARSER_PROCESS_WORKERS", 1)),
+        parser_mode=os.getenv("PARSER_MODE", "local").lower(),
+        parser_socket_path=os.getenv("PARSER_SOCKET_PATH", "./run/parser.sock"),
         default_notification_interval=int(os.getenv("DEFAULT_NOTIFICATION_INTERVAL", 2)),
         notification_check_interval=int(os.getenv("NOTIFICATION_CHECK_INTERVAL", 30)),
+        snapshot_max_age=int(os.getenv("SNAPSHOT_MAX_AGE", 30)),
+        extraction_cascade_retry=int(os.getenv("EXTRACTION_CASCADE_RETRY", 300)),
+        alert_chat_id=int(os.getenv("ALERT_CHAT_ID")) if os.getenv("ALERT_CHAT_ID") else None,
+        
+        # Адаптивный интервал опроса
+        adaptive_polling=os.getenv("ADAPTIVE_POLLING", "true").lower() == "true",
+        poll_min_interval=int(os.getenv("POLL_MIN_INTERVAL", 10)),
+        poll_max_interval=int(os.getenv("POLL_MAX_INTERVAL", 600)),
+        poll_backoff_factor=float(os.getenv("POLL_BACKOFF_FACTOR", 2.0)),
+        
+        # Настройки HTTP-клиента
+        http_pool_size=int(os.getenv("HTTP_POOL_SIZE", 10)),
+        http_connect_timeout=int(os.getenv("HTTP_CONNECT_TIMEOUT", 10)),
+        http_read_timeout=int(os.getenv("HTTP_READ_TIMEOUT", 30)),
+        http_total_timeout=int(os.getenv("HTTP_TOTAL_TIMEOUT", 120)),
+        http_keepalive_timeout=int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 60)),
+        http_max_body_size=int(os.getenv("HTTP_MAX_BODY_SIZE", 20 * 1024 * 1024)),
+        circuit_failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 3)),
+        circuit_cooldown=int(os.getenv("CIRCUIT_COOLDOWN", 60)),
+        
         use_redis=os.getenv("USE_REDIS", "false").lower() == "true",
         redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
         debug_mode=os.getenv("DEBUG_MODE", "false").lower() == "true",
         
+        # Архив страниц
+        page_archive=os.getenv("PAGE_ARCHIVE", "false").lower() == "true",
+        page_archive_dir=os.getenv("PAGE_ARCHIVE_DIR", "./archive"),
+        page_archive_max_size=int(os.getenv("PAGE_ARCHIVE_MAX_SIZE", 100 * 1024 * 1024)),
+        
         # Настройки логирования
         log_level=os.getenv("LOG_LEVEL", "INFO"),
         log_max_size=int(os.getenv("LOG_MAX_SIZE", 10 * 1024 * 1024)),
         log_backup_count=int(os.getenv("LOG_BACKUP_COUNT", 5)),
-    ) 
\ No newline at end of file
+    ) 
+
+# Конфигурация процесса для частых обращений: окружение читается один раз
+_config: Optional[Config] = None
+
+
+def get_config() -> Config:
+    """Конфигурация, загруженная при первом обращении (load_config перечитывает окружение на каждом вызове)."""
+    global _config
+    if _config is None:
+        _config = load_config()
+    return _config
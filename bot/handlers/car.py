@@ -5,10 +5,10 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 import logging
 
-from bot.models.database import update_car_number, get_car_number, delete_car_number
-from bot.services.parser import CoddParser
-from bot.keyboards.keyboards import get_main_menu
-from bot.utils.message_utils import safe_edit_message
+from bot.models.database import update_car_number, get_car_number, delete_car_number, get_user_queue
+from bot.services.parser import CoddParser, find_car, suggest_car_numbers
+from bot.keyboards.keyboards import CAR_SUGGESTION_PREFIX, get_car_suggestions_keyboard, get_main_menu
+from bot.utils.message_utils import safe_edit_message, format_queue_note, format_stale_note, QUEUE_UNAVAILABLE_TEXT
 
 
 class ChangeCarState(StatesGroup):
@@ -28,7 +28,7 @@ async def cmd_check_queue(message: Message):
         return
     
     # Получаем данные об автомобиле
-    parser = CoddParser()
+    parser = CoddParser(await get_user_queue(message.from_user.id))
     car_data = await parser.parse_car_data(car_number)
     
     if car_data:
@@ -37,9 +37,13 @@ async def cmd_check_queue(message: Message):
             f"Автомобиль номер: <code>{car_data['car_number']}</code>\n"
             f"Модель: {car_data['model']}\n"
             f"Ваш номер в очереди: <b>{car_data['queue_position']}</b>\n"
-            f"Дата регистрации: {car_data['registration_date']}",
+            f"Дата регистрации: {car_data['registration_date']}"
+            f"{format_queue_note(car_data)}"
+            f"{format_stale_note(car_data)}",
             reply_markup=get_main_menu()
         )
+    elif not parser.is_queue_available():
+        await message.answer(QUEUE_UNAVAILABLE_TEXT, reply_markup=get_main_menu())
     else:
         await message.answer(
             f"❓ Информация о вашем автомобиле с номером <code>{car_number}</code> не найдена в очереди.\n"
@@ -64,7 +68,7 @@ async def check_queue_callback(callback: CallbackQuery):
         return
     
     # Получаем данные об автомобиле
-    parser = CoddParser()
+    parser = CoddParser(await get_user_queue(callback.from_user.id))
     car_data = await parser.parse_car_data(car_number)
     
     if car_data:
@@ -74,9 +78,13 @@ async def check_queue_callback(callback: CallbackQuery):
             f"Автомобиль номер: <code>{car_data['car_number']}</code>\n"
             f"Модель: {car_data['model']}\n"
             f"Ваш номер в очереди: <b>{car_data['queue_position']}</b>\n"
-            f"Дата регистрации: {car_data['registration_date']}",
+            f"Дата регистрации: {car_data['registration_date']}"
+            f"{format_queue_note(car_data)}"
+            f"{format_stale_note(car_data)}",
             reply_markup=get_main_menu()
         )
+    elif not parser.is_queue_available():
+        await safe_edit_message(callback.message, QUEUE_UNAVAILABLE_TEXT, reply_markup=get_main_menu())
     else:
         await safe_edit_message(
             callback.message,
@@ -110,30 +118,56 @@ async def process_new_car_number(message: Message, state: FSMContext):
         )
         return
     
-    # Получаем данные об автомобиле через парсер
-    parser = CoddParser()
-    car_data = await parser.parse_car_data(car_number)
+    await change_car_number(message, state, message.from_user.id, car_number)
+
+
+async def new_car_suggestion_callback(callback: CallbackQuery, state: FSMContext):
+    """Обработчик выбора одного из похожих номеров при смене номера."""
+    await callback.answer()
+    car_number = callback.data[len(CAR_SUGGESTION_PREFIX):]
+    await change_car_number(callback.message, state, callback.from_user.id, car_number)
+
+
+async def change_car_number(message: Message, state: FSMContext, user_id: int, car_number: str):
+    """Поиск автомобиля и смена номера; если номер не найден, предлагаются похожие."""
+    # Ищем автомобиль в очереди пользователя, затем в остальных очередях
+    queue_id, car_data = await find_car(car_number, await get_user_queue(user_id))
+    parser = CoddParser(queue_id)
     
     if car_data:
-        # Только если данные получены, обновляем номер автомобиля в БД
-        await update_car_number(message.from_user.id, car_number)
+        # Только если данные получены, обновляем номер автомобиля и очередь в БД
+        await update_car_number(user_id, car_number, queue_id)
         
         await message.answer(
             f"✅ Номер автомобиля успешно изменен!\n\n"
             f"Новый номер: <code>{car_data['car_number']}</code>\n"
             f"Модель: {car_data['model']}\n"
             f"Ваш номер в очереди: <b>{car_data['queue_position']}</b>\n"
-            f"Дата регистрации: {car_data['registration_date']}",
+            f"Дата регистрации: {car_data['registration_date']}"
+            f"{format_queue_note(car_data)}"
+            f"{format_stale_note(car_data)}",
             reply_markup=get_main_menu()
         )
         
         # Завершаем состояние только если успешно изменили номер
         await state.clear()
+    elif not parser.is_queue_available():
+        # Номер не проверить, пока сайт недоступен: оставляем ожидание ввода
+        await message.answer(QUEUE_UNAVAILABLE_TEXT)
     else:
-        await message.answer(
-            f"⚠️ Автомобиль с номером <code>{car_number}</code> не найден в очереди.\n"
-            f"Пожалуйста, проверьте правильность ввода номера или попробуйте позже."
-        )
+        # Похожие номера из того же снимка: повторный ввод не нужен, если ошибка в одном символе
+        suggestions = await suggest_car_numbers(car_number)
+        if suggestions:
+            await message.answer(
+                f"⚠️ Автомобиль с номером <code>{car_number}</code> не найден в очереди.\n"
+                f"Возможно, вы имели в виду один из этих номеров, или введите номер еще раз:",
+                reply_markup=get_car_suggestions_keyboard(suggestions)
+            )
+        else:
+            await message.answer(
+                f"⚠️ Автомобиль с номером <code>{car_number}</code> не найден в очереди.\n"
+                f"Пожалуйста, проверьте правильность ввода номера или попробуйте позже."
+            )
         # Оставляем пользователя в состоянии ожидания ввода номера
 
 
@@ -179,5 +213,8 @@ def get_car_router() -> Router:
     router.callback_query.register(change_car_callback, F.data == "change_car")
     router.callback_query.register(delete_car_callback, F.data == "delete_car")
     router.message.register(process_new_car_number, ChangeCarState.waiting_for_new_car_number)
+    router.callback_query.register(
+        new_car_suggestion_callback, ChangeCarState.waiting_for_new_car_number, F.data.startswith(CAR_SUGGESTION_PREFIX)
+    )
     
     return router 
\ No newline at end of file
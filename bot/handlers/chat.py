@@ -13,7 +13,8 @@ from bot.models.database import (
     toggle_chat_participation,
     is_user_banned,
     get_active_chat_users,
-    get_car_number
+    get_car_number,
+    get_user_queue
 )
 from bot.keyboards.keyboards import (
     get_chat_keyboard,
@@ -21,7 +22,7 @@ from bot.keyboards.keyboards import (
     get_chat_report_keyboard,
     get_back_to_chat_keyboard
 )
-from bot.utils.message_utils import safe_edit_message
+from bot.utils.message_utils import safe_edit_message, QUEUE_UNAVAILABLE_TEXT
 from bot.services.parser import CoddParser
 from bot.services.notifications import process_chat_notifications
 
@@ -53,9 +54,13 @@ async def cmd_chat(message: Message, state: FSMContext):
         return
     
     # Проверяем, находится ли автомобиль в очереди
-    parser = CoddParser()
+    parser = CoddParser(await get_user_queue(message.from_user.id))
     car_data = await parser.parse_car_data(car_number)
     
+    if not car_data and not parser.is_queue_available():
+        await message.answer(QUEUE_UNAVAILABLE_TEXT)
+        return
+    
     if not car_data:
         await message.answer(
             f"❌ Ваш автомобиль {car_number} не найден в очереди.\n"
@@ -129,7 +134,7 @@ async def refresh_chat_callback(callback: CallbackQuery, state: FSMContext):
     # Позиция в очереди
     queue_position = "?"
     if car_number:
-        parser = CoddParser()
+        parser = CoddParser(await get_user_queue(callback.from_user.id))
         car_data = await parser.parse_car_data(car_number)
         if car_data:
             queue_position = car_data['queue_position']
@@ -216,7 +221,7 @@ async def process_chat_message(message: Message, state: FSMContext):
         queue_position = None
         
         if car_number:
-            parser = CoddParser()
+            parser = CoddParser(await get_user_queue(message.from_user.id))
             car_data = await parser.parse_car_data(car_number)
             if car_data:
                 queue_position = car_data['queue_position']
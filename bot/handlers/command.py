@@ -1,19 +1,32 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Optional
 
 from bot.keyboards.keyboards import get_main_menu
-from bot.utils.message_utils import safe_edit_message
+from bot.utils.message_utils import safe_edit_message, format_queue_note, format_stale_note, QUEUE_UNAVAILABLE_TEXT
 from bot.services.analytics import QueueAnalytics
 from bot.services.parser import CoddParser
-from bot.models.database import get_user_car
+from bot.services.position_history import LEFT, PositionHistory, get_position_history
+from bot.models.database import get_user_car, get_user_queue
 from bot.handlers.chat import cmd_chat
 
 # Создаем экземпляр сервиса аналитики
 analytics = QueueAnalytics()
 
+# Моменты, на которые /history без аргументов показывает позицию (часов назад)
+HISTORY_CHECKPOINTS = (1, 3, 6, 12, 24)
+HISTORY_RECENT_CHANGES = 5  # Сколько последних изменений позиции показывать
+
+HISTORY_USAGE = (
+    "Укажите момент времени, например:\n"
+    "<code>/history 9:00</code> - сегодня (или вчера, если это время еще не наступило)\n"
+    "<code>/history вчера 9:00</code>\n"
+    "<code>/history 15.10 18:30</code>"
+)
+
 
 async def cmd_help(message: Message):
     """Обработчик команды /help."""
@@ -23,6 +36,7 @@ async def cmd_help(message: Message):
         "<b>Доступные команды:</b>\n"
         "/start - Запустить бота и ввести/изменить номер автомобиля\n"
         "/check - Проверить текущую позицию в очереди\n"
+        "/history - Где был автомобиль в очереди раньше\n"
         "/settings - Настроить уведомления\n"
         "/help - Показать эту справку\n\n"
         "<b>Настройки уведомлений:</b>\n"
@@ -45,6 +59,7 @@ async def help_callback(callback: CallbackQuery):
         "<b>Доступные команды:</b>\n"
         "/start - Запустить бота и ввести/изменить номер автомобиля\n"
         "/check - Проверить текущую позицию в очереди\n"
+        "/history - Где был автомобиль в очереди раньше\n"
         "/settings - Настроить уведомления\n"
         "/help - Показать эту справку\n\n"
         "<b>Настройки уведомлений:</b>\n"
@@ -64,8 +79,9 @@ async def cmd_stats(message: Message):
         day_of_week = now.weekday()
         hour = now.hour
         
-        # Получаем среднюю скорость
-        avg_speed = await analytics.get_average_velocity(day_of_week, hour)
+        # Получаем среднюю скорость очереди пользователя
+        queue_id = analytics.config.resolve_queue(await get_user_queue(message.from_user.id))
+        avg_speed = await analytics.get_average_velocity(day_of_week, hour, queue_id)
         
         days = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
         day_name = days[day_of_week]
@@ -73,7 +89,8 @@ async def cmd_stats(message: Message):
         await message.answer(
             f"📊 <b>Статистика очереди</b>\n\n"
             f"Текущее время: {hour}:00, {day_name}\n"
-            f"Средняя скорость движения очереди: <b>{avg_speed:.2f}</b> позиций/час\n\n"
+            f"Средняя скорость движения очереди: <b>{avg_speed:.2f}</b> позиций/час"
+            f"{format_queue_note({'queue_id': queue_id})}\n\n"
             f"Используйте /forecast для прогноза времени ожидания"
         )
     except Exception as e:
@@ -95,9 +112,13 @@ async def cmd_forecast(message: Message):
             return
         
         # Получаем данные о позиции автомобиля
-        parser = CoddParser()
+        parser = CoddParser(await get_user_queue(user_id))
         car_data = await parser.parse_car_data(car_number)
         
+        if not car_data and not parser.is_queue_available():
+            await message.answer(QUEUE_UNAVAILABLE_TEXT)
+            return
+        
         if not car_data:
             await message.answer(
                 f"Не удалось найти автомобиль с номером {car_number} в очереди.\n"
@@ -108,7 +129,7 @@ async def cmd_forecast(message: Message):
         position = car_data['queue_position']
         
         # Получаем прогноз
-        forecast = await analytics.predict_waiting_time(position)
+        forecast = await analytics.predict_waiting_time(position, car_data.get('queue_id', parser.queue_id))
         
         # Форматируем ожидаемое время
         expected_date = datetime.fromisoformat(forecast['expected_date'].replace('Z', '+00:00'))
@@ -117,18 +138,130 @@ async def cmd_forecast(message: Message):
         await message.answer(
             f"🔮 <b>Прогноз времени ожидания</b>\n\n"
             f"Автомобиль: <code>{car_number}</code>\n"
-            f"Текущая позиция: <b>{position}</b>\n\n"
+            f"Текущая позиция: <b>{position}</b>"
+            f"{format_queue_note(car_data)}\n\n"
             f"Примерное время ожидания: <b>{forecast['expected_hours']}</b> часов\n"
             f"Оптимистичный прогноз: {forecast['min_hours']} часов\n"
             f"Пессимистичный прогноз: {forecast['max_hours']} часов\n\n"
             f"Ожидаемое время достижения очереди: <b>{date_str}</b>\n"
             f"(при средней скорости {forecast['speed']} позиций/час)"
+            f"{format_stale_note(car_data)}"
         )
     except Exception as e:
         logging.error(f"Ошибка при выполнении команды forecast: {e}")
         await message.answer("Извините, не удалось получить прогноз.")
 
 
+def parse_history_moment(args: str, now: datetime) -> Optional[datetime]:
+    """
+    Момент времени из аргументов /history: "9:00" (сегодня, а если это время
+    еще не наступило - вчера), "вчера 9:00", "15.10 9:00" или "15.10.2026 9:00".
+    None - аргументы не распознаны.
+    """
+    parts = args.lower().split()
+    if not parts or len(parts) > 2:
+        return None
+    
+    hour, _, minute = parts[-1].partition(':')
+    try:
+        moment = now.replace(hour=int(hour), minute=int(minute or 0), second=0, microsecond=0)
+    except ValueError:
+        return None
+    
+    if len(parts) == 1:
+        return moment - timedelta(days=1) if moment > now else moment
+    
+    day = parts[0]
+    if day == 'вчера':
+        return moment - timedelta(days=1)
+    if day == 'сегодня':
+        return moment
+    
+    try:
+        date = [int(part) for part in day.split('.')]
+        if len(date) == 2:
+            return moment.replace(day=date[0], month=date[1])
+        if len(date) == 3:
+            return moment.replace(day=date[0], month=date[1], year=date[2])
+    except ValueError:
+        return None
+    return None
+
+
+def format_history_position(history: PositionHistory, car_number: str, moment: datetime) -> str:
+    """Позиция автомобиля и число автомобилей впереди на момент moment."""
+    timestamp = moment.timestamp()
+    if history.started_at is None or timestamp < history.started_at:
+        return "история еще не велась"
+    
+    position = history.position_at(car_number, timestamp)
+    if position is None:
+        return "не в очереди"
+    
+    front = history.front_at(timestamp)
+    if front is not None:
+        return f"позиция <b>{position}</b>, впереди ~{max(0, position - front)}"
+    return f"позиция <b>{position}</b>"
+
+
+async def cmd_history(message: Message, command: CommandObject):
+    """Показывает, где был автомобиль пользователя в очереди раньше."""
+    try:
+        user_id = message.from_user.id
+        car_number = await get_user_car(user_id)
+        
+        if not car_number:
+            await message.answer(
+                "Для просмотра истории сначала укажите номер вашего автомобиля через /start"
+            )
+            return
+        
+        history = get_position_history(await get_user_queue(user_id))
+        if history is None:
+            await message.answer("История позиций отключена.")
+            return
+        
+        now = datetime.now()
+        
+        if command.args:
+            # Позиция на конкретный момент
+            moment = parse_history_moment(command.args, now)
+            if moment is None or moment > now:
+                await message.answer(f"❓ Не удалось распознать время.\n\n{HISTORY_USAGE}")
+                return
+            
+            await message.answer(
+                f"🕰 <b>История позиции в очереди</b>\n\n"
+                f"Автомобиль: <code>{car_number}</code>\n"
+                f"{moment:%d.%m %H:%M}: {format_history_position(history, car_number, moment)}"
+            )
+            return
+        
+        # Позиция на несколько моментов назад и последние изменения за сутки
+        lines = [
+            f"{hours} ч назад ({now - timedelta(hours=hours):%d.%m %H:%M}): "
+            f"{format_history_position(history, car_number, now - timedelta(hours=hours))}"
+            for hours in HISTORY_CHECKPOINTS
+        ]
+        
+        changes = history.position_series(car_number, (now - timedelta(days=1)).timestamp(), now.timestamp())[1:]
+        if changes:
+            lines.append("\n<b>Последние изменения за сутки:</b>")
+            for point in changes[-HISTORY_RECENT_CHANGES:]:
+                position = "покинул очередь" if point.position == LEFT else f"позиция {point.position}"
+                lines.append(f"{datetime.fromtimestamp(point.timestamp):%d.%m %H:%M} - {position}")
+        
+        await message.answer(
+            f"🕰 <b>История позиции в очереди</b>\n\n"
+            f"Автомобиль: <code>{car_number}</code>\n\n"
+            + "\n".join(lines)
+            + f"\n\n{HISTORY_USAGE}"
+        )
+    except Exception as e:
+        logging.error(f"Ошибка при выполнении команды history: {e}")
+        await message.answer("Извините, не удалось получить историю позиций.")
+
+
 async def open_chat_callback(callback: CallbackQuery):
     """Обработчик инлайн-кнопки 'Анонимный чат'."""
     await callback.answer()
@@ -151,6 +284,7 @@ def get_command_router() -> Router:
     router.callback_query.register(help_callback, F.data == "help")
     router.message.register(cmd_stats, Command("stats"))
     router.message.register(cmd_forecast, Command("forecast"))
+    router.message.register(cmd_history, Command("history"))
     router.callback_query.register(open_chat_callback, F.data == "open_chat")
     
     return router 
\ No newline at end of file
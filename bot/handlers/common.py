@@ -1,5 +1,7 @@
 from aiogram import Router, F
-from aiogram.types import Message
+from aiogram.types import Message, CallbackQuery
+
+from bot.keyboards.keyboards import CAR_SUGGESTION_PREFIX
 
 
 async def echo(message: Message):
@@ -9,12 +11,23 @@ async def echo(message: Message):
     )
 
 
+async def outdated_suggestion_callback(callback: CallbackQuery):
+    """Кнопка похожего номера нажата уже после выхода из ввода номера."""
+    await callback.answer(
+        "Эти варианты номера устарели. Чтобы сменить номер, воспользуйтесь меню.",
+        show_alert=True
+    )
+
+
 def get_common_router() -> Router:
     """Создание роутера для общих обработчиков."""
     router = Router()
     
+    # Кнопки похожих номеров вне ожидания ввода номера (после /start, смены состояния или перезапуска)
+    router.callback_query.register(outdated_suggestion_callback, F.data.startswith(CAR_SUGGESTION_PREFIX))
+    
     # Эхо-обработчик должен быть последним
     # F.text - этот фильтр заменяет проверку на текстовые сообщения в Aiogram 3.x
     router.message.register(echo, F.text)
     
-    return router 
\ No newline at end of file
+    return router
@@ -8,7 +8,8 @@ import logging
 from bot.models.database import (
     get_notification_settings, 
     setup_notifications,
-    get_car_number
+    get_car_number,
+    get_user_queue
 )
 from bot.keyboards.keyboards import (
     get_main_menu, 
@@ -18,7 +19,7 @@ from bot.keyboards.keyboards import (
     get_queue_threshold_keyboard
 )
 from bot.config.config import load_config
-from bot.utils.message_utils import safe_edit_message
+from bot.utils.message_utils import safe_edit_message, format_stale_note, QUEUE_UNAVAILABLE_TEXT
 from bot.services.parser import CoddParser
 
 
@@ -506,7 +507,7 @@ async def back_to_main_callback(callback: CallbackQuery):
     
     if car_number:
         # Парсим текущую позицию в очереди
-        parser = CoddParser()
+        parser = CoddParser(await get_user_queue(callback.from_user.id))
         car_data = await parser.parse_car_data(car_number)
         
         if car_data:
@@ -516,9 +517,12 @@ async def back_to_main_callback(callback: CallbackQuery):
                 f"Автомобиль номер: <code>{car_data['car_number']}</code>\n"
                 f"Модель: {car_data['model']}\n"
                 f"Ваш номер в очереди: <b>{car_data['queue_position']}</b>\n"
-                f"Дата регистрации: {car_data['registration_date']}",
+                f"Дата регистрации: {car_data['registration_date']}"
+                f"{format_stale_note(car_data)}",
                 reply_markup=get_main_menu()
             )
+        elif not parser.is_queue_available():
+            await safe_edit_message(callback.message, QUEUE_UNAVAILABLE_TEXT, reply_markup=get_main_menu())
         else:
             await safe_edit_message(
                 callback.message,
@@ -1,12 +1,13 @@
 from aiogram import Router, F
-from aiogram.types import Message
+from aiogram.types import CallbackQuery, Message
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from bot.models.database import add_user, update_car_number, get_car_number
-from bot.keyboards.keyboards import get_main_menu
-from bot.services.parser import CoddParser
+from bot.models.database import add_user, update_car_number, get_car_number, get_user_queue
+from bot.keyboards.keyboards import CAR_SUGGESTION_PREFIX, get_car_suggestions_keyboard, get_main_menu
+from bot.services.parser import CoddParser, find_car, suggest_car_numbers
+from bot.utils.message_utils import format_queue_note, format_stale_note, QUEUE_UNAVAILABLE_TEXT
 
 
 class CarNumberState(StatesGroup):
@@ -26,7 +27,7 @@ async def cmd_start(message: Message, state: FSMContext):
     
     if current_car_number:
         # Если номер уже есть, показываем информацию
-        parser = CoddParser()
+        parser = CoddParser(await get_user_queue(message.from_user.id))
         car_data = await parser.parse_car_data(current_car_number)
         
         if car_data:
@@ -35,7 +36,16 @@ async def cmd_start(message: Message, state: FSMContext):
                 f"У вас уже введен номер автомобиля: <code>{current_car_number}</code>\n"
                 f"Модель: {car_data['model']}\n"
                 f"Ваш номер в очереди: <b>{car_data['queue_position']}</b>\n"
-                f"Дата регистрации: {car_data['registration_date']}",
+                f"Дата регистрации: {car_data['registration_date']}"
+                f"{format_queue_note(car_data)}"
+                f"{format_stale_note(car_data)}",
+                reply_markup=get_main_menu()
+            )
+        elif not parser.is_queue_available():
+            await message.answer(
+                f"👋 Добро пожаловать в бот <b>ЦОДД Электронная очередь</b>!\n\n"
+                f"У вас уже введен номер автомобиля: <code>{current_car_number}</code>\n\n"
+                f"{QUEUE_UNAVAILABLE_TEXT}",
                 reply_markup=get_main_menu()
             )
         else:
@@ -72,30 +82,56 @@ async def process_car_number(message: Message, state: FSMContext):
         )
         return
     
-    # Получаем данные об автомобиле через парсер
-    parser = CoddParser()
-    car_data = await parser.parse_car_data(car_number)
+    await save_car_number(message, state, message.from_user.id, car_number)
+
+
+async def car_suggestion_callback(callback: CallbackQuery, state: FSMContext):
+    """Обработчик выбора одного из похожих номеров."""
+    await callback.answer()
+    car_number = callback.data[len(CAR_SUGGESTION_PREFIX):]
+    await save_car_number(callback.message, state, callback.from_user.id, car_number)
+
+
+async def save_car_number(message: Message, state: FSMContext, user_id: int, car_number: str):
+    """Поиск автомобиля и сохранение номера; если номер не найден, предлагаются похожие."""
+    # Ищем автомобиль в очереди пользователя, затем в остальных очередях
+    queue_id, car_data = await find_car(car_number, await get_user_queue(user_id))
+    parser = CoddParser(queue_id)
     
     if car_data:
-        # Только если данные получены, обновляем номер автомобиля в БД
-        await update_car_number(message.from_user.id, car_number)
+        # Только если данные получены, обновляем номер автомобиля и очередь в БД
+        await update_car_number(user_id, car_number, queue_id)
         
         await message.answer(
             f"✅ Автомобиль успешно добавлен!\n\n"
             f"Автомобиль номер: <code>{car_data['car_number']}</code>\n"
             f"Модель: {car_data['model']}\n"
             f"Ваш номер в очереди: <b>{car_data['queue_position']}</b>\n"
-            f"Дата регистрации: {car_data['registration_date']}",
+            f"Дата регистрации: {car_data['registration_date']}"
+            f"{format_queue_note(car_data)}"
+            f"{format_stale_note(car_data)}",
             reply_markup=get_main_menu()
         )
         
         # Завершаем состояние только если успешно добавили номер
         await state.clear()
+    elif not parser.is_queue_available():
+        # Номер не проверить, пока сайт недоступен: оставляем ожидание ввода
+        await message.answer(QUEUE_UNAVAILABLE_TEXT)
     else:
-        await message.answer(
-            f"⚠️ Автомобиль с номером <code>{car_number}</code> не найден в очереди.\n"
-            f"Пожалуйста, проверьте правильность ввода номера или попробуйте позже."
-        )
+        # Похожие номера из того же снимка: повторный ввод не нужен, если ошибка в одном символе
+        suggestions = await suggest_car_numbers(car_number)
+        if suggestions:
+            await message.answer(
+                f"⚠️ Автомобиль с номером <code>{car_number}</code> не найден в очереди.\n"
+                f"Возможно, вы имели в виду один из этих номеров, или введите номер еще раз:",
+                reply_markup=get_car_suggestions_keyboard(suggestions)
+            )
+        else:
+            await message.answer(
+                f"⚠️ Автомобиль с номером <code>{car_number}</code> не найден в очереди.\n"
+                f"Пожалуйста, проверьте правильность ввода номера или попробуйте позже."
+            )
         # Оставляем пользователя в состоянии ожидания ввода номера
 
 
@@ -108,5 +144,8 @@ def get_start_router() -> Router:
     
     # Регистрируем обработчик ввода номера автомобиля только для конкретного состояния
     router.message.register(process_car_number, CarNumberState.waiting_for_car_number)
+    router.callback_query.register(
+        car_suggestion_callback, CarNumberState.waiting_for_car_number, F.data.startswith(CAR_SUGGESTION_PREFIX)
+    )
     
     return router 
\ No newline at end of file
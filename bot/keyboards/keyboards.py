@@ -1,6 +1,9 @@
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton
 
+# Префикс callback_data кнопок с похожими номерами
+CAR_SUGGESTION_PREFIX = "suggest_car:"
+
 
 def get_main_menu() -> InlineKeyboardBuilder:
     """Основное меню бота."""
@@ -20,6 +23,25 @@ def get_main_menu() -> InlineKeyboardBuilder:
     return builder.as_markup()
 
 
+def get_car_suggestions_keyboard(suggestions: list) -> InlineKeyboardBuilder:
+    """Клавиатура с похожими номерами, если введенный номер не найден."""
+    builder = InlineKeyboardBuilder()
+    
+    for car in suggestions:
+        callback_data = f"{CAR_SUGGESTION_PREFIX}{car['car_number']}"
+        # Telegram ограничивает callback_data 64 байтами
+        if len(callback_data.encode('utf-8')) > 64:
+            continue
+        builder.add(InlineKeyboardButton(
+            text=f"🚗 {car['car_number']} (№ {car['queue_position']})",
+            callback_data=callback_data
+        ))
+    
+    # По одному номеру в ряд
+    builder.adjust(1)
+    return builder.as_markup()
+
+
 def get_notification_settings_keyboard(settings: dict) -> InlineKeyboardBuilder:
     """Клавиатура для настроек уведомлений."""
     builder = InlineKeyboardBuilder()
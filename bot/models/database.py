@@ -87,10 +87,18 @@ async def init_db():
             user_id INTEGER PRIMARY KEY,
             username TEXT,
             car_number TEXT,
+            queue_id TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
         ''')
         
+        # Очередь пользователя появилась позже: добавляем колонку в существующие БД
+        async with db.execute('PRAGMA table_info(users)') as cursor:
+            user_columns = [row[1] async for row in cursor]
+        if 'queue_id' not in user_columns:
+            await db.execute('ALTER TABLE users ADD COLUMN queue_id TEXT')
+            logger.info("В таблицу users добавлена колонка queue_id")
+        
         # Таблица настроек уведомлений
         await db.execute('''
         CREATE TABLE IF NOT EXISTS notification_settings (
@@ -170,16 +178,22 @@ async def add_user(user_id: int, username: str = None) -> bool:
         return False
 
 
-async def update_car_number(user_id: int, car_number: str) -> bool:
-    """Обновить номер автомобиля пользователя."""
+async def update_car_number(user_id: int, car_number: str, queue_id: Optional[str] = None) -> bool:
+    """Обновить номер автомобиля пользователя и, если задана, очередь, в которой он стоит."""
     try:
         db = await get_db_connection()
-        await db.execute(
-            'UPDATE users SET car_number = ? WHERE user_id = ?',
-            (car_number, user_id)
-        )
+        if queue_id is None:
+            await db.execute(
+                'UPDATE users SET car_number = ? WHERE user_id = ?',
+                (car_number, user_id)
+            )
+        else:
+            await db.execute(
+                'UPDATE users SET car_number = ?, queue_id = ? WHERE user_id = ?',
+                (car_number, queue_id, user_id)
+            )
         await db.commit()
-        logger.info(f"Обновлен номер автомобиля: user_id={user_id}, car_number={car_number}")
+        logger.info(f"Обновлен номер автомобиля: user_id={user_id}, car_number={car_number}, queue_id={queue_id}")
         return True
     except Exception as e:
         logger.error(f"Ошибка при обновлении номера автомобиля: {e}")
@@ -205,6 +219,21 @@ async def get_car_number(user_id: int) -> Optional[str]:
 get_user_car = get_car_number
 
 
+async def get_user_queue(user_id: int) -> Optional[str]:
+    """Получить очередь пользователя (None - очередь по умолчанию)."""
+    try:
+        db = await get_db_connection()
+        async with db.execute(
+            'SELECT queue_id FROM users WHERE user_id = ?',
+            (user_id,)
+        ) as cursor:
+            result = await cursor.fetchone()
+            return result[0] if result else None
+    except Exception as e:
+        logger.error(f"Ошибка при получении очереди пользователя: {e}")
+        return None
+
+
 async def setup_notifications(user_id: int, settings: Dict) -> bool:
     """Обновить настройки уведомлений."""
     try:
@@ -320,15 +349,15 @@ async def update_last_notification(user_id: int) -> None:
         logger.error(f"Ошибка при обновлении времени последнего уведомления: {e}")
 
 
-async def get_users_for_notification() -> List[Tuple[int, str, Dict]]:
-    """Получить список пользователей для отправки уведомлений."""
+async def get_users_for_notification() -> List[Tuple[int, str, Optional[str], Dict]]:
+    """Получить список пользователей для отправки уведомлений: (user_id, номер, очередь, настройки)."""
     result = []
     
     try:
         db = await get_db_connection()
         query = """
         SELECT 
-            u.user_id, u.car_number, 
+            u.user_id, u.car_number, u.queue_id,
             ns.interval_mode, ns.interval_minutes, 
             ns.position_change, ns.threshold_change, 
             ns.threshold_value, ns.enabled, ns.last_notification
@@ -339,17 +368,17 @@ async def get_users_for_notification() -> List[Tuple[int, str, Dict]]:
         
         async with db.execute(query) as cursor:
             async for row in cursor:
-                user_id, car_number = row[0], row[1]
+                user_id, car_number, queue_id = row[0], row[1], row[2]
                 settings = {
-                    'interval_mode': bool(row[2]),
-                    'interval_minutes': int(row[3]),
-                    'position_change': bool(row[4]),
-                    'threshold_change': bool(row[5]),
-                    'threshold_value': int(row[6]),
-                    'enabled': bool(row[7]),
-                    'last_notification': row[8]
+                    'interval_mode': bool(row[3]),
+                    'interval_minutes': int(row[4]),
+                    'position_change': bool(row[5]),
+                    'threshold_change': bool(row[6]),
+                    'threshold_value': int(row[7]),
+                    'enabled': bool(row[8]),
+                    'last_notification': row[9]
                 }
-                result.append((user_id, car_number, settings))
+                result.append((user_id, car_number, queue_id, settings))
         
         logger.debug(f"Получен список из {len(result)} пользователей для уведомлений")
         return result
@@ -437,7 +466,7 @@ async def save_chat_message(user_id: int, message_text: str, media_info: Dict =
         
         if car_number:
             from bot.services.parser import CoddParser
-            parser = CoddParser()
+            parser = CoddParser(await get_user_queue(user_id))
             car_data = await parser.parse_car_data(car_number)
             if car_data:
                 queue_position = car_data['queue_position']
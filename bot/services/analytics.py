@@ -3,29 +3,77 @@ import logging
 import sqlite3
 from datetime import datetime, timedelta
 import statistics
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Mapping, Optional, Tuple
 
 from bot.config.config import load_config
 from bot.models.database import get_db_connection
-from bot.services.parser import CoddParser
+from bot.services.page_archive import get_page_archive
+from bot.services.parser import CoddParser, replay_archive
+
+# Таблицы, в которых до поддержки нескольких очередей ключ уникальности не включал очередь
+QUEUE_KEYED_TABLES = ('queue_velocity', 'day_of_week_stats')
+
+
+def summarize_snapshot(cars_data: Mapping) -> Optional[Tuple[int, int, int]]:
+    """Длина очереди, первая и последняя позиции; None, если позиций нет."""
+    positions = []
+    for car_info in cars_data.values():
+        position = car_info.get('queue_position')
+        if position and position > 0:
+            positions.append(position)
+    
+    if not positions:
+        return None
+    
+    return len(positions), min(positions), max(positions)
 
 
 class QueueAnalytics:
+    """
+    Статистика движения очередей: снимки, скорость и прогноз ожидания.
+    
+    Все записи хранятся с идентификатором очереди, поэтому у каждой
+    очереди из CODD_QUEUES своя скорость и свой прогноз.
+    """
+    
     def __init__(self):
         self.config = load_config()
         self.logger = logging.getLogger("analytics")
-        self.parser = CoddParser()
-        
+        self.parsers = {queue_id: CoddParser(queue_id) for queue_id in self.config.queue_sources()}
+    
+    async def _table_columns(self, cursor, table: str) -> List[str]:
+        """Колонки таблицы; пустой список, если таблицы нет."""
+        await cursor.execute(f'PRAGMA table_info({table})')
+        return [row[1] for row in await cursor.fetchall()]
+    
     async def setup(self):
         """Инициализация таблиц БД для аналитики."""
         try:
             conn = await get_db_connection()
             cursor = await conn.cursor()
             
+            # Таблицы, созданные до поддержки нескольких очередей, получают колонку queue_id;
+            # старые записи относятся к очереди по умолчанию
+            default_queue = self.config.default_queue
+            columns = await self._table_columns(cursor, 'queue_snapshots')
+            if columns and 'queue_id' not in columns:
+                await cursor.execute('ALTER TABLE queue_snapshots ADD COLUMN queue_id TEXT')
+                await cursor.execute('UPDATE queue_snapshots SET queue_id = ?', (default_queue,))
+                self.logger.info("В таблицу queue_snapshots добавлена колонка queue_id")
+            
+            # Ограничение уникальности в SQLite не изменить: таблица пересоздается с переносом данных
+            legacy_tables = []
+            for table in QUEUE_KEYED_TABLES:
+                columns = await self._table_columns(cursor, table)
+                if columns and 'queue_id' not in columns:
+                    await cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_legacy')
+                    legacy_tables.append((table, [column for column in columns if column != 'id']))
+            
             # Создаем таблицы, если они не существуют
             await cursor.execute('''
                 CREATE TABLE IF NOT EXISTS queue_snapshots (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    queue_id TEXT,
                     timestamp DATETIME NOT NULL,
                     day_of_week INTEGER NOT NULL,
                     hour INTEGER NOT NULL,
@@ -36,22 +84,29 @@ class QueueAnalytics:
                 )
             ''')
             
+            await cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_queue_snapshots_queue_time
+                ON queue_snapshots (queue_id, timestamp)
+            ''')
+            
             await cursor.execute('''
                 CREATE TABLE IF NOT EXISTS queue_velocity (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    queue_id TEXT NOT NULL,
                     date DATE NOT NULL,
                     hour INTEGER NOT NULL,
                     day_of_week INTEGER NOT NULL,
                     positions_per_hour REAL,
                     cars_processed INTEGER,
                     is_aggregated BOOLEAN DEFAULT 0,
-                    UNIQUE(date, hour, is_aggregated)
+                    UNIQUE(queue_id, date, hour, is_aggregated)
                 )
             ''')
             
             await cursor.execute('''
                 CREATE TABLE IF NOT EXISTS day_of_week_stats (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    queue_id TEXT NOT NULL,
                     day_of_week INTEGER NOT NULL,
                     hour INTEGER NOT NULL,
                     avg_positions_per_hour REAL,
@@ -60,10 +115,19 @@ class QueueAnalytics:
                     std_deviation REAL,
                     sample_count INTEGER,
                     last_updated DATETIME,
-                    UNIQUE(day_of_week, hour)
+                    UNIQUE(queue_id, day_of_week, hour)
                 )
             ''')
             
+            for table, columns in legacy_tables:
+                names = ', '.join(columns)
+                await cursor.execute(
+                    f'INSERT INTO {table} (queue_id, {names}) SELECT ?, {names} FROM {table}_legacy',
+                    (default_queue,)
+                )
+                await cursor.execute(f'DROP TABLE {table}_legacy')
+                self.logger.info(f"Таблица {table} перенесена в схему с идентификатором очереди")
+            
             await conn.commit()
             await cursor.close()
             await conn.close()
@@ -72,45 +136,93 @@ class QueueAnalytics:
         except Exception as e:
             self.logger.error(f"Ошибка при инициализации таблиц аналитики: {e}")
             
-    async def record_snapshot(self):
+    def replay_metrics(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        queue_id: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Метрики очереди по архиву страниц, без сети и записи в БД.
+        
+        Args:
+            start: Начало периода (timestamp)
+            end: Конец периода (timestamp)
+            queue_id: Очередь (по умолчанию - основная)
+        """
+        results = []
+        previous = None
+        
+        archive = get_page_archive(queue_id)
+        if archive is None:
+            return results
+        
+        for timestamp, cars in replay_archive(archive, start=start, end=end):
+            metrics = summarize_snapshot(cars)
+            if metrics is None:
+                self.logger.warning(f"Нет данных о позициях в сохраненной странице от {datetime.fromtimestamp(timestamp)}")
+                continue
+            
+            queue_length, first_position, last_position = metrics
+            item = {
+                'timestamp': timestamp,
+                'queue_length': queue_length,
+                'first_position': first_position,
+                'last_position': last_position,
+                'cars_processed': None,
+                'positions_per_hour': None,
+            }
+            
+            # Скорость считается так же, как при записи снимков
+            if previous and previous['first_position'] > first_position:
+                item['cars_processed'] = previous['first_position'] - first_position
+                hours = (timestamp - previous['timestamp']) / 3600
+                if hours > 0:
+                    item['positions_per_hour'] = item['cars_processed'] / hours
+            
+            results.append(item)
+            previous = item
+        
+        return results
+    
+    async def record_snapshots(self):
+        """Записывает снимки всех очередей по очереди: записи в БД не перемежаются."""
+        for queue_id in self.parsers:
+            await self.record_snapshot(queue_id)
+    
+    async def record_snapshot(self, queue_id: Optional[str] = None):
         """Записывает текущий снимок состояния очереди."""
+        queue_id = self.config.resolve_queue(queue_id)
         try:
             current_time = datetime.now()
             day_of_week = current_time.weekday()  # 0-6, пн-вс
             hour = current_time.hour
             
             # Получаем данные о всех автомобилях
-            cars_data = await self.parser.parse_all_cars()
+            cars_data = await self.parsers[queue_id].parse_all_cars(max_age=0, allow_stale=False)
             if not cars_data:
-                self.logger.warning("Не удалось получить данные о автомобилях для снимка")
+                self.logger.warning(f"Не удалось получить данные о автомобилях для снимка очереди {queue_id}")
                 return False
                 
-            # Анализируем данные
-            positions = []
-            for car_info in cars_data.values():
-                position = car_info.get('queue_position')
-                if position and position > 0:
-                    positions.append(position)
-            
             # Вычисляем метрики
-            if not positions:
-                self.logger.warning("Нет данных о позициях для снимка")
+            metrics = summarize_snapshot(cars_data)
+            if metrics is None:
+                self.logger.warning(f"Нет данных о позициях для снимка очереди {queue_id}")
                 return False
                 
-            queue_length = len(positions)
-            first_position = min(positions) if positions else None
-            last_position = max(positions) if positions else None
+            queue_length, first_position, last_position = metrics
             
             # Получаем предыдущий снимок для вычисления скорости
             conn = await get_db_connection()
             cursor = await conn.cursor()
             
-            # Находим последний снимок
+            # Находим последний снимок этой очереди
             await cursor.execute('''
                 SELECT first_position, timestamp 
                 FROM queue_snapshots 
+                WHERE queue_id = ?
                 ORDER BY timestamp DESC LIMIT 1
-            ''')
+            ''', (queue_id,))
             
             prev_snapshot = await cursor.fetchone()
             cars_processed = None
@@ -131,9 +243,10 @@ class QueueAnalytics:
                         # Сохраняем данные о скорости
                         await cursor.execute('''
                             INSERT OR REPLACE INTO queue_velocity 
-                            (date, hour, day_of_week, positions_per_hour, cars_processed, is_aggregated)
-                            VALUES (?, ?, ?, ?, ?, 0)
+                            (queue_id, date, hour, day_of_week, positions_per_hour, cars_processed, is_aggregated)
+                            VALUES (?, ?, ?, ?, ?, ?, 0)
                         ''', (
+                            queue_id,
                             current_time.date().isoformat(),
                             hour,
                             day_of_week,
@@ -144,9 +257,10 @@ class QueueAnalytics:
             # Записываем снимок
             await cursor.execute('''
                 INSERT INTO queue_snapshots 
-                (timestamp, day_of_week, hour, queue_length, first_position, last_position, cars_processed)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                (queue_id, timestamp, day_of_week, hour, queue_length, first_position, last_position, cars_processed)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
+                queue_id,
                 current_time.isoformat(),
                 day_of_week,
                 hour,
@@ -159,22 +273,23 @@ class QueueAnalytics:
             await conn.commit()
             
             # Обновляем агрегированные статистики
-            await self.update_day_of_week_stats(day_of_week, hour)
+            await self.update_day_of_week_stats(day_of_week, hour, queue_id)
             
             # Удаляем старые данные
             await self.cleanup_old_data()
             
             await cursor.close()  # Закрываем только курсор, но не соединение
             
-            self.logger.info(f"Записан снимок очереди: длина={queue_length}, первая позиция={first_position}")
+            self.logger.info(f"Записан снимок очереди {queue_id}: длина={queue_length}, первая позиция={first_position}")
             return True
             
         except Exception as e:
-            self.logger.error(f"Ошибка при записи снимка очереди: {e}")
+            self.logger.error(f"Ошибка при записи снимка очереди {queue_id}: {e}")
             return False
     
-    async def update_day_of_week_stats(self, day_of_week: int, hour: int):
-        """Обновляет агрегированные статистики по дню недели и часу."""
+    async def update_day_of_week_stats(self, day_of_week: int, hour: int, queue_id: Optional[str] = None):
+        """Обновляет агрегированные статистики очереди по дню недели и часу."""
+        queue_id = self.config.resolve_queue(queue_id)
         try:
             conn = await get_db_connection()
             cursor = await conn.cursor()
@@ -185,9 +300,9 @@ class QueueAnalytics:
             await cursor.execute('''
                 SELECT positions_per_hour 
                 FROM queue_velocity 
-                WHERE day_of_week = ? AND hour = ? AND date >= ? AND positions_per_hour > 0
+                WHERE queue_id = ? AND day_of_week = ? AND hour = ? AND date >= ? AND positions_per_hour > 0
                 ORDER BY date DESC
-            ''', (day_of_week, hour, ninety_days_ago))
+            ''', (queue_id, day_of_week, hour, ninety_days_ago))
             
             rows = await cursor.fetchall()
             if not rows:
@@ -206,10 +321,11 @@ class QueueAnalytics:
             # Обновляем запись в day_of_week_stats
             await cursor.execute('''
                 INSERT OR REPLACE INTO day_of_week_stats 
-                (day_of_week, hour, avg_positions_per_hour, min_positions_per_hour, 
+                (queue_id, day_of_week, hour, avg_positions_per_hour, min_positions_per_hour, 
                 max_positions_per_hour, std_deviation, sample_count, last_updated)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
+                queue_id,
                 day_of_week,
                 hour,
                 avg_speed,
@@ -223,7 +339,7 @@ class QueueAnalytics:
             await conn.commit()
             await cursor.close()
             
-            self.logger.info(f"Обновлена статистика для дня {day_of_week}, часа {hour}: "
+            self.logger.info(f"Обновлена статистика очереди {queue_id} для дня {day_of_week}, часа {hour}: "
                             f"avg={avg_speed:.2f}, samples={len(speeds)}")
             
         except Exception as e:
@@ -257,8 +373,9 @@ class QueueAnalytics:
                 # Агрегируем данные по дням недели и часам
                 await cursor.execute('''
                     INSERT OR REPLACE INTO queue_velocity 
-                    (date, hour, day_of_week, positions_per_hour, cars_processed, is_aggregated)
+                    (queue_id, date, hour, day_of_week, positions_per_hour, cars_processed, is_aggregated)
                     SELECT 
+                        queue_id,
                         date(date, 'start of month') as month_start,
                         hour,
                         day_of_week,
@@ -267,7 +384,7 @@ class QueueAnalytics:
                         1 as is_aggregated
                     FROM queue_velocity
                     WHERE date < ? AND is_aggregated = 0
-                    GROUP BY month_start, hour, day_of_week
+                    GROUP BY queue_id, month_start, hour, day_of_week
                 ''', (thirty_days_ago,))
                 
                 # Удаляем исходные данные, которые были агрегированы
@@ -285,8 +402,10 @@ class QueueAnalytics:
             self.logger.error(f"Ошибка при очистке старых данных: {e}")
     
     async def get_average_velocity(self, day_of_week: Optional[int] = None, 
-                                 hour: Optional[int] = None) -> float:
+                                 hour: Optional[int] = None,
+                                 queue_id: Optional[str] = None) -> float:
         """Возвращает среднюю скорость движения очереди для указанного времени."""
+        queue_id = self.config.resolve_queue(queue_id)
         try:
             conn = await get_db_connection()
             cursor = await conn.cursor()
@@ -294,9 +413,9 @@ class QueueAnalytics:
             query = '''
                 SELECT avg_positions_per_hour
                 FROM day_of_week_stats
-                WHERE 1=1
+                WHERE queue_id = ?
             '''
-            params = []
+            params = [queue_id]
             
             if day_of_week is not None:
                 query += " AND day_of_week = ?"
@@ -322,8 +441,9 @@ class QueueAnalytics:
             self.logger.error(f"Ошибка при получении средней скорости: {e}")
             return 0.0
     
-    async def predict_waiting_time(self, current_position: int) -> Dict:
-        """Предсказывает время ожидания для указанной позиции."""
+    async def predict_waiting_time(self, current_position: int, queue_id: Optional[str] = None) -> Dict:
+        """Предсказывает время ожидания для указанной позиции в очереди queue_id."""
+        queue_id = self.config.resolve_queue(queue_id)
         try:
             # Получаем текущее время
             now = datetime.now()
@@ -331,10 +451,10 @@ class QueueAnalytics:
             hour = now.hour
             
             # Получаем среднюю скорость для текущего времени
-            avg_speed = await self.get_average_velocity(day_of_week, hour)
+            avg_speed = await self.get_average_velocity(day_of_week, hour, queue_id)
             if avg_speed <= 0:
                 # Если нет данных для текущего часа, берем среднее за все время
-                avg_speed = await self.get_average_velocity()
+                avg_speed = await self.get_average_velocity(queue_id=queue_id)
             
             # Если все еще нет данных, используем значение по умолчанию
             if avg_speed <= 0:
@@ -350,8 +470,8 @@ class QueueAnalytics:
             await cursor.execute('''
                 SELECT std_deviation
                 FROM day_of_week_stats
-                WHERE day_of_week = ? AND hour = ?
-            ''', (day_of_week, hour))
+                WHERE queue_id = ? AND day_of_week = ? AND hour = ?
+            ''', (queue_id, day_of_week, hour))
             
             row = await cursor.fetchone()
             std_dev = row[0] if row else 0
@@ -389,8 +509,8 @@ class QueueAnalytics:
     async def close(self):
         """Освобождает ресурсы сервиса аналитики."""
         self.logger.info("Закрытие сервиса аналитики")
-        if hasattr(self.parser, 'close'):
-            await self.parser.close()
+        # Парсеры очередей делят HTTP-сессию и пул процессов: достаточно закрыть один
+        await self.parsers[self.config.default_queue].close()
         self.logger.info("Сервис аналитики остановлен")
 
 async def start_analytics_service():
@@ -0,0 +1,72 @@
+import logging
+import time
+from typing import Dict
+
+# Состояния автомата
+CLOSED = 'closed'  # Запросы идут к источнику
+OPEN = 'open'  # Источник недоступен, запросы не выполняются до конца паузы
+HALF_OPEN = 'half_open'  # Пауза закончилась, пробный запрос решает, закрыться ли снова
+
+
+class CircuitBreaker:
+    """
+    Автомат защиты от недоступного источника.
+
+    После failure_threshold неудач подряд запросы к источнику прекращаются
+    на cooldown секунд. Затем разрешается один пробный запрос: успех
+    закрывает автомат, неудача открывает его снова на ту же паузу.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, cooldown: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.logger = logging.getLogger("parser")
+
+        self.state = CLOSED
+        self.failures = 0  # Неудачи подряд
+        self.opened_at = 0.0
+        self.trips = 0  # Сколько раз автомат открывался
+
+    @property
+    def retry_in(self) -> float:
+        """Через сколько секунд будет разрешен пробный запрос."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - time.time())
+
+    def allow(self) -> bool:
+        """Можно ли сейчас обращаться к источнику."""
+        if self.state == OPEN and self.retry_in == 0:
+            self.state = HALF_OPEN
+            self.logger.info(f"Источник '{self.name}': пауза закончилась, пробный запрос")
+        return self.state != OPEN
+
+    def record_success(self):
+        """Учет успешного запроса."""
+        if self.state != CLOSED:
+            self.logger.info(f"Источник '{self.name}' снова доступен")
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        """Учет неудачного запроса."""
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.trips += 1
+            self.state = OPEN
+            self.opened_at = time.time()
+            self.logger.warning(
+                f"Источник '{self.name}' недоступен ({self.failures} ошибок подряд), "
+                f"запросы приостановлены на {self.cooldown} с"
+            )
+
+    def stats(self) -> Dict:
+        """Состояние автомата."""
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'trips': self.trips,
+            'retry_in': round(self.retry_in, 1),
+        }
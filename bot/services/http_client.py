@@ -0,0 +1,134 @@
+import logging
+import zlib
+from typing import AsyncIterator, Optional
+
+import aiohttp
+
+from bot.config.config import load_config
+
+logger = logging.getLogger("parser")
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36'
+
+# Сжатие, которое умеет распаковывать BodyStream
+ACCEPT_ENCODING = 'gzip, deflate'
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # Размер части ответа при потоковой загрузке
+
+# Общая для процесса HTTP-сессия с пулом соединений
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Возвращает общую HTTP-сессию, создавая ее при первом обращении."""
+    global _session
+
+    if _session is None or _session.closed:
+        config = load_config()
+
+        connector = aiohttp.TCPConnector(
+            limit=config.http_pool_size,  # Ограничиваем число одновременных соединений
+            ttl_dns_cache=300,  # Кешируем DNS на 5 минут
+            keepalive_timeout=config.http_keepalive_timeout
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=config.http_total_timeout,
+            connect=config.http_connect_timeout,
+            sock_read=config.http_read_timeout
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={'User-Agent': USER_AGENT}
+        )
+        logger.debug(
+            f"Создана HTTP-сессия: пул {config.http_pool_size}, "
+            f"таймауты {config.http_connect_timeout}/{config.http_read_timeout}/{config.http_total_timeout} с"
+        )
+
+    return _session
+
+
+async def close_http_session():
+    """Закрывает общую HTTP-сессию."""
+    global _session
+
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("HTTP-сессия закрыта")
+
+    _session = None
+
+
+class BodyTooLarge(Exception):
+    """Ответ больше допустимого размера."""
+
+
+class BodyStream:
+    """
+    Потоковое чтение тела ответа с распаковкой gzip/deflate и пределом размера.
+    
+    Запрос нужно выполнять с auto_decompress=False и заголовком
+    Accept-Encoding: ACCEPT_ENCODING - тогда тело приходит сжатым,
+    распаковывается по частям и целиком в памяти не собирается.
+    Размер после распаковки ограничен max_size: распаковка идет не больше
+    чем до предела, поэтому сжатая "бомба" памяти не съест.
+    """
+    
+    def __init__(self, response: aiohttp.ClientResponse, max_size: int):
+        self.response = response
+        self.max_size = max_size
+        self.encoding = response.headers.get('Content-Encoding', 'identity').strip().lower()
+        self.wire_bytes = 0  # Получено по сети
+        self.decoded_bytes = 0  # После распаковки
+        
+        if self.encoding in ('gzip', 'x-gzip'):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == 'deflate':
+            self._decompressor = zlib.decompressobj()
+        elif self.encoding in ('identity', ''):
+            self._decompressor = None
+        else:
+            raise ValueError(f"Неподдерживаемое сжатие ответа: {self.encoding}")
+    
+    def _inflate(self, chunk: bytes) -> bytes:
+        limit = self.max_size - self.decoded_bytes + 1
+        try:
+            data = self._decompressor.decompress(chunk, limit)
+        except zlib.error:
+            if self.encoding != 'deflate' or self.wire_bytes != len(chunk):
+                raise
+            # Часть серверов отдает deflate без заголовка zlib
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            data = self._decompressor.decompress(chunk, limit)
+        if self._decompressor.unconsumed_tail:
+            raise BodyTooLarge(f"Ответ больше {self.max_size} байт после распаковки")
+        return data
+    
+    def _check_size(self):
+        if self.decoded_bytes > self.max_size:
+            raise BodyTooLarge(f"Ответ больше {self.max_size} байт")
+    
+    async def chunks(self, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Распакованные части тела ответа; при превышении предела - BodyTooLarge."""
+        declared = self.response.content_length
+        if self._decompressor is None and declared is not None and declared > self.max_size:
+            raise BodyTooLarge(f"Ответ больше {self.max_size} байт: Content-Length {declared}")
+        
+        async for chunk in self.response.content.iter_chunked(chunk_size):
+            self.wire_bytes += len(chunk)
+            data = self._inflate(chunk) if self._decompressor is not None else chunk
+            self.decoded_bytes += len(data)
+            self._check_size()
+            if data:
+                yield data
+        
+        if self._decompressor is not None:
+            data = self._decompressor.flush()
+            self.decoded_bytes += len(data)
+            self._check_size()
+            if data:
+                yield data
+    
+    async def read(self) -> bytes:
+        """Тело ответа целиком (с учетом предела размера)."""
+        return b''.join([chunk async for chunk in self.chunks()])
@@ -0,0 +1,99 @@
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional
+
+# Этапы получения снимка в порядке выполнения
+STAGES = ('fetch', 'json_decode', 'soup', 'js_extraction', 'table_extraction', 'normalization')
+
+
+class RollingHistogram:
+    """Распределение последних size значений с процентилями."""
+
+    def __init__(self, size: int = 1000):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self.count = 0  # Всего значений с момента запуска
+
+    def add(self, value: float):
+        self._samples.append(value)
+        self.count += 1
+
+    @staticmethod
+    def _rank(ordered: list, q: float) -> float:
+        """Процентиль q (0-100) отсортированного списка по ближайшему рангу."""
+        index = math.ceil(q / 100 * len(ordered)) - 1
+        return ordered[max(0, min(len(ordered) - 1, index))]
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Процентиль q (0-100) последних значений."""
+        if not self._samples:
+            return None
+        return self._rank(sorted(self._samples), q)
+
+    def summary(self) -> Dict:
+        if not self._samples:
+            return {'count': self.count}
+        ordered = sorted(self._samples)
+        return {
+            'count': self.count,
+            'last': round(self._samples[-1], 3),
+            'p50': round(self._rank(ordered, 50), 3),
+            'p95': round(self._rank(ordered, 95), 3),
+            'p99': round(self._rank(ordered, 99), 3),
+            'max': round(ordered[-1], 3),
+        }
+
+
+class ParserMetrics:
+    """
+    Время этапов получения снимка (в миллисекундах), размер страницы и
+    количество строк по последним измерениям.
+    """
+
+    def __init__(self, size: int = 1000):
+        self.size = size
+        self.stages: Dict[str, RollingHistogram] = {}
+        self.values: Dict[str, RollingHistogram] = {}
+
+    def _histogram(self, histograms: Dict[str, RollingHistogram], name: str) -> RollingHistogram:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = RollingHistogram(self.size)
+        return histogram
+
+    def record_stage(self, stage: str, seconds: float):
+        self._histogram(self.stages, stage).add(seconds * 1000)
+
+    def record_stages(self, timings: Dict[str, float]):
+        """Учет времени этапов одного разбора: этап -> секунды."""
+        for stage, seconds in timings.items():
+            self.record_stage(stage, seconds)
+
+    def record_value(self, name: str, value: float):
+        self._histogram(self.values, name).add(value)
+
+    def summary(self) -> Dict:
+        return {
+            'stages_ms': {stage: histogram.summary() for stage, histogram in self.stages.items()},
+            'values': {name: histogram.summary() for name, histogram in self.values.items()},
+        }
+
+
+@contextmanager
+def timed(timings: Dict[str, float], stage: str) -> Iterator[None]:
+    """Добавляет время выполнения блока к этапу stage в словаре timings."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+# Общие для процесса метрики парсера
+parser_metrics = ParserMetrics()
+
+
+def get_parser_metrics() -> Dict:
+    """Процентили времени этапов, размера страницы и количества строк."""
+    return parser_metrics.summary()
@@ -1,7 +1,8 @@
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 
 from aiogram import Bot
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -11,7 +12,12 @@ from bot.models.database import (
     get_users_for_notification, 
     update_last_notification, get_notification_settings, get_active_chat_users
 )
-from bot.services.parser import CoddParser
+from bot.services.parser import CoddParser, get_snapshot_service
+from bot.services.polling import AdaptivePollingScheduler
+from bot.services.position_history import get_position_history
+from bot.services.schema_drift import DriftAlert, subscribe_alerts, unsubscribe_alerts
+from bot.services.snapshot_store import load_state, queue_state_path, save_state
+from bot.services.queue_events import FrontAdvanced
 
 
 class NotificationService:
@@ -20,11 +26,33 @@ class NotificationService:
         self.config = load_config()
         self.logger = logging.getLogger("notifications")
         self.scheduler = AsyncIOScheduler()
-        self.parser = CoddParser()
+        
+        # Состояние каждой очереди хранится отдельно: ключ - идентификатор очереди
+        self.queues = list(self.config.queue_sources())
+        self.parsers = {queue_id: CoddParser(queue_id) for queue_id in self.queues}
+        self.parser = self.parsers[self.config.default_queue]
         
         # Хранение данных в памяти вместо БД
-        self.car_positions = {}  # Словарь для отслеживания позиций автомобилей
-        self.first_car_position = None  # Позиция первого автомобиля в очереди
+        self.car_positions: Dict[str, Dict[str, int]] = {queue_id: {} for queue_id in self.queues}  # Позиции автомобилей
+        self.first_car_position: Dict[str, Optional[int]] = {queue_id: None for queue_id in self.queues}  # Первая позиция в очереди
+        self.front_shift: Dict[str, int] = {queue_id: 0 for queue_id in self.queues}  # Сдвиг начала очереди с прошлой проверки
+        self._pending_front_shift: Dict[str, int] = {queue_id: 0 for queue_id in self.queues}  # Накопленный сдвиг по событиям снимков
+        self._front_handlers = {queue_id: partial(self._on_front_advanced, queue_id) for queue_id in self.queues}
+        
+        # Частота загрузки страницы подстраивается под скорость движения каждой очереди;
+        # сама проверка уведомлений идет с постоянным интервалом из конфигурации
+        self.polling: Dict[str, AdaptivePollingScheduler] = {}
+        if self.config.adaptive_polling:
+            self.polling = {
+                queue_id: AdaptivePollingScheduler(
+                    f'notifications:{queue_id}',
+                    self.config.notification_check_interval,
+                    self.config.poll_min_interval,
+                    self.config.poll_max_interval,
+                    self.config.poll_backoff_factor
+                )
+                for queue_id in self.queues
+            }
     
     async def start(self):
         """Запуск сервиса уведомлений."""
@@ -34,6 +62,28 @@ class NotificationService:
         check_interval = self.config.notification_check_interval
         self.logger.info(f"Интервал проверки уведомлений: {check_interval} секунд")
         
+        # Восстанавливаем снимок и позиции до начала опроса
+        await self._restore_state()
+        
+        # Предупреждения об изменении разметки страницы отправляем администратору
+        if self.config.alert_chat_id is not None:
+            subscribe_alerts(self._on_drift_alert)
+        
+        # Сдвиг начала каждой очереди берем из событий ее сервиса снимков
+        for queue_id in self.queues:
+            events = get_snapshot_service(queue_id).events
+            events.subscribe(self._front_handlers[queue_id], (FrontAdvanced,))
+            if queue_id in self.polling:
+                self.polling[queue_id].attach(events)
+        
+        # История позиций пишется по тем же событиям
+        for queue_id in self.queues:
+            history = get_position_history(queue_id)
+            if history is not None:
+                await history.load()
+                history.attach(get_snapshot_service(queue_id))
+                self.scheduler.add_job(history.compact, 'interval', hours=6, id=f'compact_history_{queue_id}')
+        
         # Планируем выполнение проверки уведомлений с настраиваемым интервалом
         self.scheduler.add_job(
             self.check_notifications,
@@ -48,11 +98,34 @@ class NotificationService:
         """Останавливает планировщик и освобождает ресурсы."""
         self.logger.info("Остановка сервиса уведомлений")
         self.scheduler.shutdown(wait=False)
+        await self._save_state()
+        unsubscribe_alerts(self._on_drift_alert)
+        for queue_id in self.queues:
+            events = get_snapshot_service(queue_id).events
+            events.unsubscribe(self._front_handlers[queue_id])
+            if queue_id in self.polling:
+                self.polling[queue_id].detach(events)
+            history = get_position_history(queue_id)
+            if history is not None:
+                history.detach(get_snapshot_service(queue_id))
+                await history.close()
         self.logger.info("Сервис уведомлений остановлен")
         
         if hasattr(self.parser, 'close'):
             await self.parser.close()
     
+    async def _on_drift_alert(self, alert: DriftAlert):
+        """Отправка предупреждения об изменении разметки страницы в чат ALERT_CHAT_ID."""
+        text = (
+            f"⚠️ Разметка страницы очереди изменилась: {alert.kind}\n"
+            f"Страница: {alert.source}\n"
+            f"Было: {alert.previous}, стало: {alert.current}"
+        )
+        try:
+            await self.bot.send_message(self.config.alert_chat_id, text)
+        except Exception as e:
+            self.logger.error(f"Ошибка при отправке предупреждения в чат {self.config.alert_chat_id}: {e}")
+    
     async def check_notifications(self):
         """Проверка и отправка уведомлений пользователям."""
         try:
@@ -60,30 +133,60 @@ class NotificationService:
             users = await get_users_for_notification()
             self.logger.info(f"Проверка уведомлений для {len(users)} пользователей")
             
-            # Обновляем позицию первого автомобиля в очереди
-            await self._update_first_car_position()
+            users_by_queue: Dict[str, List[Tuple[int, str, Dict]]] = {queue_id: [] for queue_id in self.queues}
+            for user_id, car_number, queue_id, settings in users:
+                users_by_queue[self.config.resolve_queue(queue_id)].append((user_id, car_number, settings))
             
-            for user_id, car_number, settings in users:
-                try:
-                    await self.process_user_notification(user_id, car_number, settings)
-                except Exception as e:
-                    self.logger.error(f"Ошибка при обработке уведомления для пользователя {user_id}: {e}")
+            # Очереди проверяются одновременно: медленный источник задерживает только своих пользователей
+            await asyncio.gather(*(
+                self._check_queue(queue_id, users_by_queue[queue_id]) for queue_id in self.queues
+            ))
+            
+            await self._save_state()
         
         except Exception as e:
             self.logger.error(f"Ошибка при проверке уведомлений: {e}")
     
-    async def process_user_notification(self, user_id: int, car_number: str, settings: Dict):
+    async def _check_queue(self, queue_id: str, users: List[Tuple[int, str, Dict]]) -> bool:
+        """Обновление снимка одной очереди и уведомления ее пользователей. Возвращает True, если снимок получен."""
+        # Обновляем снимок очереди и позицию первого автомобиля
+        loaded = await self._update_first_car_position(queue_id)
+        
+        # Первый снимок после запуска записывается в историю целиком: событий по нему нет
+        history = get_position_history(queue_id)
+        if history is not None:
+            await history.sync(get_snapshot_service(queue_id).snapshot)
+        
+        # Сдвиг очереди, накопленный с прошлой проверки
+        self.front_shift[queue_id] = self._pending_front_shift[queue_id]
+        self._pending_front_shift[queue_id] = 0
+        
+        for user_id, car_number, settings in users:
+            try:
+                await self.process_user_notification(user_id, car_number, settings, queue_id)
+            except Exception as e:
+                self.logger.error(f"Ошибка при обработке уведомления для пользователя {user_id}: {e}")
+        
+        return loaded
+    
+    async def process_user_notification(self, user_id: int, car_number: str, settings: Dict, queue_id: Optional[str] = None):
         """Обработка уведомлений для конкретного пользователя."""
-        # Получаем данные об автомобиле напрямую через парсер
-        car_data = await self.parser.parse_car_data(car_number)
+        queue_id = self.config.resolve_queue(queue_id)
+        car_positions = self.car_positions[queue_id]
+        
+        # Берем данные из снимка, обновленного (или признанного свежим) в начале проверки
+        car_data = await self.parsers[queue_id].parse_car_data(
+            car_number,
+            max_age=max(self.config.notification_check_interval, self._snapshot_max_age(queue_id))
+        )
         if not car_data:
             self.logger.warning(f"Нет данных об автомобиле {car_number} для пользователя {user_id}")
             return
         
         # Сохраняем текущую позицию для отслеживания изменений
         current_position = car_data['queue_position']
-        if car_number not in self.car_positions:
-            self.car_positions[car_number] = current_position
+        if car_number not in car_positions:
+            car_positions[car_number] = current_position
             # Пропускаем первое уведомление, чтобы избежать ложных срабатываний
             return
         
@@ -119,7 +222,7 @@ class NotificationService:
         # 2. При изменении позиции
         if settings.get('position_change'):
             # Получаем последнюю известную позицию
-            last_position = self.car_positions.get(car_number)
+            last_position = car_positions.get(car_number)
             
             if last_position and last_position != current_position:
                 send_notification = True
@@ -138,25 +241,22 @@ class NotificationService:
                 )
                 
                 # Обновляем сохраненную позицию
-                self.car_positions[car_number] = current_position
+                car_positions[car_number] = current_position
         
         # 3. При сдвиге очереди на N позиций
-        if settings.get('threshold_change') and self.first_car_position is not None:
-            last_first_position = self._get_last_first_position()
-            current_first_position = self.first_car_position
+        # Откат начала очереди назад (сбой или правка на сайте) продвижением не считается
+        if settings.get('threshold_change') and self.front_shift[queue_id] > 0:
+            threshold = settings.get('threshold_value', 10)
+            position_change = self.front_shift[queue_id]
             
-            if last_first_position and current_first_position:
-                threshold = settings.get('threshold_value', 10)
-                position_change = last_first_position - current_first_position
-                
-                if position_change >= threshold:
-                    send_notification = True
-                    notification_text = (
-                        f"📊 *Очередь сдвинулась на {position_change} позиций!*\n\n"
-                        f"Автомобиль номер: `{car_data['car_number']}`\n"
-                        f"Ваш номер в очереди: *{car_data['queue_position']}*\n"
-                        f"Дата регистрации: {car_data['registration_date']}"
-                    )
+            if position_change >= threshold:
+                send_notification = True
+                notification_text = (
+                    f"📊 *Очередь сдвинулась на {position_change} позиций!*\n\n"
+                    f"Автомобиль номер: `{car_data['car_number']}`\n"
+                    f"Ваш номер в очереди: *{car_data['queue_position']}*\n"
+                    f"Дата регистрации: {car_data['registration_date']}"
+                )
         
         # 4. При достижении порогового значения очереди
         if settings.get('queue_threshold'):
@@ -194,28 +294,87 @@ class NotificationService:
             except Exception as e:
                 self.logger.error(f"Ошибка при отправке уведомления пользователю {user_id}: {e}")
     
-    async def _update_first_car_position(self):
-        """Обновляет позицию первого автомобиля в очереди."""
+    async def _restore_state(self):
+        """Загружает сохраненные снимки и последние позиции автомобилей всех очередей."""
+        for queue_id in self.queues:
+            path = queue_state_path(self.config.state_path, queue_id, self.config.default_queue)
+            state = await load_state(path)
+            if state is None:
+                continue
+            
+            self.car_positions[queue_id].update(state.car_positions)
+            self.first_car_position[queue_id] = state.first_car_position
+            
+            # Снимок отдается без запроса к сайту, пока его возраст допустим,
+            # а при недоступности сайта - с пометкой об устаревании
+            service = get_snapshot_service(queue_id)
+            if service.snapshot is None:
+                await service.apply(state.snapshot.cars, state.snapshot.fetched_at, state.snapshot.stale)
+    
+    async def _save_state(self):
+        """Сохраняет текущие снимки и позиции для быстрого старта после перезапуска."""
+        for queue_id in self.queues:
+            snapshot = get_snapshot_service(queue_id).snapshot
+            if snapshot is not None:
+                await save_state(
+                    queue_state_path(self.config.state_path, queue_id, self.config.default_queue),
+                    snapshot,
+                    self.car_positions[queue_id],
+                    self.first_car_position[queue_id]
+                )
+    
+    def _snapshot_max_age(self, queue_id: str) -> float:
+        """
+        Допустимый возраст снимка очереди при проверке уведомлений.
+        
+        Без адаптивного опроса страница загружается на каждой проверке.
+        С ним - только если к следующей проверке снимок стал бы старше
+        адаптивного интервала очереди.
+        """
+        polling = self.polling.get(queue_id)
+        if polling is None:
+            return 0
+        return max(0, polling.interval - self.config.notification_check_interval)
+    
+    async def _update_first_car_position(self, queue_id: str) -> bool:
+        """Обновляет позицию первого автомобиля в очереди. Возвращает True, если снимок получен."""
+        loaded = False
+        service = get_snapshot_service(queue_id)
+        previous = service.snapshot
+        max_age = self._snapshot_max_age(queue_id)
+        if previous is not None and previous.age > max_age:
+            # Устаревший снимок загружаем с ожиданием: без max_age=0 сервис отдал бы
+            # прошлый снимок, обновив его в фоне
+            max_age = 0
         try:
-            # Получаем данные о первой машине в очереди
-            # Это пример, на практике нужно реализовать логику получения первой машины
-            # через парсер или другие методы
-            first_car_data = await self.parser.get_first_car_position()
+            # Обновляем снимок, если он устарел: по нему затем проверяются все пользователи очереди
+            first_car_data = await self.parsers[queue_id].get_first_car_position(max_age=max_age)
             
             if first_car_data is not None:
-                # Сохраняем предыдущую позицию
-                old_position = self.first_car_position
+                self.first_car_position[queue_id] = first_car_data
                 
-                # Обновляем текущую позицию
-                self.first_car_position = first_car_data
-                
-                self.logger.info(f"Позиция первого автомобиля обновлена: {self.first_car_position}")
+                self.logger.info(f"Позиция первого автомобиля в очереди {queue_id} обновлена: {first_car_data}")
+                loaded = True
         except Exception as e:
-            self.logger.error(f"Ошибка при обновлении позиции первого автомобиля: {e}")
+            self.logger.error(f"Ошибка при обновлении позиции первого автомобиля в очереди {queue_id}: {e}")
+        
+        # Интервал загрузки пересчитывается только по новой загрузке (или ее ошибке),
+        # а не по каждой проверке, взявшей готовый снимок
+        polling = self.polling.get(queue_id)
+        if polling is not None and (not loaded or service.snapshot is not previous):
+            previous_interval = polling.interval
+            interval = polling.next_interval(loaded)
+            if interval != previous_interval:
+                self.logger.info(f"Интервал загрузки очереди {queue_id}: {interval:.0f} секунд ({polling.reason})")
+        return loaded
     
-    def _get_last_first_position(self) -> Optional[int]:
-        """Возвращает сохраненную позицию первого автомобиля."""
-        return getattr(self, '_last_first_position', self.first_car_position)
+    def _on_front_advanced(self, queue_id: str, events):
+        """
+        Накопление сдвига начала очереди из событий ее сервиса снимков.
+        Сдвиг знаковый: откат с последующим возвратом не дает ложного продвижения.
+        """
+        for event in events:
+            self._pending_front_shift[queue_id] += event.shift
 
 
 async def start_notification_service(bot: Bot):
@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from bot.config.config import get_config
+
+logger = logging.getLogger("parser")
+
+INDEX_FILE = "index.jsonl"
+PAGE_SUFFIX = ".html.z"
+
+
+class ArchiveEntry(NamedTuple):
+    """Запись индекса: с момента timestamp страница имела содержимое digest."""
+    timestamp: float
+    digest: str
+    size: int  # Размер страницы в байтах до сжатия
+
+
+class PageArchive:
+    """
+    Архив загруженных страниц для разбора заново без сети.
+
+    Каждое уникальное содержимое хранится один раз в файле <хеш>.html.z
+    (zlib), а индекс index.jsonl отмечает, когда страница менялась.
+    Запись идет в отдельном потоке, при превышении max_bytes удаляются
+    самые давно встречавшиеся страницы.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: List[ArchiveEntry] = []
+        self._stored: Dict[str, int] = {}  # хеш -> размер сжатого файла
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._load_index()
+
+    @staticmethod
+    def content_hash(body: bytes) -> str:
+        """Ключ страницы в архиве."""
+        return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest + PAGE_SUFFIX)
+
+    def _load_index(self):
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+
+        with open(index_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                    entry = ArchiveEntry(item['timestamp'], item['digest'], item['size'])
+                except (ValueError, KeyError):
+                    continue
+                path = self._path(entry.digest)
+                if entry.digest not in self._stored:
+                    if not os.path.exists(path):
+                        continue
+                    self._stored[entry.digest] = os.path.getsize(path)
+                self._entries.append(entry)
+
+        logger.info(f"Архив страниц: {len(self._stored)} страниц, {len(self._entries)} записей индекса")
+
+    @property
+    def total_bytes(self) -> int:
+        """Объем сжатых страниц на диске."""
+        return sum(self._stored.values())
+
+    def add(self, html: str, digest: Optional[str] = None, timestamp: Optional[float] = None) -> Future:
+        """
+        Ставит страницу в очередь на запись и сразу возвращает управление.
+
+        Если содержимое совпадает с последней записью индекса, ничего не
+        записывается; уже сохраненная страница только отмечается в индексе.
+        """
+        if self._executor is None:
+            # Один поток: записи и чистка архива идут строго по очереди
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-archive")
+
+        timestamp = timestamp if timestamp is not None else time.time()
+        future = self._executor.submit(self._store, html, digest, timestamp)
+        future.add_done_callback(self._log_error)
+        return future
+
+    @staticmethod
+    def _log_error(future: Future):
+        if future.exception() is not None:
+            logger.error(f"Ошибка при записи страницы в архив: {future.exception()}")
+
+    def _store(self, html: str, digest: Optional[str], timestamp: float):
+        body = html.encode('utf-8')
+        digest = digest or self.content_hash(body)
+
+        with self._lock:
+            if self._entries and self._entries[-1].digest == digest:
+                return
+
+            os.makedirs(self.directory, exist_ok=True)
+            if digest not in self._stored:
+                path = self._path(digest)
+                with open(path, 'wb') as f:
+                    f.write(zlib.compress(body, 6))
+                self._stored[digest] = os.path.getsize(path)
+                logger.info(f"Страница {digest} сохранена в архив ({len(body)} байт)")
+
+            entry = ArchiveEntry(timestamp, digest, len(body))
+            self._entries.append(entry)
+            with open(os.path.join(self.directory, INDEX_FILE), 'a', encoding="utf-8") as f:
+                f.write(json.dumps(entry._asdict()) + "\n")
+
+            if self.total_bytes > self.max_bytes:
+                self._prune()
+
+    def _prune(self):
+        """Удаляет страницы, которые встречались давнее всего, пока архив не уложится в лимит."""
+        last_seen: Dict[str, float] = {}
+        for entry in self._entries:
+            last_seen[entry.digest] = entry.timestamp
+
+        total = self.total_bytes
+        for digest in sorted(last_seen, key=last_seen.get):
+            # Последнюю страницу не удаляем никогда
+            if total <= self.max_bytes or digest == self._entries[-1].digest:
+                break
+            total -= self._stored.pop(digest)
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+        self._entries = [entry for entry in self._entries if entry.digest in self._stored]
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        with open(index_path + ".tmp", 'w', encoding="utf-8") as f:
+            for entry in self._entries:
+                f.write(json.dumps(entry._asdict()) + "\n")
+        os.replace(index_path + ".tmp", index_path)
+
+        logger.info(f"Архив страниц сокращен до {total} байт, страниц: {len(self._stored)}")
+
+    def entries(self, start: Optional[float] = None, end: Optional[float] = None) -> List[ArchiveEntry]:
+        """Записи индекса за период [start, end] по возрастанию времени."""
+        with self._lock:
+            entries = list(self._entries)
+        return [
+            entry for entry in entries
+            if (start is None or entry.timestamp >= start) and (end is None or entry.timestamp <= end)
+        ]
+
+    def read(self, digest: str) -> str:
+        """Содержимое страницы по ее хешу."""
+        with open(self._path(digest), 'rb') as f:
+            return zlib.decompress(f.read()).decode('utf-8')
+
+    def replay(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Tuple[float, str]]:
+        """Страницы за период в порядке их появления: (время, HTML)."""
+        for entry in self.entries(start, end):
+            yield entry.timestamp, self.read(entry.digest)
+
+    def stats(self) -> Dict:
+        """Размер архива."""
+        return {
+            'pages': len(self._stored),
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+    def flush(self):
+        """Дожидается завершения всех начатых записей."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def close(self):
+        """Дожидается записей, не блокируя цикл событий."""
+        await asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+
+# Архивы страниц по очередям
+_page_archives: Dict[str, PageArchive] = {}
+
+
+def get_page_archive(queue_id: Optional[str] = None) -> Optional[PageArchive]:
+    """
+    Архив страниц очереди, если он включен в конфигурации (PAGE_ARCHIVE или DEBUG_MODE).
+
+    Страницы очереди по умолчанию хранятся в PAGE_ARCHIVE_DIR, остальных
+    очередей - в подкаталогах с их идентификаторами.
+    """
+    config = get_config()
+    if not (config.page_archive or config.debug_mode):
+        return None
+
+    queue_id = config.resolve_queue(queue_id)
+    archive = _page_archives.get(queue_id)
+    if archive is None:
+        directory = config.page_archive_dir
+        if queue_id != config.default_queue:
+            directory = os.path.join(directory, queue_id)
+        archive = _page_archives[queue_id] = PageArchive(directory, config.page_archive_max_size)
+
+    return archive
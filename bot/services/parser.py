@@ -1,19 +1,36 @@
 import asyncio
+import codecs
+import hashlib
 import logging
 import re
 import json
+import multiprocessing
 import time
 import os
 from datetime import datetime
-from typing import Dict, Optional, List
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, Iterator, Mapping, NamedTuple, Optional, List, Tuple
 from logging.handlers import RotatingFileHandler
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
 
 import aiohttp
-import requests
 from bs4 import BeautifulSoup
+from lxml import etree
 
-from bot.config.config import load_config
+from bot.config.config import get_config, load_config
+from bot.services.http_client import ACCEPT_ENCODING, BodyStream, BodyTooLarge, get_http_session, close_http_session
+from bot.services.metrics import parser_metrics, timed
+from bot.services.polling import AdaptivePollingScheduler, get_polling_stats
+from bot.services.circuit_breaker import CircuitBreaker
+from bot.services.page_archive import PageArchive, get_page_archive
+from bot.services.schema_drift import (
+    STRATEGIES, Attempt, DriftAlert, get_drift_detector, get_extraction_stats, subscribe_alerts, unsubscribe_alerts
+)
+from bot.services.similarity import SUGGESTION_LIMIT
+from bot.services.snapshot import CompactSnapshot, SnapshotService
+from bot.services.snapshot_channel import (
+    SnapshotChannel, SnapshotSubscriber, encode_alert, encode_message, get_snapshot_channel
+)
 
 
 # Настройка отдельного логгера для парсера
@@ -64,25 +81,491 @@ def setup_parser_logger():
 parser_logger = setup_parser_logger()
 
 
-class CoddParser:
+# Имена JS-переменных с массивом очереди в порядке приоритета
+JS_ARRAY_NAMES = ('queueData', 'cars', 'queue', 'data')
+JS_PARSE_MARKER = "JSON.parse('"
+
+# Регулярные выражения для поиска массива в тексте скрипта
+JS_PATTERNS = (
+    r'var\s+queueData\s*=\s*(\[.*?\])\s*;',
+    r'var\s+cars\s*=\s*(\[.*?\])\s*;',
+    r'var\s+queue\s*=\s*(\[.*?\])\s*;',
+    r'var\s+data\s*=\s*(\[.*?\])\s*;',
+    r'data\s*:\s*(\[.*?\])',
+    r'JSON\.parse\(\'(\[.*?\])\'\)'
+)
+
+# Возможные ключи элемента JS-массива для каждого поля
+FIELD_KEYS = {
+    'car_number': ('carNumber', 'carnumber', 'car_number', 'number', 'номер'),
+    'model': ('model', 'марка', 'car_model'),
+    'queue_position': ('position', 'queue_position', 'pos', 'позиция'),
+    'registration_date': ('date', 'registration_date', 'reg_date', 'дата'),
+}
+
+# Слова в заголовках таблицы, по которым определяется колонка поля (проверяются по порядку)
+TABLE_HEADER_WORDS = (
+    ('queue_position', ('позиция', 'position', 'место', 'очередь')),
+    ('car_number', ('номер', 'number', 'автомобиль')),
+    ('model', ('модель', 'model', 'марка')),
+    ('registration_date', ('дата', 'date', 'регистрация')),
+)
+
+
+class TableColumns(NamedTuple):
+    """Номера колонок таблицы для каждого поля."""
+    queue_position: int
+    car_number: int
+    model: int
+    registration_date: int
+    
+    @property
+    def width(self) -> int:
+        """Сколько ячеек должно быть в строке с данными."""
+        return max(self) + 1
+
+
+@lru_cache(maxsize=64)
+def compile_table_columns(headers: Tuple[str, ...]) -> TableColumns:
+    """
+    Сопоставление заголовков таблицы (в нижнем регистре) с полями.
+    
+    Выполняется один раз на набор заголовков; поля, для которых
+    заголовок не найден, берутся из стандартного порядка колонок.
+    """
+    columns = {}
+    for i, header in enumerate(headers):
+        for field, words in TABLE_HEADER_WORDS:
+            if any(word in header for word in words):
+                columns[field] = i
+                break
+    return TableColumns(
+        columns.get('queue_position', 0),
+        columns.get('car_number', 1),
+        columns.get('model', 2),
+        columns.get('registration_date', 3),
+    )
+
+
+# Запросы для разбора таблиц через lxml компилируются один раз
+_xpath_tables = etree.XPath('//table')
+_xpath_headers = etree.XPath('.//th')
+_xpath_rows = etree.XPath('.//tr')
+
+
+def _cell_text(cell) -> str:
+    """Текст ячейки таблицы без пробелов по краям."""
+    # У ячейки без вложенных тегов весь текст в .text, обход поддерева не нужен
+    text = cell.text if len(cell) == 0 else ''.join(cell.itertext())
+    return text.strip() if text else ''
+
+
+_whitespace = re.compile(r'\s*')
+_json_decoder = json.JSONDecoder()
+
+
+def _decode_array_at(text: str, pos: int) -> Optional[List]:
+    """Декодирует JSON-массив, начинающийся с позиции pos (после пробелов)."""
+    pos = _whitespace.match(text, pos).end()
+    if not text.startswith('[', pos):
+        return None
+    try:
+        data, _ = _json_decoder.raw_decode(text, pos)
+    except ValueError:
+        return None
+    return data if isinstance(data, list) and data else None
+
+
+def find_js_array(text: str, prefer: Optional[str] = None) -> Tuple[Optional[List], Optional[str]]:
+    """
+    Поиск массива очереди в тексте страницы без регулярных выражений по всему скрипту.
+    
+    Ищет известные имена переменных (queueData = [...], data: [...]) и
+    JSON.parse('[...]') поиском подстроки, затем декодирует массив
+    напрямую через JSONDecoder.raw_decode.
+    
+    Args:
+        text: Текст страницы
+        prefer: Маркер, который проверяется первым (сработавший в прошлый раз)
+    
+    Returns:
+        Массив и маркер, по которому он найден, или (None, None)
+    """
+    markers = list(JS_ARRAY_NAMES) + [JS_PARSE_MARKER]
+    if prefer in markers:
+        markers.remove(prefer)
+        markers.insert(0, prefer)
+    
+    for marker in markers:
+        data = _find_array_by_marker(text, marker)
+        if data is not None:
+            return data, marker
+    
+    return None, None
+
+
+def _find_array_by_marker(text: str, marker: str) -> Optional[List]:
+    """Поиск массива по одному маркеру: имени переменной или JSON.parse('."""
+    if marker == JS_PARSE_MARKER:
+        idx = text.find(JS_PARSE_MARKER)
+        while idx >= 0:
+            data = _decode_array_at(text, idx + len(JS_PARSE_MARKER))
+            if data is not None:
+                return data
+            idx = text.find(JS_PARSE_MARKER, idx + 1)
+        return None
+    
+    start = 0
+    while True:
+        idx = text.find(marker, start)
+        if idx < 0:
+            break
+        start = idx + len(marker)
+        
+        # Имя должно быть отдельным идентификатором, а не частью другого
+        if idx > 0 and (text[idx - 1].isalnum() or text[idx - 1] in '_$.'):
+            continue
+        
+        pos = _whitespace.match(text, start).end()
+        if pos >= len(text) or text[pos] not in '=:':
+            continue
+        
+        data = _decode_array_at(text, pos + 1)
+        if data is not None:
+            return data
+    
+    return None
+
+
+class JsonArrayStream:
+    """
+    Потоковый разбор JSON-массива по частям ответа.
+    
+    Элементы декодируются по мере поступления данных: разбор идет
+    одновременно с загрузкой, и тело ответа целиком в памяти не хранится.
+    Разбирается первый массив в ответе: сам ответ ([...]) или значение
+    в объекте ({"data": [...]}).
+    """
+    
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ""
+        self._started = False
+        self.done = False  # Массив дочитан до закрывающей скобки
+        self.items = 0  # Разобрано элементов
+    
+    def feed(self, chunk: bytes) -> List:
+        """Добавляет часть ответа и возвращает элементы, полностью вошедшие в прочитанные данные."""
+        if self.done:
+            return []
+        self._buffer += self._decoder.decode(chunk)
+        return self._drain()
+    
+    def _drain(self) -> List:
+        buffer = self._buffer
+        pos = 0
+        items = []
+        
+        if not self._started:
+            start = buffer.find('[')
+            if start < 0:
+                # Начало массива еще не пришло, прочитанное до него не нужно
+                self._buffer = ""
+                return items
+            self._started = True
+            pos = start + 1
+        
+        # Все пришедшие целиком элементы-объекты разбираются одним вызовом json.loads.
+        # Если последняя '}' оказалась не на границе элемента, разбор не удастся
+        # и элементы декодируются по одному
+        pos = _whitespace.match(buffer, pos).end()
+        if buffer.startswith(',', pos):
+            pos += 1
+        cut = buffer.rfind('}')
+        if cut > pos:
+            try:
+                items = json.loads('[' + buffer[pos:cut + 1] + ']')
+                pos = cut + 1
+            except ValueError:
+                items = []
+        
+        while True:
+            pos = _whitespace.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == ',':
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                self.done = True
+                pos += 1
+                break
+            
+            try:
+                item, end = _json_decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # Элемент дочитан не полностью: ждем следующую часть
+                break
+            if end == len(buffer) and not isinstance(item, (dict, list)):
+                # Число или литерал в конце буфера может продолжиться в следующей части
+                break
+            
+            items.append(item)
+            pos = end
+        
+        self._buffer = buffer[pos:]
+        self.items += len(items)
+        return items
+    
+    def close(self):
+        """Проверяет, что массив пришел целиком."""
+        self._buffer += self._decoder.decode(b'', final=True)
+        if not self.done:
+            raise ValueError(f"JSON-массив оборвался после {self.items} элементов")
+
+
+class ExtractionPlan:
+    """
+    Сработавший в прошлый раз способ извлечения данных со страницы.
+    
+    Следующий разбор сначала пробует этот план и только при неудаче
+    возвращается к полному перебору вариантов.
+    """
+    
+    def __init__(self):
+        self.source: Optional[str] = None  # js_fast, js_script или table
+        self.marker: Optional[str] = None  # Маркер быстрого поиска
+        self.script_index: Optional[int] = None  # Номер скрипта на странице
+        self.pattern: Optional[str] = None  # Регулярное выражение для скрипта
+        self.keys: Dict[str, str] = {}  # Ключ элемента массива для каждого поля
+    
+    def describe(self) -> Dict:
+        """Описание плана для логов и статистики."""
+        return {
+            'source': self.source,
+            'marker': self.marker,
+            'script_index': self.script_index,
+            'pattern': self.pattern,
+            'keys': dict(self.keys),
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ExtractionPlan':
+        """Восстановление плана из описания (например, полученного из другого процесса)."""
+        plan = cls()
+        plan.source = data.get('source')
+        plan.marker = data.get('marker')
+        plan.script_index = data.get('script_index')
+        plan.pattern = data.get('pattern')
+        plan.keys = dict(data.get('keys') or {})
+        return plan
+
+
+def parse_page_in_worker(
+    html: str,
+    plan_data: Dict,
+    strategies: Optional[List[str]] = None
+) -> Tuple[CompactSnapshot, Dict, Dict[str, float], List[Attempt]]:
+    """
+    Разбор страницы в процессе пула.
+    
+    Возвращает компактный снимок, обновленный план извлечения, время
+    этапов разбора и попытки стратегий вместо объектов BeautifulSoup,
+    чтобы передача результата была дешевой.
+    """
+    plan = ExtractionPlan.from_dict(plan_data)
+    parser = CoddParser()
+    cars_data = parser._parse_page(html, plan, strategies)
+    with timed(parser.timings, 'normalization'):
+        cars = CompactSnapshot.from_cars(cars_data)
+    return cars, plan.describe(), parser.timings, parser.attempts
+
+
+# Пул процессов для разбора страниц (создается только при включенном режиме)
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool(initializer: Optional[Callable[[], None]] = None) -> ProcessPoolExecutor:
+    """
+    Возвращает общий пул процессов для разбора, создавая его при первом обращении.
+    
+    Args:
+        initializer: Функция, которую выполняет каждый процесс пула при запуске
+            (учитывается только при создании пула)
+    """
+    global _process_pool
+    
+    if _process_pool is None:
+        config = get_config()
+        # spawn вместо fork: в процессе бота уже работают потоки (aiosqlite),
+        # а fork копирует их блокировки в неопределенном состоянии
+        _process_pool = ProcessPoolExecutor(
+            max_workers=config.parser_process_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=initializer
+        )
+        parser_logger.info(f"Запущен пул процессов для разбора страниц: {config.parser_process_workers}")
+    
+    return _process_pool
+
+
+def shutdown_process_pool():
+    """Останавливает пул процессов разбора."""
+    global _process_pool
+    
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True)
+        _process_pool = None
+        parser_logger.info("Пул процессов для разбора страниц остановлен")
+
+
+class InflightRegistry:
+    """
+    Реестр выполняющихся запросов к источнику.
+    
+    Одновременные вызовы с одним ключом (URL) ожидают один общий запрос
+    вместо того, чтобы отправлять дубликаты.
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.started = 0  # Сколько реальных запросов было выполнено
+        self.coalesced = 0  # Сколько вызовов присоединились к уже идущему запросу
+    
+    async def run(self, key: str, fetch: Callable[[], Awaitable]):
+        """Выполняет fetch() или присоединяется к уже идущему запросу с тем же ключом."""
+        task = self._inflight.get(key)
+        
+        if task is None:
+            self.started += 1
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+            parser_logger.debug(f"Запрос {key} объединен с уже выполняющимся")
+        
+        # Отмена одного из ожидающих не должна прерывать общий запрос
+        return await asyncio.shield(task)
+    
+    def _forget(self, key: str, task: asyncio.Task):
+        """Удаляет завершенный запрос из реестра."""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+    
+    def stats(self) -> Dict[str, int]:
+        """Счетчики запросов."""
+        return {
+            'in_flight': len(self._inflight),
+            'started': self.started,
+            'coalesced': self.coalesced,
+        }
+
+
+# Общий для процесса реестр запросов к источнику
+inflight_requests = InflightRegistry()
+
+
+class PageState:
+    """Состояние последней загрузки страницы: валидаторы кеша и результат разбора."""
+    
     def __init__(self):
-        self.config = load_config()
-        self.base_url = self.config.codd_url
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.body: str = ""
+        self.parsed_hash: Optional[str] = None
+        self.cars: Optional[CompactSnapshot] = None
+        self.plan = ExtractionPlan()
+        self.failed_hash: Optional[str] = None  # Хеш последней страницы, которую не удалось разобрать
+        self.not_modified = 0  # Ответов 304 Not Modified
+        self.hash_hits = 0  # Разборов, пропущенных из-за совпадения хеша содержимого
+        self.failed_skips = 0  # Разборов, пропущенных, потому что эта же страница уже не разобралась
+    
+    def stats(self) -> Dict[str, int]:
+        """Счетчики условных запросов."""
+        return {
+            'not_modified': self.not_modified,
+            'hash_hits': self.hash_hits,
+            'failed_skips': self.failed_skips,
+        }
+
+
+# Состояние загрузки по каждому URL
+_page_states: Dict[str, PageState] = {}
+
+# Автоматы переключения на разбор HTML по JSON-адресам данных
+_data_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_page_state(url: str) -> PageState:
+    """Возвращает состояние загрузки страницы по URL."""
+    state = _page_states.get(url)
+    if state is None:
+        state = _page_states[url] = PageState()
+    return state
+
+
+def get_data_breaker(url: str) -> CircuitBreaker:
+    """
+    Автомат JSON-адреса данных: после первой же неудачи данные берутся
+    из HTML, а JSON-адрес пробуется снова через DATA_URL_RETRY_INTERVAL.
+    """
+    breaker = _data_breakers.get(url)
+    if breaker is None:
+        breaker = _data_breakers[url] = CircuitBreaker(url, 1, load_config().data_url_retry_interval)
+    return breaker
+
+
+def get_fetch_stats() -> Dict[str, Dict]:
+    """Счетчики загрузок страницы, события очереди и текущие интервалы опроса."""
+    return {
+        'requests': inflight_requests.stats(),
+        'pages': {url: state.stats() for url, state in _page_states.items()},
+        'plans': {url: state.plan.describe() for url, state in _page_states.items()},
+        'events': {queue_id: service.events.stats() for queue_id, service in _snapshot_services.items()},
+        'circuit': {
+            queue_id: service.breaker.stats()
+            for queue_id, service in _snapshot_services.items() if service.breaker is not None
+        },
+        'polling': get_polling_stats(),
+        'data_endpoints': {url: breaker.stats() for url, breaker in _data_breakers.items()},
+        'extraction': get_extraction_stats(),
+    }
+
+
+class CoddParser:
+    def __init__(self, queue_id: Optional[str] = None):
+        self.config = get_config()
+        # Очередь пользователя; неизвестная или не заданная - очередь по умолчанию
+        self.queue_id = self.config.resolve_queue(queue_id)
+        self.base_url = self.config.queue_sources()[self.queue_id]
+        self.data_url = self.config.data_sources().get(self.queue_id)  # JSON-адрес данных, если известен
+        self.timings: Dict[str, float] = {}  # Время этапов последнего разбора в секундах
+        self.attempts: List[Attempt] = []  # Попытки стратегий извлечения в последнем разборе
+        self.strategies: List[str] = []  # Стратегии, запланированные для последнего разбора
         self.logger = parser_logger
-        # Создаем пул потоков для выполнения синхронных операций
-        self.thread_pool = ThreadPoolExecutor(max_workers=5)  # Максимум 5 потоков
     
-    async def parse_car_data(self, car_number: str) -> Optional[Dict]:
-        """Парсинг данных об автомобиле по его номеру."""
+    async def parse_car_data(self, car_number: str, max_age: Optional[float] = None) -> Optional[Dict]:
+        """
+        Поиск данных об автомобиле по его номеру в снимке очереди.
+        
+        Args:
+            car_number: Номер автомобиля
+            max_age: Допустимый возраст снимка в секундах (None - из конфигурации)
+        
+        Если источник недоступен, данные берутся из последнего удачного снимка:
+        в ответе stale=True и age - возраст снимка в секундах.
+        """
         try:
             self.logger.info(f"Начинаем поиск автомобиля с номером: {car_number}")
             
-            # Нормализуем номер авто для поиска
-            normalized_car_number = self._normalize_car_number(car_number)
-            self.logger.info(f"Нормализованный номер для поиска: {normalized_car_number}")
+            snapshot = await get_snapshot_service(self.queue_id).get(max_age)
+            if snapshot is None:
+                self.logger.error(f"Не удалось получить данные очереди {self.queue_id}")
+                return None
             
-            # Получаем данные напрямую со страницы
-            car_data = await self._get_car_data_from_page(normalized_car_number)
+            # Поиск по индексу снимка, номер нормализуется внутри
+            car_data = snapshot.find(car_number)
             
             if car_data:
                 self.logger.info(f"Успешно получены данные для автомобиля {car_number}, позиция: {car_data.get('queue_position', 'не указана')}")
@@ -90,7 +573,10 @@ class CoddParser:
                     'car_number': car_number,
                     'model': car_data.get('model', 'Не указано'),
                     'queue_position': car_data.get('queue_position', 0),
-                    'registration_date': car_data.get('registration_date', 'Не указано')
+                    'registration_date': car_data.get('registration_date', 'Не указано'),
+                    'stale': snapshot.stale,
+                    'age': snapshot.age,
+                    'queue_id': self.queue_id
                 }
             
             self.logger.info(f"Автомобиль с номером {car_number} не найден в очереди")
@@ -101,248 +587,290 @@ class CoddParser:
             self.logger.exception("Стек ошибки:")
             return None
     
-    async def _get_car_data_from_page(self, normalized_car_number: str) -> Optional[Dict]:
-        """Получение данных об автомобиле напрямую со страницы."""
-        try:
-            # Используем ThreadPoolExecutor для получения полной страницы с JS-данными
-            future = self.thread_pool.submit(self._get_full_page)
-            html = await asyncio.wrap_future(future)
-            
-            if not html:
-                self.logger.error("Не удалось получить HTML страницы")
-                return None
-            
-            # Сохраним HTML для анализа только в режиме отладки
-            if self.config.debug_mode:
-                with open("debug_page.html", "w", encoding="utf-8") as f:
-                    f.write(html)
-                self.logger.info("HTML страницы сохранен в debug_page.html")
-            
-            # Разбор HTML
-            soup = BeautifulSoup(html, 'lxml')
-            
-            # Сначала ищем JavaScript данные, так как они могут содержать полный список
-            car_data = self._extract_data_from_javascript(soup, normalized_car_number)
-            if car_data:
-                return car_data
-            
-            # Если не нашли в JS, ищем в таблицах
-            car_data = self._extract_data_from_tables(soup, normalized_car_number)
-            if car_data:
-                return car_data
-            
-            return None
-            
-        except Exception as e:
-            self.logger.error(f"Ошибка при получении данных со страницы: {e}")
-            return None
+    def is_queue_available(self) -> bool:
+        """Есть ли данные об очереди (хотя бы устаревшие), чтобы отличать отсутствие номера от сбоя."""
+        return get_snapshot_service(self.queue_id).snapshot is not None
     
-    def _extract_data_from_javascript(self, soup, normalized_car_number: str) -> Optional[Dict]:
-        """Извлечение данных из JavaScript кода на странице."""
+    @property
+    def extraction_plan(self) -> ExtractionPlan:
+        """План извлечения данных, выученный на прошлых разборах страницы."""
+        return get_page_state(self.base_url).plan
+    
+    def _extract_data_from_javascript(self, soup, plan: ExtractionPlan) -> Dict[str, Dict]:
+        """Извлечение данных обо всех автомобилях из JavaScript кода на странице."""
+        cars_data = {}
         try:
             scripts = soup.find_all('script')
-            self.logger.info(f"Найдено {len(scripts)} скриптов на странице")
+            self.logger.debug(f"Найдено {len(scripts)} скриптов на странице")
+            
+            # Сначала пробуем скрипт и выражение, сработавшие в прошлый раз
+            attempts = []
+            if plan.script_index is not None and plan.script_index < len(scripts) and plan.pattern:
+                attempts.append((plan.script_index, scripts[plan.script_index], (plan.pattern,)))
+            attempts.extend((i, script, JS_PATTERNS) for i, script in enumerate(scripts))
             
-            for i, script in enumerate(scripts):
+            for script_index, script, patterns in attempts:
                 if script.string:
                     script_text = script.string
-                    self.logger.debug(f"Анализ скрипта {i+1}, длина: {len(script_text)} символов")
-                    
-                    # Ищем массив данных в JavaScript
-                    js_patterns = [
-                        r'var\s+queueData\s*=\s*(\[.*?\])\s*;',
-                        r'var\s+cars\s*=\s*(\[.*?\])\s*;',
-                        r'var\s+queue\s*=\s*(\[.*?\])\s*;',
-                        r'var\s+data\s*=\s*(\[.*?\])\s*;',
-                        r'data\s*:\s*(\[.*?\])',
-                        r'JSON\.parse\(\'(\[.*?\])\'\)'
-                    ]
                     
-                    for pattern in js_patterns:
-                        matches = re.search(pattern, script_text, re.DOTALL)
+                    for pattern in patterns:
+                        with timed(self.timings, 'js_extraction'):
+                            matches = re.search(pattern, script_text, re.DOTALL)
                         if matches:
                             try:
-                                data = json.loads(matches.group(1))
+                                with timed(self.timings, 'js_extraction'):
+                                    data = json.loads(matches.group(1))
                                 self.logger.info(f"Найден массив данных в JavaScript, элементов: {len(data)}")
                                 
-                                # Сохраняем данные для отладки только в режиме отладки
-                                if self.config.debug_mode:
-                                    with open("debug_js_data.json", "w", encoding="utf-8") as f:
-                                        json.dump(data, f, ensure_ascii=False, indent=2)
-                                
-                                # Перебираем элементы массива и ищем нужный номер
-                                for item in data:
-                                    # Проверяем различные возможные ключи
-                                    car_keys = ['carNumber', 'carnumber', 'car_number', 'number', 'номер']
-                                    for key in car_keys:
-                                        if key in item and self._normalize_car_number(str(item[key])) == normalized_car_number:
-                                            # Найден нужный автомобиль
-                                            self.logger.info(f"Найден автомобиль в JS данных: {item}")
-                                            
-                                            # Определяем ключи для извлечения данных
-                                            model_keys = ['model', 'марка', 'car_model']
-                                            position_keys = ['position', 'queue_position', 'pos', 'позиция']
-                                            date_keys = ['date', 'registration_date', 'reg_date', 'дата']
-                                            
-                                            # Извлекаем данные
-                                            model = None
-                                            for k in model_keys:
-                                                if k in item:
-                                                    model = item[k]
-                                                    break
-                                            
-                                            position = None
-                                            for k in position_keys:
-                                                if k in item:
-                                                    position = item[k]
-                                                    break
-                                            
-                                            reg_date = None
-                                            for k in date_keys:
-                                                if k in item:
-                                                    reg_date = item[k]
-                                                    break
-                                            
-                                            return {
-                                                'model': model or 'Не указано',
-                                                'queue_position': int(position) if position else 0,
-                                                'registration_date': reg_date or 'Не указано'
-                                            }
+                                with timed(self.timings, 'normalization'):
+                                    cars_data = self._cars_from_items(data, plan)
+                                if cars_data:
+                                    plan.script_index = script_index
+                                    plan.pattern = pattern
+                                    self.logger.info(f"Получены данные о {len(cars_data)} автомобилях из JavaScript")
+                                    return cars_data
                             except json.JSONDecodeError as e:
                                 self.logger.error(f"Ошибка декодирования JSON из JavaScript: {e}")
             
-            return None
+            return cars_data
         except Exception as e:
             self.logger.error(f"Ошибка при извлечении данных из JavaScript: {e}")
-            return None
+            return cars_data
+    
+    def _extract_data_from_js_fast(self, html: str, plan: ExtractionPlan) -> Dict[str, Dict]:
+        """Быстрое извлечение массива из JavaScript без построения дерева BeautifulSoup."""
+        try:
+            with timed(self.timings, 'js_extraction'):
+                data, marker = find_js_array(html, prefer=plan.marker)
+            if not data:
+                return {}
+            
+            self.logger.info(f"Найден массив данных в JavaScript (быстрый поиск), элементов: {len(data)}")
+            with timed(self.timings, 'normalization'):
+                cars_data = self._cars_from_items(data, plan)
+            if cars_data:
+                plan.marker = marker
+                self.logger.info(f"Получены данные о {len(cars_data)} автомобилях из JavaScript")
+            return cars_data
+        except Exception as e:
+            self.logger.error(f"Ошибка при быстром извлечении данных из JavaScript: {e}")
+            return {}
     
-    def _extract_data_from_tables(self, soup, normalized_car_number: str) -> Optional[Dict]:
-        """Извлечение данных из таблиц на странице."""
+    def _cars_from_items(self, data: List, plan: ExtractionPlan) -> Dict[str, Dict]:
+        """Преобразование элементов JS-массива в данные об автомобилях."""
+        cars_data = {}
+        keys = plan.keys
+        car_key, model_key, position_key, date_key = (keys.get(field) for field in FIELD_KEYS)
+        
+        # Перебираем элементы массива
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            
+            # Ключи подбираются заново, только если в элементе нет ключа номера;
+            # остальные поля необязательны и могут отсутствовать без нового подбора
+            if car_key not in item:
+                car_key, model_key, position_key, date_key = self._learn_item_keys(item, keys)
+                if car_key is None:
+                    continue
+            
+            car_number = item[car_key]
+            if car_number:
+                model = item.get(model_key)
+                position = item.get(position_key)
+                reg_date = item.get(date_key)
+                cars_data[str(car_number)] = {
+                    'model': model or 'Не указано',
+                    'queue_position': int(position) if position and str(position).isdigit() else 0,
+                    'registration_date': reg_date or 'Не указано'
+                }
+        
+        return cars_data
+    
+    def _learn_item_keys(self, item: Dict, keys: Dict[str, str]) -> Tuple:
+        """Подбор ключей элемента для всех полей с запоминанием в плане."""
+        for field, aliases in FIELD_KEYS.items():
+            if keys.get(field) not in item:
+                key = next((k for k in aliases if k in item), None)
+                if key is not None:
+                    keys[field] = key
+        
+        learned = tuple(keys.get(field) for field in FIELD_KEYS)
+        if learned[0] not in item:
+            # В элементе нет номера автомобиля
+            return (None,) + learned[1:]
+        return learned
+    
+    def _extract_data_from_tables(self, soup) -> Dict[str, Dict]:
+        """Извлечение данных обо всех автомобилях из таблиц на странице."""
+        cars_data = {}
         try:
             tables = soup.find_all('table')
-            self.logger.info(f"Найдено {len(tables)} таблиц на странице")
+            self.logger.debug(f"Найдено {len(tables)} таблиц на странице")
             
-            for table_idx, table in enumerate(tables):
+            for table in tables:
                 rows = table.find_all('tr')
-                self.logger.info(f"Таблица {table_idx+1} содержит {len(rows)} строк")
                 
-                # Сохраним содержимое таблицы для отладки только в режиме отладки
-                if self.config.debug_mode:
-                    with open(f"debug_table_{table_idx+1}.txt", "w", encoding="utf-8") as f:
-                        for row_idx, row in enumerate(rows):
-                            cells = row.find_all(['td', 'th'])
-                            cell_texts = [cell.text.strip() for cell in cells]
-                            f.write(f"Строка {row_idx+1}: {' | '.join(cell_texts)}\n")
+                # Колонки определяются по заголовкам один раз на таблицу
+                headers = [th.text.strip().lower() for th in table.find_all('th')]
+                columns = compile_table_columns(tuple(headers))
+                position_idx, car_num_idx, model_idx, date_idx = columns
                 
-                # Анализируем каждую строку таблицы
-                for row_idx, row in enumerate(rows):
+                # Пропускаем заголовки
+                for row in rows[1:] if headers else rows:
                     cells = row.find_all('td')
-                    if len(cells) < 2:
-                        continue  # Пропускаем строки с недостаточным количеством ячеек
-                    
-                    # Ищем ячейку с номером автомобиля
-                    for cell_idx, cell in enumerate(cells):
-                        cell_text = cell.text.strip()
-                        if self._normalize_car_number(cell_text) == normalized_car_number:
-                            self.logger.info(f"Найден автомобиль в таблице {table_idx+1}, строка {row_idx+1}, ячейка {cell_idx+1}")
-                            
-                            # Пытаемся определить, какие ячейки содержат нужную информацию
-                            position = None
-                            model = None
-                            reg_date = None
-                            
-                            # Если это таблица с заголовками, используем их
-                            headers = [th.text.strip().lower() for th in table.find_all('th')]
-                            if headers:
-                                for i, header in enumerate(headers):
-                                    if i < len(cells):
-                                        if any(word in header for word in ['позиция', 'position', 'место', 'очередь']):
-                                            position = cells[i].text.strip()
-                                        elif any(word in header for word in ['модель', 'model', 'марка']):
-                                            model = cells[i].text.strip()
-                                        elif any(word in header for word in ['дата', 'date', 'регистрация']):
-                                            reg_date = cells[i].text.strip()
-                            
-                            # Если не определили по заголовкам, ищем по логике расположения
-                            if position is None and len(cells) > 0:
-                                try:
-                                    # Обычно позиция - это первая колонка
-                                    position = cells[0].text.strip()
-                                except IndexError:
-                                    pass
-                            
-                            if model is None and len(cells) > 2:
-                                try:
-                                    # Модель обычно после номера
-                                    model = cells[cell_idx + 1].text.strip() if cell_idx + 1 < len(cells) else None
-                                except IndexError:
-                                    pass
-                            
-                            if reg_date is None and len(cells) > 3:
-                                try:
-                                    # Дата обычно последняя колонка
-                                    reg_date = cells[-1].text.strip()
-                                except IndexError:
-                                    pass
-                            
-                            return {
-                                'model': model or 'Не указано',
-                                'queue_position': int(position) if position and position.isdigit() else 0,
-                                'registration_date': reg_date or 'Не указано'
-                            }
+                    if len(cells) >= columns.width:
+                        try:
+                            car_number = cells[car_num_idx].text.strip()
+                            if car_number:
+                                position = cells[position_idx].text.strip()
+                                model = cells[model_idx].text.strip()
+                                reg_date = cells[date_idx].text.strip()
+                                
+                                cars_data[car_number] = {
+                                    'model': model or 'Не указано',
+                                    'queue_position': int(position) if position and position.isdigit() else 0,
+                                    'registration_date': reg_date or 'Не указано'
+                                }
+                        except Exception as e:
+                            self.logger.error(f"Ошибка при обработке строки таблицы: {e}")
+                            continue
             
-            return None
+            self.logger.info(f"Всего получено данных о {len(cars_data)} автомобилях из таблиц")
+            return cars_data
         except Exception as e:
             self.logger.error(f"Ошибка при извлечении данных из таблиц: {e}")
-            return None
+            return cars_data
     
-    def _get_full_page(self) -> str:
-        """Получение полной страницы с помощью обычного requests."""
+    def _extract_data_from_tables_fast(self, html: str) -> Optional[CompactSnapshot]:
+        """
+        Извлечение данных из таблиц через lxml без построения дерева BeautifulSoup.
+        
+        Строки каждой таблицы выбираются одним XPath-запросом, колонки
+        определяются по заголовкам один раз на таблицу, а строки сразу
+        складываются в компактный снимок. Результат совпадает с
+        _extract_data_from_tables. Возвращает None, если страницу не удалось
+        разобрать: тогда таблицы разбираются через BeautifulSoup.
+        """
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36'
-            }
+            root = etree.fromstring(html.encode('utf-8'), etree.HTMLParser(encoding='utf-8'))
+            if root is None:
+                return CompactSnapshot.from_rows(())
             
-            # Проверка на HTTPS и включение проверки сертификатов
-            verify_ssl = True
+            rows_by_number: Dict[str, Tuple[str, int, str]] = {}
+            for table in _xpath_tables(root):
+                headers = tuple(_cell_text(th).lower() for th in _xpath_headers(table))
+                columns = compile_table_columns(headers)
+                position_idx, car_num_idx, model_idx, date_idx = columns
+                width = columns.width
+                
+                # Пропускаем заголовки
+                rows = _xpath_rows(table)
+                for row in rows[1:] if headers else rows:
+                    cells = list(row.iter('td'))
+                    if len(cells) < width:
+                        continue
+                    car_number = _cell_text(cells[car_num_idx])
+                    if not car_number:
+                        continue
+                    position = _cell_text(cells[position_idx])
+                    try:
+                        queue_position = int(position) if position and position.isdigit() else 0
+                    except ValueError as e:
+                        self.logger.error(f"Ошибка при обработке строки таблицы: {e}")
+                        continue
+                    rows_by_number[car_number] = (
+                        _cell_text(cells[model_idx]) or 'Не указано',
+                        queue_position,
+                        _cell_text(cells[date_idx]) or 'Не указано'
+                    )
+            
+            self.logger.info(f"Всего получено данных о {len(rows_by_number)} автомобилях из таблиц")
+            return CompactSnapshot.from_rows(
+                (car_number, model, position, reg_date)
+                for car_number, (model, position, reg_date) in rows_by_number.items()
+            )
+        except Exception as e:
+            self.logger.error(f"Ошибка при извлечении данных из таблиц через lxml: {e}")
+            return None
+    
+    async def _get_full_page(self) -> str:
+        """Получение полной страницы; одновременные запросы объединяются в один."""
+        return await inflight_requests.run(self.base_url, self._fetch_page)
+    
+    async def _fetch_page(self) -> str:
+        """Загрузка страницы через общую HTTP-сессию."""
+        try:
+            # aiohttp всегда проверяет сертификаты для HTTPS
             if self.base_url.startswith('https://'):
                 self.logger.debug("Используется HTTPS-соединение с проверкой сертификатов")
             else:
                 self.logger.debug("Используется HTTP-соединение")
             
-            # Выполняем запрос с проверкой сертификата для HTTPS
-            response = requests.get(
-                self.base_url,
-                headers=headers,
-                verify=verify_ssl,  # Обязательная проверка сертификатов
-                timeout=30  # Устанавливаем таймаут для предотвращения зависания
-            )
+            # Условный запрос: сервер ответит 304, если страница не изменилась
+            state = get_page_state(self.base_url)
+            headers = {'Accept-Encoding': ACCEPT_ENCODING}
+            if state.etag:
+                headers['If-None-Match'] = state.etag
+            if state.last_modified:
+                headers['If-Modified-Since'] = state.last_modified
             
-            if response.status_code == 200:
-                self.logger.info(f"Успешно получена страница, размер HTML: {len(response.text)} байт")
-                return response.text
-            else:
-                self.logger.error(f"Ошибка при получении страницы, код: {response.status_code}")
-                return ""
-        except requests.exceptions.SSLError as e:
+            session = get_http_session()
+            started = time.perf_counter()
+            # Тело распаковывается по частям в BodyStream с пределом размера
+            async with session.get(self.base_url, headers=headers, auto_decompress=False) as response:
+                if response.status == 304 and state.body:
+                    parser_metrics.record_stage('fetch', time.perf_counter() - started)
+                    state.not_modified += 1
+                    self.logger.info("Страница не изменилась (304), используем сохраненную версию")
+                    return state.body
+                elif response.status == 200:
+                    body = BodyStream(response, self.config.http_max_body_size)
+                    html = (await body.read()).decode(response.charset or 'utf-8', errors='replace')
+                    parser_metrics.record_stage('fetch', time.perf_counter() - started)
+                    parser_metrics.record_value('wire_size', body.wire_bytes)
+                    parser_metrics.record_value('page_size', body.decoded_bytes)
+                    state.etag = response.headers.get('ETag')
+                    state.last_modified = response.headers.get('Last-Modified')
+                    state.body = html
+                    self.logger.info(
+                        f"Успешно получена страница, размер HTML: {body.decoded_bytes} байт "
+                        f"(по сети {body.wire_bytes} байт, сжатие: {body.encoding})"
+                    )
+                    return html
+                else:
+                    self.logger.error(f"Ошибка при получении страницы, код: {response.status}")
+                    return ""
+        except aiohttp.ClientSSLError as e:
             self.logger.error(f"Ошибка SSL при получении страницы: {e}")
             return ""
-        except requests.exceptions.Timeout as e:
+        except BodyTooLarge as e:
+            self.logger.error(f"Загрузка страницы прервана: {e}")
+            return ""
+        except asyncio.TimeoutError as e:
             self.logger.error(f"Таймаут при получении страницы: {e}")
             return ""
         except Exception as e:
             self.logger.error(f"Ошибка при получении полной страницы: {e}")
             return ""
     
-    async def parse_all_cars(self) -> Dict[str, Dict]:
-        """Парсинг данных о всех автомобилях в очереди."""
+    async def parse_all_cars(self, max_age: Optional[float] = None, allow_stale: bool = True) -> Mapping:
+        """
+        Данные о всех автомобилях в очереди из снимка.
+        
+        Args:
+            max_age: Допустимый возраст снимка в секундах (None - из конфигурации, 0 - обновить)
+            allow_stale: Можно ли вернуть устаревший снимок, пока источник недоступен
+        """
         try:
-            # Получаем данные напрямую со страницы
-            cars_data = await self._get_all_cars_from_page()
+            snapshot = await get_snapshot_service(self.queue_id).get(max_age)
             
-            if cars_data:
-                self.logger.info(f"Получены данные о {len(cars_data)} автомобилях")
-                return cars_data
+            if snapshot is not None and snapshot.stale and not allow_stale:
+                self.logger.warning(f"Источник недоступен, снимок устарел на {snapshot.age:.0f} с")
+                return {}
+            elif snapshot is not None:
+                self.logger.debug(f"Получены данные о {len(snapshot.cars)} автомобилях")
+                return snapshot.cars
             else:
                 self.logger.warning("Не удалось получить данные об автомобилях")
                 return {}
@@ -351,177 +879,242 @@ class CoddParser:
             self.logger.error(f"Ошибка при парсинге всех автомобилей: {e}")
             return {}
     
-    async def _get_all_cars_from_page(self) -> Dict[str, Dict]:
-        """Получение всех автомобилей напрямую со страницы."""
+    async def _get_all_cars_from_data_url(self) -> Optional[CompactSnapshot]:
+        """
+        Снимок из JSON-адреса данных.
+        
+        Returns:
+            Снимок или None, если адрес не задан, недоступен или данные
+            не распознаны (тогда используется разбор HTML)
+        """
+        if not self.data_url:
+            return None
+        
+        breaker = get_data_breaker(self.data_url)
+        if not breaker.allow():
+            return None
+        
+        cars = await inflight_requests.run(self.data_url, self._fetch_data)
+        if cars:
+            breaker.record_success()
+            return cars
+        
+        breaker.record_failure()
+        self.logger.warning(f"JSON-адрес данных не сработал, используем разбор HTML: {self.data_url}")
+        return None
+    
+    async def _fetch_data(self) -> Optional[CompactSnapshot]:
+        """Загрузка JSON-адреса данных с разбором по мере поступления частей ответа."""
+        state = get_page_state(self.data_url)
+        headers = {'Accept-Encoding': ACCEPT_ENCODING}
+        if state.etag:
+            headers['If-None-Match'] = state.etag
+        if state.last_modified:
+            headers['If-Modified-Since'] = state.last_modified
+        
+        self.timings = {}
         try:
-            # Используем ThreadPoolExecutor для получения полной страницы с JS-данными
-            future = self.thread_pool.submit(self._get_full_page)
-            html = await asyncio.wrap_future(future)
+            session = get_http_session()
+            started = time.perf_counter()
+            async with session.get(self.data_url, headers=headers, auto_decompress=False) as response:
+                if response.status == 304 and state.cars:
+                    parser_metrics.record_stage('fetch', time.perf_counter() - started)
+                    state.not_modified += 1
+                    self.logger.info("Данные очереди не изменились (304), используем прошлый снимок")
+                    return state.cars
+                elif response.status != 200:
+                    self.logger.error(f"Ошибка при получении JSON-данных, код: {response.status}")
+                    return None
+                
+                stream = JsonArrayStream()
+                body = BodyStream(response, self.config.http_max_body_size)
+                cars_data = {}
+                async for chunk in body.chunks():
+                    with timed(self.timings, 'json_decode'):
+                        items = stream.feed(chunk)
+                    if items:
+                        with timed(self.timings, 'normalization'):
+                            cars_data.update(self._cars_from_items(items, state.plan))
+                with timed(self.timings, 'json_decode'):
+                    stream.close()
             
-            if not html:
-                return {}
+            # Время ожидания сети без разбора, который шел одновременно с загрузкой
+            self.timings['fetch'] = time.perf_counter() - started - sum(self.timings.values())
             
-            soup = BeautifulSoup(html, 'lxml')
-            cars_data = {}
+            with timed(self.timings, 'normalization'):
+                cars = CompactSnapshot.from_cars(cars_data)
+            parser_metrics.record_stages(self.timings)
+            parser_metrics.record_value('wire_size', body.wire_bytes)
+            parser_metrics.record_value('data_size', body.decoded_bytes)
+            parser_metrics.record_value('row_count', len(cars))
             
-            # Ищем JavaScript данные
-            scripts = soup.find_all('script')
-            for script in scripts:
-                if script.string:
-                    script_text = script.string
-                    js_patterns = [
-                        r'var\s+queueData\s*=\s*(\[.*?\])\s*;',
-                        r'var\s+cars\s*=\s*(\[.*?\])\s*;',
-                        r'var\s+queue\s*=\s*(\[.*?\])\s*;',
-                        r'var\s+data\s*=\s*(\[.*?\])\s*;',
-                        r'data\s*:\s*(\[.*?\])',
-                        r'JSON\.parse\(\'(\[.*?\])\'\)'
-                    ]
-                    
-                    for pattern in js_patterns:
-                        matches = re.search(pattern, script_text, re.DOTALL)
-                        if matches:
-                            try:
-                                data = json.loads(matches.group(1))
-                                self.logger.info(f"Найден массив данных в JavaScript, элементов: {len(data)}")
-                                
-                                # Перебираем элементы массива
-                                for item in data:
-                                    # Проверяем различные возможные ключи для номера автомобиля
-                                    car_keys = ['carNumber', 'carnumber', 'car_number', 'number', 'номер']
-                                    model_keys = ['model', 'марка', 'car_model']
-                                    position_keys = ['position', 'queue_position', 'pos', 'позиция']
-                                    date_keys = ['date', 'registration_date', 'reg_date', 'дата']
-                                    
-                                    car_number = None
-                                    for key in car_keys:
-                                        if key in item:
-                                            car_number = str(item[key])
-                                            break
-                                    
-                                    if car_number:
-                                        # Определяем остальные данные
-                                        model = None
-                                        for k in model_keys:
-                                            if k in item:
-                                                model = item[k]
-                                                break
-                                        
-                                        position = None
-                                        for k in position_keys:
-                                            if k in item:
-                                                position = item[k]
-                                                break
-                                        
-                                        reg_date = None
-                                        for k in date_keys:
-                                            if k in item:
-                                                reg_date = item[k]
-                                                break
-                                        
-                                        cars_data[car_number] = {
-                                            'model': model or 'Не указано',
-                                            'queue_position': int(position) if position and str(position).isdigit() else 0,
-                                            'registration_date': reg_date or 'Не указано'
-                                        }
-                                
-                                if cars_data:
-                                    self.logger.info(f"Получены данные о {len(cars_data)} автомобилях из JavaScript")
-                                    return cars_data
-                            except json.JSONDecodeError as e:
-                                self.logger.error(f"Ошибка декодирования JSON из JavaScript: {e}")
+            if not cars:
+                self.logger.error(f"В JSON-данных не найдены автомобили (элементов: {stream.items})")
+                return None
             
-            # Если в JavaScript ничего не нашли, ищем в таблицах
-            tables = soup.find_all('table')
+            state.etag = response.headers.get('ETag')
+            state.last_modified = response.headers.get('Last-Modified')
+            state.cars = cars
+            self.logger.info(
+                f"Получены JSON-данные: {body.decoded_bytes} байт (по сети {body.wire_bytes}), {len(cars)} автомобилей"
+            )
+            return cars
+        except BodyTooLarge as e:
+            self.logger.error(f"Загрузка JSON-данных прервана: {e}")
+            return None
+        except asyncio.TimeoutError as e:
+            self.logger.error(f"Таймаут при получении JSON-данных: {e}")
+            return None
+        except Exception as e:
+            self.logger.error(f"Ошибка при получении JSON-данных: {e}")
+            return None
+    
+    async def _get_all_cars_from_page(self) -> Mapping:
+        """Получение всех автомобилей: из JSON-адреса данных, если он задан, иначе со страницы."""
+        cars = await self._get_all_cars_from_data_url()
+        if cars:
+            return cars
+        
+        try:
+            html = await self._get_full_page()
             
-            for table in tables:
-                rows = table.find_all('tr')
-                # Пытаемся определить, какие колонки за что отвечают
-                headers = [th.text.strip().lower() for th in table.find_all('th')]
-                
-                position_idx = None
-                car_num_idx = None
-                model_idx = None
-                date_idx = None
-                
-                # Определяем индексы колонок по заголовкам
-                if headers:
-                    for i, header in enumerate(headers):
-                        if any(word in header for word in ['позиция', 'position', 'место', 'очередь']):
-                            position_idx = i
-                        elif any(word in header for word in ['номер', 'number', 'автомобиль']):
-                            car_num_idx = i
-                        elif any(word in header for word in ['модель', 'model', 'марка']):
-                            model_idx = i
-                        elif any(word in header for word in ['дата', 'date', 'регистрация']):
-                            date_idx = i
-                
-                # Если не определили индексы, предполагаем стандартный порядок
-                if position_idx is None:
-                    position_idx = 0
-                if car_num_idx is None:
-                    car_num_idx = 1
-                if model_idx is None:
-                    model_idx = 2
-                if date_idx is None:
-                    date_idx = 3
-                
-                # Пропускаем заголовки
-                for row in rows[1:] if headers else rows:
-                    cells = row.find_all('td')
-                    if len(cells) > max(position_idx, car_num_idx, model_idx, date_idx):
-                        try:
-                            car_number = cells[car_num_idx].text.strip()
-                            if car_number:
-                                position = cells[position_idx].text.strip() if position_idx < len(cells) else ''
-                                model = cells[model_idx].text.strip() if model_idx < len(cells) else ''
-                                reg_date = cells[date_idx].text.strip() if date_idx < len(cells) else ''
-                                
-                                cars_data[car_number] = {
-                                    'model': model or 'Не указано',
-                                    'queue_position': int(position) if position and position.isdigit() else 0,
-                                    'registration_date': reg_date or 'Не указано'
-                                }
-                        except Exception as e:
-                            self.logger.error(f"Ошибка при обработке строки таблицы: {e}")
-                            continue
+            if not html:
+                self.logger.error("Не удалось получить HTML страницы")
+                return {}
             
-            self.logger.info(f"Всего получено данных о {len(cars_data)} автомобилях из таблиц")
+            # Если содержимое не изменилось, повторно разбирать страницу не нужно
+            state = get_page_state(self.base_url)
+            body_hash = hashlib.blake2b(html.encode('utf-8'), digest_size=16).hexdigest()
+            if body_hash == state.parsed_hash and state.cars:
+                state.hash_hits += 1
+                self.logger.info("Содержимое страницы не изменилось, используем прошлый результат разбора")
+                return state.cars
+            if body_hash == state.failed_hash:
+                # Эту же страницу уже не удалось разобрать: повторный перебор ничего не даст
+                state.failed_skips += 1
+                self.logger.warning("Страница не изменилась с прошлого неудачного разбора, разбор пропущен")
+                return {}
+            
+            # Новая версия страницы попадает в архив до разбора: пригодится, если разбор не удастся
+            archive = get_page_archive(self.queue_id)
+            if archive is not None:
+                archive.add(html, body_hash)
+            
+            cars_data = await self._run_parse(html)
+            parser_metrics.record_value('row_count', len(cars_data))
+            if cars_data:
+                state.parsed_hash = body_hash
+                state.cars = cars_data
+            elif len(self.strategies) == len(STRATEGIES):
+                # Пропускать страницу можно, только если ее не разобрала ни одна стратегия;
+                # после одной попытки лучшей стратегией полный перебор еще впереди
+                state.failed_hash = body_hash
             return cars_data
             
         except Exception as e:
             self.logger.error(f"Ошибка при получении всех автомобилей со страницы: {e}")
             return {}
     
-    def _normalize_car_number(self, car_number: str) -> str:
-        """Нормализация номера автомобиля для корректного сравнения."""
-        # Удаляем все пробелы и переводим в верхний регистр
-        normalized = car_number.strip().upper().replace(' ', '')
+    async def _run_parse(self, html: str) -> CompactSnapshot:
+        """
+        Разбор страницы в пуле процессов, если режим включен, иначе в текущем потоке.
         
-        # Просто возвращаем нормализованный номер без дополнительных проверок
-        return normalized
-
-    async def get_first_car_position(self) -> Optional[int]:
+        Порядок стратегий извлечения задает детектор изменений разметки;
+        он же получает результаты попыток.
+        """
+        state = get_page_state(self.base_url)
+        detector = get_drift_detector(self.base_url)
+        strategies = self.strategies = detector.plan()
+        
+        if not self.config.parser_process_pool:
+            cars_data = self._parse_page(html, state.plan, strategies)
+            with timed(self.timings, 'normalization'):
+                cars = CompactSnapshot.from_cars(cars_data)
+        else:
+            # Разбор в отдельном процессе не блокирует цикл событий бота
+            loop = asyncio.get_running_loop()
+            cars, plan_data, self.timings, self.attempts = await loop.run_in_executor(
+                get_process_pool(), parse_page_in_worker, html, state.plan.describe(), strategies
+            )
+            
+            if plan_data != state.plan.describe():
+                self.logger.info(f"План извлечения данных: {plan_data}")
+            state.plan = ExtractionPlan.from_dict(plan_data)
+        
+        parser_metrics.record_stages(self.timings)
+        await detector.record(strategies, self.attempts, len(cars))
+        
+        return cars
+    
+    def _parse_page(self, html: str, plan: ExtractionPlan, strategies: Optional[List[str]] = None) -> Mapping:
+        """
+        Разбор HTML страницы в данные обо всех автомобилях: словарь
+        номер -> данные или, для таблиц, готовый компактный снимок.
+        
+        Args:
+            html: Текст страницы
+            plan: План извлечения, обновляется по результату
+            strategies: Стратегии в порядке попыток (по умолчанию - все,
+                сработавшая в прошлый раз первой)
+        
+        Время этапов - в self.timings, попытки стратегий - в self.attempts.
+        """
+        self.timings = {}
+        self.attempts = []
+        previous_plan = plan.describe()
+        
+        # Порядок поиска: быстрый поиск в JS, скрипты через BeautifulSoup, таблицы через lxml.
+        # Способ, сработавший в прошлый раз, пробуем первым.
+        if strategies is not None:
+            sources = list(strategies)
+        else:
+            sources = list(STRATEGIES)
+            if plan.source in sources:
+                sources.remove(plan.source)
+                sources.insert(0, plan.source)
+        
+        soup = None
+        cars_data = {}
+        for source in sources:
+            started = time.perf_counter()
+            if source == 'js_fast':
+                cars_data = self._extract_data_from_js_fast(html, plan)
+            elif source == 'table':
+                with timed(self.timings, 'table_extraction'):
+                    cars_data = self._extract_data_from_tables_fast(html)
+                    if cars_data is None:
+                        cars_data = self._extract_data_from_tables(BeautifulSoup(html, 'lxml'))
+            else:
+                if soup is None:
+                    with timed(self.timings, 'soup'):
+                        soup = BeautifulSoup(html, 'lxml')
+                cars_data = self._extract_data_from_javascript(soup, plan)
+            
+            self.attempts.append(Attempt(source, bool(cars_data), time.perf_counter() - started))
+            if cars_data:
+                plan.source = source
+                break
+        
+        if plan.describe() != previous_plan:
+            self.logger.info(f"План извлечения данных: {plan.describe()}")
+        
+        return cars_data
+    
+    async def get_first_car_position(self, max_age: Optional[float] = None) -> Optional[int]:
         """Получить позицию первого автомобиля в очереди."""
         try:
-            # Получаем данные о всех автомобилях
-            cars_data = await self.parse_all_cars()
+            snapshot = await get_snapshot_service(self.queue_id).get(max_age)
             
-            if not cars_data:
+            if snapshot is None:
                 self.logger.warning("Не удалось получить данные о автомобилях для определения первой позиции")
                 return None
             
             # Ищем автомобиль с минимальным номером в очереди
-            min_position = float('inf')  # Начальное значение - бесконечность
+            first_position = snapshot.first_position()
             
-            for car_number, data in cars_data.items():
-                position = data.get('queue_position', 0)
-                if position > 0 and position < min_position:
-                    min_position = position
-            
-            if min_position != float('inf'):
-                self.logger.info(f"Найдена первая позиция в очереди: {min_position}")
-                return int(min_position)
+            if first_position is not None:
+                self.logger.info(f"Найдена первая позиция в очереди: {first_position}")
+                return first_position
             
             self.logger.warning("Не удалось определить первую позицию в очереди")
             return None
@@ -531,35 +1124,229 @@ class CoddParser:
             return None
 
     async def close(self):
-        """Закрывает пул потоков и освобождает ресурсы."""
-        self.logger.info("Закрытие пула потоков")
-        self.thread_pool.shutdown(wait=True)
-        self.logger.info("Пул потоков закрыт")
+        """Закрывает общую HTTP-сессию, пул процессов и освобождает ресурсы."""
+        await close_http_session()
+        shutdown_process_pool()
+        for service in list(_snapshot_services.values()):
+            await service.close()
+        for queue_id in self.config.queue_sources():
+            archive = get_page_archive(queue_id)
+            if archive is not None:
+                await archive.close()
+
+
+def replay_archive(
+    archive: Optional[PageArchive] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None
+) -> Iterator[Tuple[float, CompactSnapshot]]:
+    """
+    Разбор сохраненных страниц без сети: (время, снимок) в порядке появления.
+    
+    Args:
+        archive: Архив страниц (по умолчанию - из конфигурации)
+        start: Начало периода (timestamp)
+        end: Конец периода (timestamp)
+    """
+    archive = archive or get_page_archive()
+    if archive is None:
+        return
+    
+    parser = CoddParser()
+    plan = ExtractionPlan()
+    for timestamp, html in archive.replay(start, end):
+        yield timestamp, CompactSnapshot.from_cars(parser._parse_page(html, plan))
+
+
+# Сервисы снимков по очередям: у каждой очереди свой снимок, индекс и автомат отключения
+_snapshot_services: Dict[str, SnapshotService] = {}
+
+
+def get_snapshot_service(queue_id: Optional[str] = None) -> SnapshotService:
+    """Возвращает сервис снимков очереди (по умолчанию - основной), создавая его при первом обращении."""
+    service = _snapshot_services.get(queue_id)
+    if service is not None:
+        return service
+    
+    config = get_config()
+    queue_id = config.resolve_queue(queue_id)
+    service = _snapshot_services.get(queue_id)
+    if service is None:
+        parser = CoddParser(queue_id)
+        service = _snapshot_services[queue_id] = SnapshotService(
+            parser._get_all_cars_from_page,
+            config.snapshot_max_age,
+            CircuitBreaker(parser.base_url, config.circuit_failure_threshold, config.circuit_cooldown)
+        )
+    
+    return service
+
+
+async def find_car(car_number: str, preferred_queue: Optional[str] = None) -> Tuple[str, Optional[Dict]]:
+    """
+    Поиск автомобиля во всех очередях: сначала в preferred_queue, затем
+    одновременно в остальных.
+    
+    Returns:
+        Очередь, в которой найден автомобиль, и его данные, или
+        (preferred_queue, None), если автомобиля нет ни в одной очереди
+    """
+    config = get_config()
+    preferred_queue = config.resolve_queue(preferred_queue)
+    
+    car_data = await CoddParser(preferred_queue).parse_car_data(car_number)
+    if car_data:
+        return preferred_queue, car_data
+    
+    others = [queue_id for queue_id in config.queue_sources() if queue_id != preferred_queue]
+    results = await asyncio.gather(*(CoddParser(queue_id).parse_car_data(car_number) for queue_id in others))
+    for queue_id, car_data in zip(others, results):
+        if car_data:
+            return queue_id, car_data
+    
+    return preferred_queue, None
+
+
+async def suggest_car_numbers(car_number: str, limit: int = SUGGESTION_LIMIT) -> List[Dict]:
+    """
+    Номера, похожие на не найденный car_number, из текущих снимков всех
+    очередей. Страница не загружается: снимки только что обновил поиск.
+    
+    Returns:
+        До limit словарей с car_number, queue_position и queue_id
+        по убыванию сходства
+    """
+    found = []
+    # Похожие номера есть только у очередей, снимки которых уже загружены
+    for queue_id, service in list(_snapshot_services.items()):
+        for row, similarity in await service.suggest(car_number, limit):
+            found.append((similarity, row.car_number, row.queue_position, queue_id))
+    
+    found.sort(key=lambda item: -item[0])
+    return [
+        {'car_number': number, 'queue_position': position, 'queue_id': queue_id}
+        for _, number, position, queue_id in found[:limit]
+    ]
+
+
+async def start_snapshot_subscriber(channel: Optional[SnapshotChannel] = None) -> SnapshotSubscriber:
+    """
+    Переключает бота на снимки от процесса парсера: страница больше
+    не загружается в процессе бота. Вызывается до первого обращения к снимкам.
+    
+    Args:
+        channel: Канал снимков (по умолчанию - из конфигурации)
+    """
+    config = load_config()
+    
+    # Снимок без обновлений дольше двух максимальных интервалов опроса считается устаревшим
+    longest_interval = max(config.parser_interval, config.poll_max_interval if config.adaptive_polling else 0)
+    for queue_id in config.queue_sources():
+        _snapshot_services[queue_id] = SnapshotService(None, config.snapshot_max_age, stale_after=2 * longest_interval)
+    
+    subscriber = SnapshotSubscriber(_snapshot_services, channel or get_snapshot_channel(config))
+    subscriber.start()
+    parser_logger.info("Бот получает снимки очереди от процесса парсера")
+    return subscriber
 
 
-async def start_parser():
-    """Запуск парсера как отдельного процесса."""
+async def poll_queue(queue_id: str, channel: SnapshotChannel):
+    """
+    Цикл опроса одной очереди: загрузка, разбор и публикация снимка.
+    
+    У каждой очереди свой цикл и свой интервал, поэтому медленный
+    источник не задерживает остальные.
+    """
+    config = load_config()
+    service = get_snapshot_service(queue_id)
+    
+    polling = None
+    if config.adaptive_polling:
+        polling = AdaptivePollingScheduler(
+            f'parser:{queue_id}',
+            config.parser_interval,
+            config.poll_min_interval,
+            config.poll_max_interval,
+            config.poll_backoff_factor
+        )
+        polling.attach(service.events)
+    
+    try:
+        while True:
+            parser_logger.info(f"Запуск цикла парсинга очереди {queue_id}")
+            snapshot = await service.get(max_age=0)
+            
+            if snapshot is not None:
+                try:
+                    await channel.publish(encode_message(queue_id, snapshot))
+                except Exception as e:
+                    parser_logger.error(f"Ошибка при публикации снимка очереди {queue_id}: {e}")
+            
+            interval = config.parser_interval
+            if polling is not None:
+                interval = polling.next_interval(loaded=snapshot is not None and not snapshot.stale)
+                parser_logger.info(f"Очередь {queue_id}: ожидание {interval:.0f} секунд до следующего запуска: {polling.reason}")
+            else:
+                parser_logger.info(f"Очередь {queue_id}: ожидание {interval} секунд до следующего запуска")
+            await asyncio.sleep(interval)
+    finally:
+        if polling is not None:
+            polling.detach(service.events)
+
+
+async def start_parser(channel: Optional[SnapshotChannel] = None):
+    """
+    Запуск парсера как отдельного процесса.
+    
+    Одновременно опрашивает все настроенные очереди через общую
+    HTTP-сессию и публикует их снимки в канал, на который подписан бот.
+    
+    Args:
+        channel: Канал снимков (по умолчанию - из конфигурации)
+    """
     try:
         parser = CoddParser()
         config = load_config()
+        queues = list(config.queue_sources())
+        
+        parser_logger.info(f"Запуск парсера с интервалом {config.parser_interval} секунд, очереди: {', '.join(queues)}")
         
-        parser_logger.info(f"Запуск парсера с интервалом {config.parser_interval} секунд")
+        channel = channel or get_snapshot_channel(config)
+        await channel.start()
+        
+        # Предупреждения об изменении разметки отправляет бот: передаем их по каналу снимков
+        async def forward_alert(alert: DriftAlert):
+            await channel.publish(encode_alert(alert))
+        subscribe_alerts(forward_alert)
         
         try:
-            while True:
-                parser_logger.info("Запуск цикла парсинга")
-                await parser.parse_all_cars()
-                parser_logger.info(f"Ожидание {config.parser_interval} секунд до следующего запуска")
-                await asyncio.sleep(config.parser_interval)
+            await asyncio.gather(*(poll_queue(queue_id, channel) for queue_id in queues))
         except asyncio.CancelledError:
             parser_logger.info("Парсер остановлен")
         finally:
             # Закрываем ресурсы
+            unsubscribe_alerts(forward_alert)
+            await channel.close()
             await parser.close()
     except Exception as e:
         parser_logger.error(f"Критическая ошибка в парсере: {e}")
         parser_logger.exception("Стек ошибки:")
 
 
+async def run_worker():
+    """
+    Процесс парсера для PARSER_MODE=worker: опрос очередей и сервер /health
+    (его проверяет HEALTHCHECK образа) с /metrics этого процесса.
+    """
+    # Импорт здесь: пакет bot.utils сам импортирует парсер
+    from bot.utils.health_check import start_health_server
+    
+    await start_health_server()
+    await start_parser()
+
+
 if __name__ == "__main__":
-    asyncio.run(start_parser()) 
\ No newline at end of file
+    # При запуске через python -m этот файл - модуль __main__, а /metrics читает
+    # состояние из bot.services.parser: запускаем процесс из него
+    from bot.services.parser import run_worker
+    asyncio.run(run_worker()) 
\ No newline at end of file
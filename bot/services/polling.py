@@ -0,0 +1,99 @@
+import logging
+from typing import Dict, List
+
+from bot.services.queue_events import CarEntered, CarLeft, CarMoved, FrontAdvanced, QueueEvent, QueueEventBus
+
+# Планировщики по имени цикла загрузки: для статистики и мониторинга
+_schedulers: Dict[str, 'AdaptivePollingScheduler'] = {}
+
+
+class AdaptivePollingScheduler:
+    """
+    Адаптивный интервал опроса страницы очереди.
+
+    Пока начало очереди движется, интервал сокращается вдвое вплоть до
+    минимального. Если снимки подряд не меняются, интервал растет
+    экспоненциально до максимального. Любое другое изменение очереди
+    или ошибка загрузки возвращают базовый интервал.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_interval: float,
+        min_interval: float,
+        max_interval: float,
+        backoff_factor: float = 2.0
+    ):
+        self.name = name
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.base_interval = self._clamp(base_interval)
+        self.backoff_factor = max(backoff_factor, 1.0)
+        self.logger = logging.getLogger("parser")
+
+        self.interval = self.base_interval
+        self.reason = "базовый интервал"
+        self.identical_count = 0  # Сколько снимков подряд не изменились
+        self._events: List[QueueEvent] = []
+
+        _schedulers[name] = self
+
+    def _clamp(self, interval: float) -> float:
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def attach(self, bus: QueueEventBus):
+        """Подписка на события очереди, по которым выбирается интервал."""
+        bus.subscribe(self._on_events)
+
+    def detach(self, bus: QueueEventBus):
+        """Отписка от событий очереди."""
+        bus.unsubscribe(self._on_events)
+
+    def _on_events(self, events: List[QueueEvent]):
+        self._events.extend(events)
+
+    def next_interval(self, loaded: bool = True) -> float:
+        """
+        Интервал до следующей загрузки по событиям, накопленным с прошлого вызова.
+
+        Args:
+            loaded: Удалось ли получить снимок в этом цикле
+        """
+        events, self._events = self._events, []
+
+        if not loaded:
+            self.identical_count = 0
+            self.interval = self.base_interval
+            self.reason = "ошибка загрузки, базовый интервал"
+        elif any(isinstance(event, FrontAdvanced) for event in events):
+            self.identical_count = 0
+            self.interval = self._clamp(min(self.interval, self.base_interval) / 2)
+            shift = sum(event.shift for event in events if isinstance(event, FrontAdvanced))
+            self.reason = f"начало очереди сдвинулось на {shift}"
+        elif any(isinstance(event, (CarMoved, CarEntered, CarLeft)) for event in events):
+            self.identical_count = 0
+            self.interval = self.base_interval
+            self.reason = "очередь изменилась"
+        else:
+            self.identical_count += 1
+            self.interval = self._clamp(max(self.interval, self.base_interval) * self.backoff_factor)
+            self.reason = f"без изменений {self.identical_count} раз подряд"
+
+        self.logger.debug(f"Опрос '{self.name}': следующий через {self.interval:.0f} с ({self.reason})")
+        return self.interval
+
+    def stats(self) -> Dict:
+        """Текущий интервал и причина его выбора."""
+        return {
+            'interval': self.interval,
+            'reason': self.reason,
+            'identical_count': self.identical_count,
+            'min_interval': self.min_interval,
+            'max_interval': self.max_interval,
+        }
+
+
+def get_polling_stats() -> Dict[str, Dict]:
+    """Состояние всех адаптивных циклов загрузки процесса."""
+    return {name: scheduler.stats() for name, scheduler in _schedulers.items()}
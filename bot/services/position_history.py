@@ -0,0 +1,348 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, NamedTuple, Optional
+
+from bot.config.config import get_config
+from bot.services.queue_events import CarEntered, CarLeft, CarMoved, FrontAdvanced, QueueEvent
+from bot.services.snapshot import CompactSnapshot, QueueSnapshot, SnapshotService
+from bot.services.snapshot_store import queue_state_path
+from bot.utils.car_number import normalize_car_number
+
+logger = logging.getLogger("notifications")
+
+FRONT_KEY = ''  # Ряд позиций первого автомобиля очереди
+LEFT = 0  # Позиция автомобиля, которого больше нет в очереди
+
+HISTORY_EVENTS = (CarMoved, CarEntered, CarLeft, FrontAdvanced)
+
+
+class PositionPoint(NamedTuple):
+    """Позиция, действующая с момента timestamp до следующей точки."""
+    timestamp: float
+    position: int  # LEFT - автомобиля нет в очереди
+
+
+class PositionSeries:
+    """Точки изменения позиции одного номера по возрастанию времени."""
+
+    __slots__ = ('times', 'positions')
+
+    def __init__(self):
+        self.times = array('d')
+        self.positions = array('l')
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def append(self, timestamp: float, position: int) -> bool:
+        """Добавляет точку, если позиция изменилась. Возвращает True, если точка добавлена."""
+        if self.positions and self.positions[-1] == position:
+            return False
+        # Время в ряду не убывает, иначе бинарный поиск неверен
+        if self.times and timestamp < self.times[-1]:
+            timestamp = self.times[-1]
+        self.times.append(timestamp)
+        self.positions.append(position)
+        return True
+
+    def at(self, timestamp: float) -> Optional[int]:
+        """Позиция в момент timestamp; None - раньше первой точки."""
+        i = bisect_right(self.times, timestamp)
+        return self.positions[i - 1] if i else None
+
+    def between(self, start: float, end: float) -> List[PositionPoint]:
+        """Точки в [start, end]; позиция, действовавшая на start, - первой точкой со временем start."""
+        low = bisect_right(self.times, start)
+        high = bisect_right(self.times, end)
+        points = []
+        if low:
+            points.append(PositionPoint(start, self.positions[low - 1]))
+        points.extend(PositionPoint(self.times[i], self.positions[i]) for i in range(low, high))
+        return points
+
+    def prune(self, before: float):
+        """Удаляет точки старше before, кроме последней из них: она действует и после before."""
+        keep = bisect_right(self.times, before) - 1
+        if keep > 0:
+            del self.times[:keep]
+            del self.positions[:keep]
+
+
+class PositionHistory:
+    """
+    История позиций автомобилей одной очереди.
+
+    Для каждого номера хранится ряд точек изменения позиции: снимки, в
+    которых позиция не изменилась, места не занимают. Ряды упорядочены
+    по времени, поэтому позиция на момент времени ищется бинарным
+    поиском за O(log n). Изменения приходят событиями сервиса снимков
+    и дописываются строкой в журнал JSONL; при запуске журнал читается
+    заново, записи старше retention секунд отбрасываются.
+    """
+
+    def __init__(self, path: Optional[str], retention: float):
+        self.path = path
+        self.retention = retention
+        self._series: Dict[str, PositionSeries] = {}
+        self._handlers: Dict[int, object] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.synced = False  # Записан ли полный снимок после запуска
+        self.started_at: Optional[float] = None  # Время первой точки истории
+        self.last_timestamp = 0.0  # Время последней записи
+
+    # Поиск
+
+    def position_at(self, car_number: str, timestamp: float) -> Optional[int]:
+        """
+        Позиция автомобиля в момент timestamp.
+
+        Returns:
+            Позиция или None, если автомобиля тогда не было в очереди
+            или история в это время еще не велась
+        """
+        series = self._series.get(normalize_car_number(car_number))
+        position = series.at(timestamp) if series is not None else None
+        return position or None
+
+    def position_series(self, car_number: str, start: float, end: float) -> List[PositionPoint]:
+        """
+        Изменения позиции автомобиля за [start, end].
+
+        Первая точка - позиция на момент start (если она известна),
+        далее - каждое изменение; позиция LEFT означает, что автомобиль
+        покинул очередь.
+        """
+        series = self._series.get(normalize_car_number(car_number))
+        return series.between(start, end) if series is not None else []
+
+    def front_at(self, timestamp: float) -> Optional[int]:
+        """Позиция первого автомобиля очереди в момент timestamp."""
+        series = self._series.get(FRONT_KEY)
+        position = series.at(timestamp) if series is not None else None
+        return position or None
+
+    # Запись
+
+    def _record(self, key: str, timestamp: float, position: int, changes: Dict[str, int]):
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = PositionSeries()
+        if series.append(timestamp, position):
+            changes[key] = position
+
+    def record_snapshot(self, cars: CompactSnapshot, timestamp: float) -> Dict[str, int]:
+        """Полная запись снимка: сравнивает все позиции с последними известными. Возвращает изменения."""
+        changes: Dict[str, int] = {}
+        seen = set()
+        for car_number, position in zip(cars.numbers, cars.positions):
+            key = normalize_car_number(car_number)
+            seen.add(key)
+            self._record(key, timestamp, position, changes)
+
+        # Номера, которых нет в снимке, покинули очередь
+        gone = [key for key, series in self._series.items() if key != FRONT_KEY and key not in seen]
+        for key in gone:
+            self._record(key, timestamp, LEFT, changes)
+
+        front = cars.first_position()
+        if front is not None:
+            self._record(FRONT_KEY, timestamp, front, changes)
+
+        self.synced = True
+        self._mark(timestamp)
+        return changes
+
+    def record_events(self, events: List[QueueEvent], timestamp: float) -> Dict[str, int]:
+        """Запись изменений одного обновления снимка. Возвращает изменения."""
+        changes: Dict[str, int] = {}
+        for event in events:
+            if isinstance(event, CarMoved):
+                self._record(normalize_car_number(event.car_number), timestamp, event.current, changes)
+            elif isinstance(event, CarEntered):
+                self._record(normalize_car_number(event.car_number), timestamp, event.position, changes)
+            elif isinstance(event, CarLeft):
+                self._record(normalize_car_number(event.car_number), timestamp, LEFT, changes)
+            elif isinstance(event, FrontAdvanced):
+                self._record(FRONT_KEY, timestamp, event.current, changes)
+
+        self._mark(timestamp)
+        return changes
+
+    def _mark(self, timestamp: float):
+        if self.started_at is None:
+            self.started_at = timestamp
+        self.last_timestamp = max(self.last_timestamp, timestamp)
+
+    async def sync(self, snapshot: Optional[QueueSnapshot]):
+        """
+        Записывает снимок целиком, если после запуска этого еще не было.
+
+        Снимок старше последней записи истории (например, восстановленный
+        из файла состояния) пропускается: его позиции уже устарели.
+        """
+        if self.synced or snapshot is None or snapshot.fetched_at < self.last_timestamp:
+            return
+        changes = self.record_snapshot(snapshot.cars, snapshot.fetched_at)
+        await self._append(snapshot.fetched_at, changes)
+
+    def attach(self, service: SnapshotService):
+        """Подписка на изменения очереди из сервиса снимков."""
+        handler = self._handlers[id(service)] = partial(self._on_events, service)
+        service.events.subscribe(handler, HISTORY_EVENTS)
+
+    def detach(self, service: SnapshotService):
+        handler = self._handlers.pop(id(service), None)
+        if handler is not None:
+            service.events.unsubscribe(handler)
+
+    async def _on_events(self, service: SnapshotService, events: List[QueueEvent]):
+        snapshot = service.snapshot
+        if snapshot is None:
+            return
+        if self.synced:
+            changes = self.record_events(events, snapshot.fetched_at)
+        else:
+            changes = self.record_snapshot(snapshot.cars, snapshot.fetched_at)
+        await self._append(snapshot.fetched_at, changes)
+
+    # Журнал
+
+    def _run(self, func, *args) -> asyncio.Future:
+        """Запись в файл в отдельном потоке; один поток сохраняет порядок строк журнала."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="position-history")
+        return asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _append(self, timestamp: float, changes: Dict[str, int]):
+        if not self.path or not changes:
+            return
+        line = json.dumps({'t': timestamp, 'p': changes}, ensure_ascii=False) + "\n"
+        try:
+            await self._run(self._write_line, line)
+        except Exception as e:
+            logger.error(f"Ошибка при записи истории позиций в {self.path}: {e}")
+
+    def _write_line(self, line: str):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+    def _read_journal(self) -> int:
+        """Применяет записи журнала. Возвращает число пропущенных устаревших записей."""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+
+        cutoff = time.time() - self.retention
+        skipped = 0
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                    timestamp, changes = item['t'], item['p']
+                except (ValueError, KeyError):
+                    continue
+                if timestamp < cutoff:
+                    skipped += 1
+                for key, position in changes.items():
+                    self._record(key, timestamp, position, {})
+                self._mark(timestamp)
+        return skipped
+
+    async def load(self):
+        """Восстанавливает историю из журнала и убирает из него устаревшие записи."""
+        try:
+            started = time.perf_counter()
+            skipped = await self._run(self._read_journal)
+            logger.info(
+                f"История позиций загружена из {self.path}: {len(self._series)} номеров "
+                f"за {(time.perf_counter() - started) * 1000:.0f} мс"
+            )
+            if skipped:
+                await self.compact()
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке истории позиций из {self.path}: {e}")
+
+    def _prune(self, before: float):
+        for key in list(self._series):
+            series = self._series[key]
+            series.prune(before)
+            # Автомобиль давно покинул очередь: его история больше не нужна
+            if len(series) == 1 and series.positions[0] == LEFT and series.times[0] < before:
+                del self._series[key]
+
+    def _rewrite_journal(self, lines: List[str]):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        os.replace(tmp_path, self.path)
+
+    async def compact(self):
+        """Удаляет точки старше срока хранения и переписывает журнал."""
+        cutoff = time.time() - self.retention
+        self._prune(cutoff)
+        # Раньше срока хранения промежуточные изменения удалены: история начинается с него
+        if self.started_at is not None and self.started_at < cutoff:
+            self.started_at = cutoff
+        if not self.path:
+            return
+
+        # Точки группируются по времени снимка, как при записи
+        batches: Dict[float, Dict[str, int]] = {}
+        for key, series in self._series.items():
+            for timestamp, position in zip(series.times, series.positions):
+                batches.setdefault(timestamp, {})[key] = position
+        lines = [
+            json.dumps({'t': timestamp, 'p': batches[timestamp]}, ensure_ascii=False) + "\n"
+            for timestamp in sorted(batches)
+        ]
+        try:
+            await self._run(self._rewrite_journal, lines)
+            logger.info(f"Журнал истории позиций сжат: {len(lines)} записей")
+        except Exception as e:
+            logger.error(f"Ошибка при сжатии журнала истории позиций {self.path}: {e}")
+
+    async def close(self):
+        """Дожидается записей в журнал."""
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, partial(executor.shutdown, wait=True))
+
+    def stats(self) -> Dict:
+        return {
+            'cars': len(self._series) - (FRONT_KEY in self._series),
+            'points': sum(len(series) for series in self._series.values()),
+            'started_at': self.started_at,
+        }
+
+
+# Истории позиций по очередям
+_histories: Dict[str, PositionHistory] = {}
+
+
+def get_position_history(queue_id: Optional[str] = None) -> Optional[PositionHistory]:
+    """
+    История позиций очереди, если она включена (POSITION_HISTORY).
+
+    Журнал очереди по умолчанию - POSITION_HISTORY_PATH, остальных очередей -
+    с идентификатором очереди в имени файла.
+    """
+    config = get_config()
+    if not config.position_history:
+        return None
+
+    queue_id = config.resolve_queue(queue_id)
+    history = _histories.get(queue_id)
+    if history is None:
+        path = queue_state_path(config.position_history_path, queue_id, config.default_queue)
+        history = _histories[queue_id] = PositionHistory(path, config.position_history_days * 86400)
+
+    return history
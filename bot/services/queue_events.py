@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Type, Union
+
+if TYPE_CHECKING:
+    from bot.services.snapshot import CompactSnapshot
+
+
+class CarMoved(NamedTuple):
+    """Автомобиль сменил позицию в очереди."""
+    car_number: str
+    previous: int
+    current: int
+
+    @property
+    def shift(self) -> int:
+        """Насколько продвинулся автомобиль (отрицательное значение - отступил)."""
+        return self.previous - self.current
+
+
+class CarEntered(NamedTuple):
+    """Автомобиль появился в очереди."""
+    car_number: str
+    position: int
+
+
+class CarLeft(NamedTuple):
+    """Автомобиль пропал из очереди."""
+    car_number: str
+    last_position: int
+
+
+class FrontAdvanced(NamedTuple):
+    """Сменилась позиция первого автомобиля в очереди."""
+    previous: int
+    current: int
+
+    @property
+    def shift(self) -> int:
+        """Насколько продвинулось начало очереди (отрицательное значение - откат назад)."""
+        return self.previous - self.current
+
+
+QueueEvent = Union[CarMoved, CarEntered, CarLeft, FrontAdvanced]
+EVENT_TYPES = (CarMoved, CarEntered, CarLeft, FrontAdvanced)
+
+
+def diff_snapshots(previous: 'CompactSnapshot', current: 'CompactSnapshot') -> Iterator[QueueEvent]:
+    """
+    События между двумя снимками очереди за один линейный проход.
+
+    Сначала изменения по автомобилям в порядке текущего снимка,
+    затем выбывшие автомобили и в конце сдвиг начала очереди.
+    """
+    remaining = dict(zip(previous.numbers, previous.positions))
+
+    for car_number, position in zip(current.numbers, current.positions):
+        previous_position = remaining.pop(car_number, None)
+        if previous_position is None:
+            yield CarEntered(car_number, position)
+        elif previous_position != position:
+            yield CarMoved(car_number, previous_position, position)
+
+    for car_number, last_position in remaining.items():
+        yield CarLeft(car_number, last_position)
+
+    previous_first = previous.first_position()
+    current_first = current.first_position()
+    if previous_first is not None and current_first is not None and previous_first != current_first:
+        yield FrontAdvanced(previous_first, current_first)
+
+
+Handler = Callable[[List[QueueEvent]], object]
+
+
+class QueueEventBus:
+    """
+    Рассылка событий очереди подписчикам.
+
+    Подписчик получает список событий нужных ему типов за одно обновление
+    снимка. Обработчик может быть обычной функцией или корутиной.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("parser")
+        self._subscribers: List[Tuple[Handler, Tuple[Type, ...]]] = []
+        self.counters: Counter = Counter()
+
+    def subscribe(self, handler: Handler, event_types: Optional[Tuple[Type, ...]] = None):
+        """Подписка на события указанных типов (по умолчанию на все)."""
+        self._subscribers.append((handler, tuple(event_types or EVENT_TYPES)))
+
+    def unsubscribe(self, handler: Handler):
+        """Отписка обработчика."""
+        self._subscribers = [(h, types) for h, types in self._subscribers if h != handler]
+
+    async def publish(self, events: List[QueueEvent]):
+        """Учитывает события в счетчиках и передает их подписчикам."""
+        if not events:
+            return
+
+        for event in events:
+            self.counters[type(event).__name__] += 1
+
+        for handler, event_types in self._subscribers:
+            selected = [event for event in events if isinstance(event, event_types)]
+            if not selected:
+                continue
+            try:
+                result = handler(selected)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                self.logger.error(f"Ошибка в обработчике событий очереди {handler}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Количество событий каждого типа с момента запуска."""
+        return {event_type.__name__: self.counters[event_type.__name__] for event_type in EVENT_TYPES}
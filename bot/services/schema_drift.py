@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from bot.config.config import load_config
+from bot.services.metrics import RollingHistogram
+
+logger = logging.getLogger("parser")
+
+# Стратегии извлечения данных со страницы в исходном порядке
+STRATEGIES = ('js_fast', 'js_script', 'table')
+
+RECENT_WINDOW = 20  # Последних попыток, по которым считается доля успехов
+ROW_DROP_RATIO = 0.5  # Потеря такой доли строк за один разбор считается резким падением
+ROW_DROP_MIN_ROWS = 20  # Очереди короче не проверяются на падение числа строк
+
+# Виды предупреждений
+STRATEGY_CHANGED = 'strategy_changed'  # Данные извлекаются другой стратегией, чем раньше
+ROW_DROP = 'row_drop'  # Число строк резко упало
+EXTRACTION_FAILED = 'extraction_failed'  # Ни одна стратегия не сработала
+RECOVERED = 'recovered'  # Страница снова разбирается
+
+
+class Attempt(NamedTuple):
+    """Попытка извлечь данные одной стратегией."""
+    strategy: str
+    success: bool
+    seconds: float
+
+
+class DriftAlert(NamedTuple):
+    """Предупреждение об изменении разметки страницы."""
+    kind: str
+    source: str  # URL страницы
+    previous: Optional[object]
+    current: Optional[object]
+    timestamp: float
+
+
+AlertHandler = Callable[[DriftAlert], object]
+
+
+class StrategyStats:
+    """Счетчики и время попыток одной стратегии."""
+
+    def __init__(self, window: int = RECENT_WINDOW):
+        self.successes = 0
+        self.failures = 0
+        self.recent: Deque[bool] = deque(maxlen=window)
+        self.timings = RollingHistogram(window * 5)  # Миллисекунды
+
+    def record(self, success: bool, seconds: float):
+        if success:
+            self.successes += 1
+        else:
+            self.failures += 1
+        self.recent.append(success)
+        self.timings.add(seconds * 1000)
+
+    @property
+    def success_rate(self) -> float:
+        """Доля успехов среди последних попыток; у непроверенной стратегии - 0.5."""
+        if not self.recent:
+            return 0.5
+        return sum(self.recent) / len(self.recent)
+
+    def stats(self) -> Dict:
+        return {
+            'successes': self.successes,
+            'failures': self.failures,
+            'success_rate': round(self.success_rate, 3),
+            'time_ms': self.timings.summary(),
+        }
+
+
+class SchemaDriftDetector:
+    """
+    Учет стратегий извлечения данных одной страницы и обнаружение
+    изменений ее разметки.
+
+    Стратегии пробуются по убыванию доли недавних успехов. Если страница
+    перестала разбираться, следующие версии страницы получают одну
+    попытку лучшей стратегией, а полный перебор повторяется не чаще
+    раза в cascade_retry секунд.
+    """
+
+    def __init__(self, source: str, cascade_retry: float):
+        self.source = source
+        self.cascade_retry = cascade_retry
+        self.strategies: Dict[str, StrategyStats] = {name: StrategyStats() for name in STRATEGIES}
+        self.winner: Optional[str] = None  # Стратегия последнего удачного разбора
+        self.rows: Optional[int] = None  # Строк в последнем удачном разборе
+        self.failing = False  # Последний полный перебор не дал данных
+        self.last_cascade = 0.0
+        self.fast_tries = 0  # Разборов одной попыткой вместо полного перебора
+
+    def ranked(self) -> List[str]:
+        """
+        Стратегии по убыванию доли недавних успехов; при равенстве первой
+        идет стратегия последнего удачного разбора, остальные - в исходном порядке.
+        """
+        return sorted(STRATEGIES, key=lambda name: (-self.strategies[name].success_rate, name != self.winner))
+
+    def plan(self) -> List[str]:
+        """Стратегии для очередного разбора."""
+        ranked = self.ranked()
+        if self.failing and time.time() - self.last_cascade < self.cascade_retry:
+            self.fast_tries += 1
+            return ranked[:1]
+        return ranked
+
+    async def record(self, strategies: List[str], attempts: Iterable[Attempt], rows: int) -> List[DriftAlert]:
+        """
+        Учет разбора: strategies - что было запланировано, attempts - что
+        выполнено, rows - сколько автомобилей получено.
+        """
+        attempts = list(attempts)
+        for attempt in attempts:
+            if attempt.strategy in self.strategies:
+                self.strategies[attempt.strategy].record(attempt.success, attempt.seconds)
+
+        winner = next((attempt.strategy for attempt in attempts if attempt.success), None)
+        now = time.time()
+        alerts = []
+
+        if winner is None:
+            if len(strategies) == len(STRATEGIES):
+                self.last_cascade = now
+                if not self.failing:
+                    self.failing = True
+                    alerts.append(DriftAlert(EXTRACTION_FAILED, self.source, self.winner, None, now))
+        else:
+            if self.failing:
+                self.failing = False
+                alerts.append(DriftAlert(RECOVERED, self.source, None, winner, now))
+            if self.winner is not None and winner != self.winner:
+                alerts.append(DriftAlert(STRATEGY_CHANGED, self.source, self.winner, winner, now))
+            if self.rows is not None and self.rows >= ROW_DROP_MIN_ROWS and rows < self.rows * (1 - ROW_DROP_RATIO):
+                alerts.append(DriftAlert(ROW_DROP, self.source, self.rows, rows, now))
+            self.winner = winner
+            self.rows = rows
+
+        for alert in alerts:
+            await _emit(alert)
+        return alerts
+
+    def stats(self) -> Dict:
+        return {
+            'winner': self.winner,
+            'rows': self.rows,
+            'failing': self.failing,
+            'fast_tries': self.fast_tries,
+            'ranking': self.ranked(),
+            'strategies': {name: stats.stats() for name, stats in self.strategies.items()},
+        }
+
+
+# Детекторы по URL страниц, последние предупреждения и их получатели
+_detectors: Dict[str, SchemaDriftDetector] = {}
+_alerts: Deque[DriftAlert] = deque(maxlen=50)
+_alert_handlers: List[AlertHandler] = []
+_alert_tasks: Set[asyncio.Task] = set()  # Выполняющиеся обработчики-корутины
+
+
+def get_drift_detector(source: str) -> SchemaDriftDetector:
+    """Детектор изменений разметки страницы по ее URL."""
+    detector = _detectors.get(source)
+    if detector is None:
+        detector = _detectors[source] = SchemaDriftDetector(source, load_config().extraction_cascade_retry)
+    return detector
+
+
+def subscribe_alerts(handler: AlertHandler):
+    """Подписка на предупреждения; обработчик может быть обычной функцией или корутиной."""
+    _alert_handlers.append(handler)
+
+
+def unsubscribe_alerts(handler: AlertHandler):
+    _alert_handlers[:] = [h for h in _alert_handlers if h != handler]
+
+
+async def _emit(alert: DriftAlert):
+    _alerts.append(alert)
+    logger.warning(f"Изменение разметки страницы: {json.dumps(alert._asdict(), ensure_ascii=False)}")
+
+    for handler in list(_alert_handlers):
+        try:
+            result = handler(alert)
+            if asyncio.iscoroutine(result):
+                # Корутины (например, отправка в Telegram) выполняются в фоне:
+                # разбор страницы идет под блокировкой обновления снимка и не ждет сети
+                task = asyncio.create_task(_run_handler(handler, result))
+                _alert_tasks.add(task)
+                task.add_done_callback(_alert_tasks.discard)
+        except Exception as e:
+            logger.error(f"Ошибка в обработчике предупреждений {handler}: {e}")
+
+
+async def _run_handler(handler: AlertHandler, coroutine):
+    try:
+        await coroutine
+    except Exception as e:
+        logger.error(f"Ошибка в обработчике предупреждений {handler}: {e}")
+
+
+async def emit_alert(alert: DriftAlert):
+    """Передача предупреждения, полученного от процесса парсера, подписчикам этого процесса."""
+    await _emit(alert)
+
+
+def get_extraction_stats() -> Dict:
+    """Статистика стратегий по страницам и последние предупреждения."""
+    return {
+        'pages': {source: detector.stats() for source, detector in _detectors.items()},
+        'alerts': [alert._asdict() for alert in _alerts],
+    }
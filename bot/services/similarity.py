@@ -0,0 +1,133 @@
+"""
+Поиск похожих номеров автомобилей по триграммам.
+"""
+import heapq
+import math
+from collections import Counter
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+
+SUGGESTION_LIMIT = 5  # Сколько похожих номеров предлагать
+MIN_SIMILARITY = 0.5  # Номера с меньшим сходством не предлагаются
+MAX_TYPOS = 2  # Сколько опечаток допускается; одна опечатка меняет до трех триграмм
+
+
+def trigrams(key: str) -> FrozenSet[str]:
+    """Триграммы канонического номера; пробелы по краям отмечают начало и конец."""
+    padded = f" {key} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class TrigramIndex:
+    """
+    Индекс триграмм канонических номеров.
+
+    Сходство номеров - коэффициент Дайса по триграммам (удвоенное число
+    общих триграмм к сумме триграмм обоих номеров): опечатка в одном символе
+    или номер без второй части (P131XM61 вместо P131XM61-AP234015)
+    оставляют большую часть триграмм общими. Запрос просматривает только
+    списки номеров своих триграмм, а не всю очередь.
+
+    Индекс обновляется по разнице наборов номеров (update), поэтому новый
+    снимок очереди, где сменилось несколько автомобилей, не требует
+    перестройки всего индекса.
+    """
+
+    def __init__(self, keys: Iterable[str] = ()):
+        # Номера хранятся в списках триграмм целыми идентификаторами: их счет быстрее строк
+        self._ids: Dict[str, int] = {}  # номер -> идентификатор
+        self._keys: Dict[int, str] = {}  # идентификатор -> номер
+        self._sizes: Dict[int, int] = {}  # идентификатор -> число триграмм номера
+        self._postings: Dict[str, Set[int]] = {}  # триграмма -> идентификаторы номеров
+        self._next_id = 0
+        for key in keys:
+            self.add(key)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._ids
+
+    def add(self, key: str):
+        if key in self._ids:
+            return
+        key_id = self._ids[key] = self._next_id
+        self._next_id += 1
+        self._keys[key_id] = key
+        grams = trigrams(key)
+        self._sizes[key_id] = len(grams)
+        for gram in grams:
+            ids = self._postings.get(gram)
+            if ids is None:
+                self._postings[gram] = {key_id}
+            else:
+                ids.add(key_id)
+
+    def remove(self, key: str):
+        key_id = self._ids.pop(key, None)
+        if key_id is None:
+            return
+        del self._keys[key_id]
+        del self._sizes[key_id]
+        for gram in trigrams(key):
+            ids = self._postings[gram]
+            ids.discard(key_id)
+            if not ids:
+                del self._postings[gram]
+
+    def update(self, keys: Iterable[str]) -> Tuple[int, int]:
+        """Приводит индекс к набору keys. Возвращает число добавленных и удаленных номеров."""
+        keys = keys if isinstance(keys, (set, frozenset, dict)) else set(keys)
+        removed = [key for key in self._ids if key not in keys]
+        for key in removed:
+            self.remove(key)
+        added = [key for key in keys if key not in self._ids]
+        for key in added:
+            self.add(key)
+        return len(added), len(removed)
+
+    def search(
+        self,
+        key: str,
+        limit: int = SUGGESTION_LIMIT,
+        min_similarity: float = MIN_SIMILARITY
+    ) -> List[Tuple[str, float]]:
+        """
+        Ближайшие к каноническому номеру key номера индекса.
+
+        Returns:
+            До limit пар (номер, сходство от 0 до 1) по убыванию сходства
+        """
+        grams = trigrams(key)
+        # Номер не дальше MAX_TYPOS опечаток и со сходством не ниже min_similarity
+        # делит с запросом не меньше min_shared триграмм, поэтому встречается
+        # хотя бы в одном из len(grams) - min_shared + 1 самых коротких списков.
+        # Кандидаты берутся из них, а длинные списки только проверяются на вхождение.
+        min_shared = max(
+            1,
+            len(grams) - 3 * MAX_TYPOS,
+            math.ceil(min_similarity * len(grams) / (2 - min_similarity))
+        )
+        lists = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        split = len(grams) - min_shared + 1
+        shared = Counter()
+        for ids in lists[:split]:
+            shared.update(ids)
+        long_lists = lists[split:]
+
+        sizes = self._sizes
+        scored = []
+        for key_id, common in shared.items():
+            remaining = len(long_lists)
+            for ids in long_lists:
+                if common + remaining < min_shared:
+                    break
+                remaining -= 1
+                if key_id in ids:
+                    common += 1
+            if common >= min_shared:
+                similarity = 2 * common / (len(grams) + sizes[key_id])
+                if similarity >= min_similarity:
+                    scored.append((similarity, self._keys[key_id]))
+
+        return [(candidate, similarity) for similarity, candidate in heapq.nlargest(limit, scored)]
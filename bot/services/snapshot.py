@@ -0,0 +1,461 @@
+import asyncio
+import json
+import logging
+import struct
+import sys
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bot.services.circuit_breaker import OPEN, CircuitBreaker
+from bot.services.queue_events import QueueEventBus, diff_snapshots
+from bot.services.similarity import SUGGESTION_LIMIT, TrigramIndex
+from bot.utils.car_number import normalize_car_number
+
+# Поля строки снимка в порядке хранения
+ROW_FIELDS = ('car_number', 'model', 'queue_position', 'registration_date')
+
+
+class CarRow:
+    """Легковесное представление строки снимка, данные не копируются."""
+
+    __slots__ = ('_snapshot', '_index')
+
+    def __init__(self, snapshot: 'CompactSnapshot', index: int):
+        self._snapshot = snapshot
+        self._index = index
+
+    @property
+    def car_number(self) -> str:
+        return self._snapshot.numbers[self._index]
+
+    @property
+    def model(self) -> str:
+        snapshot = self._snapshot
+        return snapshot.models[snapshot.model_codes[self._index]]
+
+    @property
+    def queue_position(self) -> int:
+        return self._snapshot.positions[self._index]
+
+    @property
+    def registration_date(self) -> str:
+        snapshot = self._snapshot
+        return snapshot.dates[snapshot.date_codes[self._index]]
+
+    def __getitem__(self, key: str):
+        if key not in ROW_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        """Доступ как у словаря, для совместимости с прежним форматом данных."""
+        return getattr(self, key) if key in ROW_FIELDS else default
+
+    def to_dict(self) -> Dict:
+        """Строка в виде словаря прежнего формата."""
+        return {
+            'model': self.model,
+            'queue_position': self.queue_position,
+            'registration_date': self.registration_date
+        }
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CarRow):
+            other = other.to_dict()
+        return isinstance(other, dict) and self.to_dict() == other
+
+    def __repr__(self) -> str:
+        return f"CarRow({self.car_number!r}, {self.to_dict()!r})"
+
+
+class CompactSnapshot(Mapping):
+    """
+    Компактное колоночное хранение очереди.
+
+    Номера лежат в списке, позиции - в array('i'), модели и даты
+    закодированы индексами в таблицы уникальных строк. Как отображение
+    номер -> строка заменяет прежний Dict[str, Dict].
+    """
+
+    def __init__(
+        self,
+        numbers: List[str],
+        positions: array,
+        model_codes: array,
+        models: List[str],
+        date_codes: array,
+        dates: List[str]
+    ):
+        self.numbers = numbers
+        self.positions = positions
+        self.model_codes = model_codes
+        self.models = models
+        self.date_codes = date_codes
+        self.dates = dates
+        self._row_by_number: Optional[Dict[str, int]] = None
+        self._sorted_positions: Optional[array] = None
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, str, int, str]]) -> 'CompactSnapshot':
+        """Построение из строк (номер, модель, позиция, дата)."""
+        numbers = []
+        positions = array('i')
+        model_codes = array('i')
+        date_codes = array('i')
+        model_table: Dict[str, int] = {}
+        date_table: Dict[str, int] = {}
+
+        for car_number, model, position, reg_date in rows:
+            numbers.append(car_number)
+            positions.append(position)
+            model_codes.append(model_table.setdefault(model, len(model_table)))
+            date_codes.append(date_table.setdefault(reg_date, len(date_table)))
+
+        return cls(numbers, positions, model_codes, list(model_table), date_codes, list(date_table))
+
+    @classmethod
+    def from_cars(cls, cars_data: Dict[str, Dict]) -> 'CompactSnapshot':
+        """Построение из словаря прежнего формата номер -> данные; готовый снимок возвращается как есть."""
+        if isinstance(cars_data, CompactSnapshot):
+            return cars_data
+        return cls.from_rows(
+            (car_number, data['model'], data['queue_position'], data['registration_date'])
+            for car_number, data in cars_data.items()
+        )
+
+    def to_rows(self) -> List[Tuple[str, str, int, str]]:
+        """Строки (номер, модель, позиция, дата)."""
+        return [
+            (number, self.models[model_code], position, self.dates[date_code])
+            for number, position, model_code, date_code
+            in zip(self.numbers, self.positions, self.model_codes, self.date_codes)
+        ]
+
+    def to_bytes(self) -> bytes:
+        """
+        Компактная двоичная форма снимка для передачи между процессами и хранения.
+
+        Строковые таблицы лежат в JSON-заголовке, колонки - сырыми байтами
+        массивов; все вместе сжимается zlib.
+        """
+        header = json.dumps({
+            'numbers': self.numbers,
+            'models': self.models,
+            'dates': self.dates,
+            'byteorder': sys.byteorder,
+        }, ensure_ascii=False).encode('utf-8')
+        body = b''.join((
+            struct.pack('!I', len(header)),
+            header,
+            self.positions.tobytes(),
+            self.model_codes.tobytes(),
+            self.date_codes.tobytes(),
+        ))
+        return zlib.compress(body, 1)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CompactSnapshot':
+        """Восстановление снимка из формы to_bytes()."""
+        body = zlib.decompress(data)
+        header_size, = struct.unpack_from('!I', body)
+        header = json.loads(body[4:4 + header_size].decode('utf-8'))
+
+        columns = []
+        offset = 4 + header_size
+        size = len(header['numbers']) * array('i').itemsize
+        for _ in range(3):
+            column = array('i')
+            column.frombytes(body[offset:offset + size])
+            if header['byteorder'] != sys.byteorder:
+                column.byteswap()
+            columns.append(column)
+            offset += size
+
+        positions, model_codes, date_codes = columns
+        return cls(header['numbers'], positions, model_codes, header['models'], date_codes, header['dates'])
+
+    def row(self, index: int) -> CarRow:
+        """Строка по порядковому номеру."""
+        return CarRow(self, index)
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.numbers)
+
+    def __getitem__(self, car_number: str) -> CarRow:
+        if self._row_by_number is None:
+            self._row_by_number = {number: i for i, number in enumerate(self.numbers)}
+        return CarRow(self, self._row_by_number[car_number])
+
+    def values(self) -> Iterator[CarRow]:
+        """Строки снимка по порядку (без построения индекса по номеру)."""
+        return (CarRow(self, i) for i in range(len(self.numbers)))
+
+    def items(self) -> Iterator[Tuple[str, CarRow]]:
+        """Пары номер -> строка по порядку."""
+        return ((number, CarRow(self, i)) for i, number in enumerate(self.numbers))
+
+    def _positive_positions(self) -> array:
+        """Отсортированные положительные позиции (строятся один раз)."""
+        if self._sorted_positions is None:
+            self._sorted_positions = array('i', sorted(p for p in self.positions if p > 0))
+        return self._sorted_positions
+
+    def first_position(self) -> Optional[int]:
+        """Минимальная положительная позиция."""
+        positions = self._positive_positions()
+        return positions[0] if positions else None
+
+    def last_position(self) -> Optional[int]:
+        """Максимальная позиция."""
+        positions = self._positive_positions()
+        return positions[-1] if positions else None
+
+    def rank(self, position: int) -> int:
+        """Сколько автомобилей стоит в очереди перед указанной позицией."""
+        return bisect_left(self._positive_positions(), position)
+
+
+class QueueSnapshot:
+    """Снимок очереди, полученный за один запрос страницы."""
+
+    def __init__(
+        self,
+        cars: CompactSnapshot,
+        fetched_at: Optional[float] = None,
+        index: Optional[Dict[str, int]] = None,
+        stale: bool = False
+    ):
+        self.cars = cars
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+        self._index = index
+        self.stale = stale  # Источник недоступен, данные могут быть устаревшими
+
+    def as_stale(self) -> 'QueueSnapshot':
+        """Тот же снимок с пометкой об устаревании (данные и индекс общие)."""
+        return QueueSnapshot(self.cars, self.fetched_at, self._index, stale=True)
+
+    @property
+    def index(self) -> Dict[str, int]:
+        """Индекс: каноническая форма номера -> номер строки в снимке."""
+        if self._index is None:
+            self._index = {normalize_car_number(car_number): i for i, car_number in enumerate(self.cars.numbers)}
+        return self._index
+
+    def find(self, car_number: str) -> Optional[CarRow]:
+        """Поиск автомобиля по номеру за O(1)."""
+        row_index = self.index.get(normalize_car_number(car_number))
+        return self.cars.row(row_index) if row_index is not None else None
+
+    @property
+    def age(self) -> float:
+        """Возраст снимка в секундах."""
+        return max(0.0, time.time() - self.fetched_at)
+
+    def first_position(self) -> Optional[int]:
+        """Минимальная положительная позиция в снимке."""
+        return self.cars.first_position()
+
+
+class SnapshotService:
+    """
+    Общий для процесса источник данных об очереди.
+
+    Страница загружается не чаще одного раза за интервал, все поиски
+    отвечаются из последнего снимка в памяти. Пока источник недоступен,
+    отдается последний удачный снимок с пометкой stale, а попытки
+    обновления продолжаются в фоне.
+
+    Без загрузчика сервис сам страницу не запрашивает: снимки приходят
+    через apply() от отдельного процесса парсера.
+    """
+
+    def __init__(
+        self,
+        loader: Optional[Callable[[], Awaitable[CompactSnapshot]]],
+        max_age: float,
+        breaker: Optional[CircuitBreaker] = None,
+        stale_after: Optional[float] = None
+    ):
+        self._loader = loader
+        self.max_age = max_age
+        self.stale_after = stale_after  # Возраст полученного извне снимка, после которого он устарел
+        self.breaker = breaker or CircuitBreaker('snapshot', failure_threshold=3, cooldown=60)
+        self.logger = logging.getLogger("parser")
+        self._snapshot: Optional[QueueSnapshot] = None
+        self._lock = asyncio.Lock()
+        self._revalidation: Optional[asyncio.Task] = None
+        # Индекс похожих номеров строится при первом промахе поиска
+        self._similar: Optional[TrigramIndex] = None
+        self._similar_cars: Optional[CompactSnapshot] = None  # Снимок, по которому обновлен индекс
+        self._similar_lock = asyncio.Lock()
+        # Подписчики получают изменения очереди между снимками
+        self.events = QueueEventBus()
+
+    @property
+    def snapshot(self) -> Optional[QueueSnapshot]:
+        """Последний успешно полученный снимок (без обновления)."""
+        return self._snapshot
+
+    async def suggest(self, car_number: str, limit: int = SUGGESTION_LIMIT) -> List[Tuple[CarRow, float]]:
+        """
+        Автомобили текущего снимка с номерами, похожими на car_number
+        (без обращения к источнику).
+
+        Индекс похожих номеров обновляется по разнице с прошлым снимком,
+        а не строится заново для каждого снимка. Построение занимает сотни
+        миллисекунд на большой очереди, поэтому идет в отдельном потоке.
+
+        Returns:
+            До limit пар (строка снимка, сходство) по убыванию сходства
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+
+        # Поиск не должен идти параллельно с обновлением индекса в потоке
+        async with self._similar_lock:
+            if self._similar is None:
+                self._similar = TrigramIndex()
+            if self._similar_cars is not snapshot.cars:
+                added, removed = await asyncio.to_thread(self._similar.update, snapshot.index)
+                self._similar_cars = snapshot.cars
+                self.logger.debug(f"Индекс похожих номеров обновлен: +{added}/-{removed}")
+            found = self._similar.search(normalize_car_number(car_number), limit)
+
+        index = snapshot.index
+        return [(snapshot.cars.row(index[key]), similarity) for key, similarity in found]
+
+    async def get(self, max_age: Optional[float] = None) -> Optional[QueueSnapshot]:
+        """
+        Возвращает снимок не старше max_age секунд.
+
+        Если снимок старше max_age или источник недоступен, возвращает
+        последний удачный снимок с пометкой stale, не дожидаясь обращения
+        к источнику, и обновляет его в фоне. Ждать загрузки приходится,
+        только если снимка еще нет или запрошено обновление (max_age=0).
+
+        Args:
+            max_age: Допустимый возраст снимка. None - значение из конфигурации,
+                0 - принудительное обновление
+        """
+        if self._loader is None:
+            return self._received()
+
+        if max_age is None:
+            max_age = self.max_age
+
+        snapshot = self._snapshot
+        if snapshot is not None and max_age > 0 and snapshot.age <= max_age:
+            return snapshot
+
+        # Прошлый снимок отдается сразу, а медленный источник задерживает только фоновое обновление
+        if (snapshot is not None and max_age > 0) or self.breaker.state == OPEN:
+            self._schedule_revalidation()
+            return self._stale()
+
+        return await self.refresh()
+
+    def _stale(self) -> Optional[QueueSnapshot]:
+        return self._snapshot.as_stale() if self._snapshot is not None else None
+
+    def _received(self) -> Optional[QueueSnapshot]:
+        """Последний полученный извне снимок; давно не обновлявшийся считается устаревшим."""
+        snapshot = self._snapshot
+        if snapshot is not None and not snapshot.stale and self.stale_after and snapshot.age > self.stale_after:
+            return snapshot.as_stale()
+        return snapshot
+
+    async def refresh(self) -> Optional[QueueSnapshot]:
+        """Загружает новый снимок очереди и рассылает изменения подписчикам."""
+        if self._loader is None:
+            return self._received()
+
+        requested_at = time.time()
+
+        async with self._lock:
+            # Пока ждали блокировку, снимок мог обновить другой вызов
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.fetched_at >= requested_at:
+                return snapshot
+
+            if not self.breaker.allow():
+                self._schedule_revalidation()
+                return self._stale()
+
+            cars = await self._loader()
+            if not cars:
+                self.breaker.record_failure()
+                self.logger.warning("Не удалось обновить снимок очереди")
+                if self.breaker.state == OPEN:
+                    self._schedule_revalidation()
+                return self._stale()
+
+            self.breaker.record_success()
+            current, events = self._install(cars)
+
+        # Подписчики вызываются вне блокировки: они сами могут запрашивать снимок
+        await self.events.publish(events)
+        return current
+
+    async def apply(self, cars: CompactSnapshot, fetched_at: Optional[float] = None, stale: bool = False) -> QueueSnapshot:
+        """Принимает снимок, полученный извне (от процесса парсера)."""
+        async with self._lock:
+            current, events = self._install(cars, fetched_at, stale)
+
+        await self.events.publish(events)
+        return current
+
+    def _install(
+        self,
+        cars: CompactSnapshot,
+        fetched_at: Optional[float] = None,
+        stale: bool = False
+    ) -> Tuple[QueueSnapshot, list]:
+        """Делает снимок текущим и возвращает события относительно прошлого."""
+        snapshot = self._snapshot
+
+        # Страница не изменилась: индекс прошлого снимка остается верным
+        unchanged = snapshot is not None and snapshot.cars is cars
+        index = snapshot.index if unchanged else None
+        self._snapshot = QueueSnapshot(cars, fetched_at, index=index, stale=stale)
+        self.logger.info(f"Снимок очереди обновлен, автомобилей: {len(cars)}")
+
+        events = []
+        if snapshot is not None and not unchanged:
+            events = list(diff_snapshots(snapshot.cars, cars))
+
+        return self._snapshot, events
+
+    def _schedule_revalidation(self):
+        """Запускает фоновое обновление, если оно еще не идет."""
+        if self._revalidation is None or self._revalidation.done():
+            self._revalidation = asyncio.ensure_future(self._revalidate())
+
+    async def _revalidate(self):
+        """
+        Фоновое обновление: если источник доступен - одна загрузка, иначе
+        пробные обновления по окончании паузы, пока источник не восстановится.
+        """
+        while True:
+            if self.breaker.state == OPEN:
+                await asyncio.sleep(self.breaker.retry_in)
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.logger.error(f"Ошибка фонового обновления снимка: {e}")
+                self.breaker.record_failure()
+            if self.breaker.state != OPEN:
+                break
+
+    async def close(self):
+        """Останавливает фоновые обновления."""
+        if self._revalidation is not None and not self._revalidation.done():
+            self._revalidation.cancel()
+        self._revalidation = None
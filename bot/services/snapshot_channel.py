@@ -0,0 +1,327 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import struct
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+from bot.config.config import Config
+from bot.services.schema_drift import DriftAlert, emit_alert
+from bot.services.snapshot import CompactSnapshot, QueueSnapshot, SnapshotService
+
+logger = logging.getLogger("parser")
+
+# Канал Redis для снимков и хеш с последним снимком каждой очереди
+REDIS_CHANNEL = "codd:snapshot"
+REDIS_LATEST_KEY = "codd:snapshot:latest_by_queue"
+
+# Вместо идентификатора очереди у предупреждений об изменении разметки страницы
+ALERT_QUEUE = '!alert'
+
+# Заголовок сообщения: время получения снимка, признак устаревания и длина идентификатора очереди
+_MESSAGE_HEADER = struct.Struct('!d?B')
+# Длина кадра в потоке Unix-сокета
+_FRAME_HEADER = struct.Struct('!I')
+
+
+def encode_message(queue_id: str, snapshot: QueueSnapshot) -> bytes:
+    """Сообщение канала: заголовок, идентификатор очереди и компактная форма снимка."""
+    queue = queue_id.encode('utf-8')
+    return _MESSAGE_HEADER.pack(snapshot.fetched_at, snapshot.stale, len(queue)) + queue + snapshot.cars.to_bytes()
+
+
+def decode_message(message: bytes) -> Tuple[str, float, bool, bytes]:
+    """Разбор сообщения канала: (очередь, время получения, устарел ли, данные снимка)."""
+    fetched_at, stale, queue_size = _MESSAGE_HEADER.unpack_from(message)
+    offset = _MESSAGE_HEADER.size + queue_size
+    return message[_MESSAGE_HEADER.size:offset].decode('utf-8'), fetched_at, stale, message[offset:]
+
+
+def encode_alert(alert: DriftAlert) -> bytes:
+    """Сообщение канала с предупреждением об изменении разметки страницы."""
+    queue = ALERT_QUEUE.encode('utf-8')
+    payload = json.dumps(alert._asdict(), ensure_ascii=False).encode('utf-8')
+    return _MESSAGE_HEADER.pack(alert.timestamp, False, len(queue)) + queue + payload
+
+
+def decode_alert(payload: bytes) -> DriftAlert:
+    return DriftAlert(**json.loads(payload.decode('utf-8')))
+
+
+def message_queue(message: bytes) -> str:
+    """Идентификатор очереди сообщения без разбора снимка."""
+    queue_size = _MESSAGE_HEADER.unpack_from(message)[2]
+    return message[_MESSAGE_HEADER.size:_MESSAGE_HEADER.size + queue_size].decode('utf-8')
+
+
+class SnapshotChannel(ABC):
+    """
+    Канал передачи снимков от процесса парсера к боту.
+
+    Подписчик сразу после подключения получает последний опубликованный
+    снимок каждой очереди, затем - каждый новый.
+    """
+
+    async def start(self):
+        """Подготовка стороны публикации."""
+
+    @abstractmethod
+    async def publish(self, message: bytes):
+        """Отправка сообщения всем подписчикам."""
+
+    @abstractmethod
+    def subscribe(self) -> AsyncIterator[bytes]:
+        """Поток сообщений канала."""
+
+    async def close(self):
+        """Освобождение ресурсов канала."""
+
+
+class LocalChannel(SnapshotChannel):
+    """Канал внутри одного процесса: для тестов и запуска без отдельного парсера."""
+
+    def __init__(self):
+        self._queues: Set[asyncio.Queue] = set()
+        self._last: Dict[str, bytes] = {}
+
+    async def publish(self, message: bytes):
+        queue_id = message_queue(message)
+        if queue_id != ALERT_QUEUE:
+            self._last[queue_id] = message
+        for queue in self._queues:
+            queue.put_nowait(message)
+
+    async def subscribe(self) -> AsyncIterator[bytes]:
+        queue: asyncio.Queue = asyncio.Queue()
+        for message in self._last.values():
+            queue.put_nowait(message)
+        self._queues.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._queues.discard(queue)
+
+
+class UnixSocketChannel(SnapshotChannel):
+    """
+    Канал через локальный Unix-сокет.
+
+    Парсер слушает сокет и рассылает снимки всем подключенным клиентам
+    кадрами с длиной; бот переподключается, если парсер перезапустился.
+    Клиенты получают снимок одновременно; клиент, не принявший его за
+    send_timeout секунд, отключается и после переподключения получит
+    последние снимки заново.
+    """
+
+    def __init__(self, path: str, retry_delay: float = 5, send_timeout: float = 10):
+        self.path = path
+        self.retry_delay = retry_delay
+        self.send_timeout = send_timeout
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._last: Dict[str, bytes] = {}
+
+    async def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        self._server = await asyncio.start_unix_server(self._on_client, path=self.path)
+        logger.info(f"Снимки очереди публикуются через сокет {self.path}")
+
+    async def _on_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        logger.info(f"Подключен подписчик снимков, всего: {len(self._writers)}")
+        try:
+            for message in list(self._last.values()):
+                await self._send(writer, message)
+            # Клиент ничего не пишет: ждем, пока он отключится
+            await reader.read()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, message: bytes):
+        writer.write(_FRAME_HEADER.pack(len(message)) + message)
+        await writer.drain()
+
+    async def publish(self, message: bytes):
+        if self._server is None:
+            await self.start()
+
+        # Предупреждения не повторяются подключившимся позже подписчикам
+        queue_id = message_queue(message)
+        if queue_id != ALERT_QUEUE:
+            self._last[queue_id] = message
+        # Медленный подписчик не задерживает остальных и цикл опроса
+        await asyncio.gather(*(self._publish_to(writer, message) for writer in list(self._writers)))
+
+    async def _publish_to(self, writer: asyncio.StreamWriter, message: bytes):
+        try:
+            await asyncio.wait_for(self._send(writer, message), self.send_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Подписчик снимков не принял снимок за {self.send_timeout} с, отключаем")
+            self._writers.discard(writer)
+            writer.close()
+        except (ConnectionError, OSError) as e:
+            logger.warning(f"Подписчик снимков отключился: {e}")
+            self._writers.discard(writer)
+            writer.close()
+
+    async def subscribe(self) -> AsyncIterator[bytes]:
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (ConnectionError, OSError) as e:
+                logger.warning(f"Процесс парсера недоступен ({self.path}): {e}")
+                await asyncio.sleep(self.retry_delay)
+                continue
+
+            logger.info(f"Подключено к процессу парсера через {self.path}")
+            try:
+                while True:
+                    size, = _FRAME_HEADER.unpack(await reader.readexactly(_FRAME_HEADER.size))
+                    yield await reader.readexactly(size)
+            except (asyncio.IncompleteReadError, ConnectionError, OSError):
+                logger.warning("Соединение с процессом парсера разорвано")
+            finally:
+                writer.close()
+
+            await asyncio.sleep(self.retry_delay)
+
+    async def close(self):
+        for writer in list(self._writers):
+            writer.close()
+        self._writers.clear()
+
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+class RedisChannel(SnapshotChannel):
+    """Канал через Redis pub/sub; последние снимки очередей хранятся в отдельном хеше."""
+
+    def __init__(self, url: str, retry_delay: float = 5):
+        self.url = url
+        self.retry_delay = retry_delay
+        self._redis = None
+
+    def _client(self):
+        import redis.asyncio as aioredis
+        return aioredis.from_url(self.url)
+
+    async def start(self):
+        self._redis = self._client()
+        logger.info(f"Снимки очереди публикуются через Redis: {self.url}")
+
+    async def publish(self, message: bytes):
+        if self._redis is None:
+            await self.start()
+
+        queue_id = message_queue(message)
+        if queue_id != ALERT_QUEUE:
+            await self._redis.hset(REDIS_LATEST_KEY, queue_id, message)
+        await self._redis.publish(REDIS_CHANNEL, message)
+
+    async def subscribe(self) -> AsyncIterator[bytes]:
+        while True:
+            client = self._client()
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(REDIS_CHANNEL)
+                latest = await client.hgetall(REDIS_LATEST_KEY)
+                for message in latest.values():
+                    yield message
+
+                async for item in pubsub.listen():
+                    if item.get('type') == 'message':
+                        yield item['data']
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Ошибка подписки на снимки в Redis: {e}")
+            finally:
+                await pubsub.close()
+                await client.close()
+
+            await asyncio.sleep(self.retry_delay)
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+
+def get_snapshot_channel(config: Config) -> SnapshotChannel:
+    """Канал снимков согласно конфигурации: Redis или Unix-сокет."""
+    if config.use_redis:
+        return RedisChannel(config.redis_url)
+    return UnixSocketChannel(config.parser_socket_path)
+
+
+class SnapshotSubscriber:
+    """
+    Получает снимки из канала и передает их сервисам снимков бота по очередям;
+    предупреждения об изменении разметки передаются подписчикам бота.
+    """
+
+    def __init__(self, services: Dict[str, SnapshotService], channel: SnapshotChannel):
+        self.services = services
+        self.channel = channel
+        self.received = 0
+        self._digests: Dict[str, bytes] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        async for message in self.channel.subscribe():
+            try:
+                queue_id, fetched_at, stale, payload = decode_message(message)
+                if queue_id == ALERT_QUEUE:
+                    await emit_alert(decode_alert(payload))
+                    continue
+                service = self.services.get(queue_id)
+                if service is None:
+                    logger.warning(f"Получен снимок неизвестной очереди {queue_id}")
+                    continue
+
+                # Очередь не изменилась: оставляем прежний снимок вместе с индексом
+                digest = hashlib.blake2b(payload, digest_size=16).digest()
+                current = service.snapshot
+                if digest == self._digests.get(queue_id) and current is not None:
+                    cars = current.cars
+                else:
+                    cars = CompactSnapshot.from_bytes(payload)
+
+                await service.apply(cars, fetched_at, stale)
+                self._digests[queue_id] = digest
+                self.received += 1
+            except Exception as e:
+                logger.error(f"Ошибка при получении снимка от процесса парсера: {e}")
+
+    def start(self):
+        """Запуск подписки в фоне."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run())
+
+    async def close(self):
+        """Остановка подписки."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.channel.close()
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+from typing import Dict, NamedTuple, Optional
+
+from bot.services.snapshot import CompactSnapshot, QueueSnapshot
+
+logger = logging.getLogger("notifications")
+
+# Формат файла: сигнатура, время снимка, признак устаревания, длина JSON с позициями
+_MAGIC = b'CQS1'
+_HEADER = struct.Struct('!4sd?I')
+
+
+class SavedState(NamedTuple):
+    """Состояние, сохраненное перед остановкой бота."""
+    snapshot: QueueSnapshot
+    car_positions: Dict[str, int]
+    first_car_position: Optional[int]
+
+    @property
+    def age(self) -> float:
+        """Возраст сохраненного снимка в секундах."""
+        return self.snapshot.age
+
+
+def dump_state(snapshot: QueueSnapshot, car_positions: Dict[str, int], first_car_position: Optional[int]) -> bytes:
+    """Компактная двоичная форма состояния: заголовок, позиции в JSON и снимок."""
+    meta = json.dumps({
+        'car_positions': car_positions,
+        'first_car_position': first_car_position,
+    }, ensure_ascii=False).encode('utf-8')
+    header = _HEADER.pack(_MAGIC, snapshot.fetched_at, snapshot.stale, len(meta))
+    return header + meta + snapshot.cars.to_bytes()
+
+
+def parse_state(data: bytes) -> SavedState:
+    """Разбор формы dump_state()."""
+    magic, fetched_at, stale, meta_size = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("неизвестный формат файла состояния")
+
+    offset = _HEADER.size
+    meta = json.loads(data[offset:offset + meta_size].decode('utf-8'))
+    cars = CompactSnapshot.from_bytes(data[offset + meta_size:])
+
+    return SavedState(
+        QueueSnapshot(cars, fetched_at, stale=stale),
+        meta['car_positions'],
+        meta['first_car_position']
+    )
+
+
+def queue_state_path(path: str, queue_id: str, default_queue: str) -> str:
+    """Файл состояния очереди: для очереди по умолчанию - path, для остальных - с идентификатором в имени."""
+    if queue_id == default_queue:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{queue_id}{ext}"
+
+
+def _write_file(path: str, data: bytes):
+    """Атомарная запись: сначала во временный файл, затем замена."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_file(path: str) -> Optional[SavedState]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return parse_state(f.read())
+
+
+async def save_state(
+    path: str,
+    snapshot: QueueSnapshot,
+    car_positions: Dict[str, int],
+    first_car_position: Optional[int]
+) -> bool:
+    """Сохраняет снимок и последние позиции автомобилей, не блокируя цикл событий."""
+    # Копия словаря: он может измениться, пока идет запись
+    positions = dict(car_positions)
+
+    def write():
+        _write_file(path, dump_state(snapshot, positions, first_car_position))
+
+    try:
+        started = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(None, write)
+        logger.debug(f"Состояние сохранено в {path} за {(time.perf_counter() - started) * 1000:.1f} мс")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении состояния в {path}: {e}")
+        return False
+
+
+async def load_state(path: str) -> Optional[SavedState]:
+    """Загружает сохраненное состояние; None, если файла нет или он поврежден."""
+    try:
+        state = await asyncio.get_running_loop().run_in_executor(None, _read_file, path)
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке состояния из {path}: {e}")
+        return None
+
+    if state is not None:
+        logger.info(
+            f"Загружено сохраненное состояние: {len(state.snapshot.cars)} автомобилей, "
+            f"{len(state.car_positions)} отслеживаемых позиций, возраст снимка {state.age:.0f} с"
+        )
+    return state
@@ -2,5 +2,6 @@
 Утилиты для работы бота
 """
 
-from bot.utils.message_utils import escape_markdown
+from bot.utils.message_utils import escape_markdown, format_queue_note, format_stale_note
+from bot.utils.car_number import normalize_car_number
 from bot.utils.health_check import start_health_server 
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""
+Нормализация номеров автомобилей.
+"""
+
+# Кириллические буквы, совпадающие по написанию с латинскими на номерных знаках
+_HOMOGLYPHS = {
+    'А': 'A', 'В': 'B', 'Е': 'E', 'К': 'K', 'М': 'M', 'Н': 'H',
+    'О': 'O', 'Р': 'P', 'С': 'C', 'Т': 'T', 'У': 'Y', 'Х': 'X',
+}
+
+# Разделители, которые пользователи ставят по-разному
+_SEPARATORS = ' \t\n\r -‐‑‒–—−_'
+
+# Таблица для str.translate строится один раз при импорте
+_CANONICAL_TABLE = str.maketrans(
+    {**{ord(cyr): lat for cyr, lat in _HOMOGLYPHS.items()}, **{ord(sep): None for sep in _SEPARATORS}}
+)
+
+
+def normalize_car_number(car_number: str) -> str:
+    """
+    Каноническая форма номера для поиска.
+
+    Приводит к верхнему регистру, заменяет кириллические буквы-двойники
+    латинскими (Р131ХМ61 == P131XM61) и убирает пробелы и дефисы.
+    """
+    return car_number.upper().translate(_CANONICAL_TABLE)
@@ -9,6 +9,21 @@ async def health_check_handler(request):
     """
     return web.Response(text="OK", status=200)
 
+async def metrics_handler(request):
+    """
+    Метрики парсера в JSON: процентили времени этапов (загрузка, BeautifulSoup,
+    извлечение из JS и таблиц, нормализация), размер страницы, число строк
+    и счетчики загрузок.
+    """
+    # Импорт при запросе: пакет bot.utils импортируется и самим парсером
+    from bot.services.metrics import get_parser_metrics
+    from bot.services.parser import get_fetch_stats
+    
+    return web.json_response({
+        'parser': get_parser_metrics(),
+        'fetch': get_fetch_stats(),
+    })
+
 async def start_health_server(host="0.0.0.0", port=8080):
     """
     Запускает HTTP-сервер для проверки работоспособности бота.
@@ -19,6 +34,7 @@ async def start_health_server(host="0.0.0.0", port=8080):
     """
     app = web.Application()
     app.router.add_get('/health', health_check_handler)
+    app.router.add_get('/metrics', metrics_handler)
     
     runner = web.AppRunner(app)
     await runner.setup()
@@ -4,6 +4,14 @@ from typing import Any, Dict, Optional, Union
 from aiogram.types import Message
 from aiogram.exceptions import TelegramBadRequest
 
+from bot.config.config import get_config
+
+# Ответ, когда данных об очереди нет из-за недоступности сайта ЦОДД
+QUEUE_UNAVAILABLE_TEXT = (
+    "⚠️ Сайт ЦОДД сейчас недоступен, получить данные об очереди не удалось.\n"
+    "Пожалуйста, попробуйте позже."
+)
+
 
 def escape_markdown(text: str) -> str:
     """
@@ -15,6 +23,28 @@ def escape_markdown(text: str) -> str:
     return text
 
 
+def format_stale_note(car_data: Dict) -> str:
+    """
+    Пометка для ответа из устаревшего снимка очереди.
+    Для свежих данных возвращает пустую строку.
+    """
+    if not car_data.get('stale'):
+        return ""
+    minutes = int(car_data.get('age', 0) // 60)
+    age_text = f"{minutes} мин. назад" if minutes else "менее минуты назад"
+    return f"\n\n⏳ Данные получены {age_text}, идет обновление с сайта ЦОДД."
+
+
+def format_queue_note(car_data: Dict) -> str:
+    """
+    Строка с очередью, в которой стоит автомобиль.
+    Если бот обслуживает одну очередь, возвращает пустую строку.
+    """
+    if len(get_config().queue_sources()) < 2 or not car_data.get('queue_id'):
+        return ""
+    return f"\nОчередь: {car_data['queue_id']}"
+
+
 async def safe_edit_message(
     message: Message,
     text: str,